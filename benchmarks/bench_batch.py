@@ -0,0 +1,46 @@
+"""
+Detection throughput of FaceDetector.detect_faces per batch size, compared
+with calling detect_face once per image.
+
+Usage: python -m benchmarks.bench_batch [--images 256] [--sizes 1 4 16 64]
+"""
+
+import argparse
+import time
+
+from src.detector import FaceDetector
+
+from .common import load_fixture_images
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--images", type=int, default=256)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument("--max-side", type=int, default=512)
+    parser.add_argument("--strict", action="store_true")
+    args = parser.parse_args()
+
+    fixtures = [img for _, img in load_fixture_images(max_side=args.max_side)]
+    images = [fixtures[i % len(fixtures)] for i in range(args.images)]
+
+    with FaceDetector() as detector:
+        # Warm up the session
+        detector.detect_faces(fixtures, strict=args.strict)
+
+        start = time.perf_counter()
+        for img in images:
+            detector.detect_face(img, strict=args.strict)
+        elapsed = time.perf_counter() - start
+        print(f"{'per image':>12}: {len(images) / elapsed:8.1f} images/s")
+
+        for size in args.sizes:
+            start = time.perf_counter()
+            for i in range(0, len(images), size):
+                detector.detect_faces(images[i : i + size], strict=args.strict)
+            elapsed = time.perf_counter() - start
+            print(f"{'batch ' + str(size):>12}: {len(images) / elapsed:8.1f} images/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Decode time and peak memory of full decode versus reduced-resolution decode
+for detection, on large JPEGs synthesized from the fixtures.
+
+Usage: python -m benchmarks.bench_decode [--megapixels 24] [--detection-size 1024]
+"""
+
+import argparse
+import math
+import os
+import shutil
+import tempfile
+import time
+import tracemalloc
+
+import cv2
+
+from src.decode import decode, decode_for_detection
+from src.processor import ImageProcessor
+
+from .common import load_fixture_images
+
+
+def write_large_jpegs(directory, megapixels):
+    paths = []
+    for name, img in load_fixture_images():
+        scale = math.sqrt(megapixels * 1e6 / (img.shape[0] * img.shape[1]))
+        large = cv2.resize(img, None, fx=scale, fy=scale, interpolation=cv2.INTER_CUBIC)
+        path = os.path.join(directory, name)
+        cv2.imwrite(path, large, [cv2.IMWRITE_JPEG_QUALITY, 90])
+        paths.append(path)
+    return paths
+
+
+def measure(func, paths):
+    """Return (total seconds, peak traced MiB) of calling func on every path"""
+    tracemalloc.start()
+    start = time.perf_counter()
+    for path in paths:
+        func(path)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1] / 2**20
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--megapixels", type=float, default=24)
+    parser.add_argument("--detection-size", type=int, default=1024)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    try:
+        paths = write_large_jpegs(directory, args.megapixels)
+        with ImageProcessor(detection_size=args.detection_size) as processor:
+
+            def eager(path):
+                # Full decode, then proxy detection and crop
+                processor.process_array(decode(path))
+
+            def lazy(path):
+                img, face_bbox = processor.decode_and_detect(path)
+                if face_bbox:
+                    processor.crop_face(img, face_bbox)
+
+            cases = [
+                ("full decode", decode),
+                (
+                    "reduced decode",
+                    lambda path: decode_for_detection(path, args.detection_size),
+                ),
+                ("process, full decode", eager),
+                ("process, reduced decode", lazy),
+            ]
+            print(f"{len(paths)} JPEGs at ~{args.megapixels:g} MP")
+            for name, func in cases:
+                elapsed, peak = measure(func, paths)
+                print(
+                    f"{name:>24}: {elapsed / len(paths) * 1000:8.1f} ms/image"
+                    f"  peak {peak:7.1f} MiB"
+                )
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Detection time and framing accuracy of proxy detection (--detection-size)
+against full-resolution detection on upscaled fixture images.
+
+Usage: python -m benchmarks.bench_detection_size [--upscale 5] [--sizes 640 1024]
+"""
+
+import argparse
+import time
+
+from src.detector import FaceDetector
+from src.processor import ImageProcessor
+
+from .common import bbox_iou, load_fixture_images
+
+
+def timed_detect(detector, img, strict):
+    start = time.perf_counter()
+    bbox = detector.detect_face(img, strict=strict)
+    return bbox, time.perf_counter() - start
+
+
+def crop_iou(a, b, shape):
+    """IoU of the square crops produced from two face bboxes"""
+    height, width = shape[:2]
+    boxes = []
+    for bbox in (a, b):
+        x1, y1, x2, y2 = ImageProcessor.calculate_crop_box(bbox, width, height)
+        boxes.append((x1, y1, x2 - x1, y2 - y1))
+    return bbox_iou(*boxes)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--upscale", type=float, default=5)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[640, 1024])
+    parser.add_argument("--strict", action="store_true")
+    args = parser.parse_args()
+
+    images = load_fixture_images(upscale=args.upscale)
+    with FaceDetector() as full_detector:
+        reference = {
+            name: timed_detect(full_detector, img, args.strict) for name, img in images
+        }
+        full_total = sum(elapsed for _, elapsed in reference.values())
+        print(f"full resolution: {full_total:.2f} s total")
+
+        for size in args.sizes:
+            with FaceDetector(detection_size=size) as detector:
+                total = 0.0
+                for name, img in images:
+                    bbox, elapsed = timed_detect(detector, img, args.strict)
+                    total += elapsed
+                    full_bbox = reference[name][0]
+                    if full_bbox is None or bbox is None:
+                        match = "same" if full_bbox == bbox else "MISMATCH"
+                        print(f"  {size:>5} {name:<22} no face ({match})")
+                        continue
+                    print(
+                        f"  {size:>5} {name:<22} bbox IoU {bbox_iou(full_bbox, bbox):.3f}"
+                        f"  crop IoU {crop_iou(full_bbox, bbox, img.shape):.3f}"
+                    )
+                print(
+                    f"{size:>5} px proxy: {total:.2f} s total ({full_total / total:.1f}x)"
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Encode time versus file size for each output preset and backend, on the
+crops produced from the fixture images.
+
+Usage: python -m benchmarks.bench_encode [--repeat 5] [--circular]
+"""
+
+import argparse
+import time
+
+from src.encoder import Encoder
+from src.processor import ImageProcessor
+
+from .common import load_fixture_images
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--circular", action="store_true")
+    args = parser.parse_args()
+
+    with ImageProcessor() as processor:
+        faces = []
+        for _, img in load_fixture_images():
+            face_bbox = processor.detector.detect_face(img, strict=True)
+            if face_bbox:
+                faces.append((img, face_bbox))
+
+        encoders = [
+            (f"preset {preset}", Encoder.from_preset(preset))
+            for preset in Encoder.PRESETS
+        ]
+        encoders.append(
+            (
+                "webp-lossless (opencv)",
+                Encoder.from_preset("webp-lossless", backend="opencv"),
+            )
+        )
+        encoders += [
+            (
+                f"png level {level} ({backend})",
+                Encoder(backend=backend, compression=level),
+            )
+            for backend in Encoder.BACKENDS
+            for level in (0, 1, 6, 9)
+        ]
+
+        print(f"{len(faces)} crops, {args.repeat} repeats")
+        for name, encoder in encoders:
+            buffers = [
+                processor.crop_face(img, bbox, args.circular, encoder.channel_order)
+                for img, bbox in faces
+            ]
+            start = time.perf_counter()
+            for _ in range(args.repeat):
+                size = sum(len(encoder.encode(buffer)) for buffer in buffers)
+            elapsed = (time.perf_counter() - start) / args.repeat
+            print(
+                f"{name:>28}: {elapsed / len(buffers) * 1000:8.1f} ms/image"
+                f"  {size / len(buffers) / 1024:8.1f} KiB/image"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Per-image detection latency with a fresh MediaPipe graph per call versus the
+persistent sessions held by FaceDetector.
+
+Usage: python -m benchmarks.bench_sessions [--images 300]
+"""
+
+import argparse
+import statistics
+import time
+
+import cv2
+
+from src.detector import FaceDetector
+
+from .common import load_fixture_images
+
+
+def load_images(count, max_side):
+    """Load the fixture images, downscaled to portrait size, cycled to `count`"""
+    images = [img for _, img in load_fixture_images(max_side=max_side)]
+    return [images[i % len(images)] for i in range(count)]
+
+
+def per_call_graph(detector, img):
+    """Previous behaviour: build and tear down a graph for every image"""
+    rgb_img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+    with detector.mp_face_detection.FaceDetection(
+        min_detection_confidence=0.05, model_selection=1
+    ) as face_detection:
+        return face_detection.process(rgb_img)
+
+
+def persistent_session(detector, img):
+    rgb_img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+    return detector.open().process(rgb_img)
+
+
+def measure(func, detector, images):
+    latencies = []
+    for img in images:
+        start = time.perf_counter()
+        func(detector, img)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--images", type=int, default=300)
+    parser.add_argument("--max-side", type=int, default=512)
+    args = parser.parse_args()
+
+    images = load_images(args.images, args.max_side)
+    with FaceDetector() as detector:
+        for name, func in [
+            ("per-call graph", per_call_graph),
+            ("persistent session", persistent_session),
+        ]:
+            latencies = measure(func, detector, images)
+            print(
+                f"{name:>20}: mean {statistics.mean(latencies):7.2f} ms"
+                f"  median {statistics.median(latencies):7.2f} ms"
+                f"  total {sum(latencies) / 1000:6.2f} s over {len(images)} images"
+            )
+
+
+if __name__ == "__main__":
+    main()
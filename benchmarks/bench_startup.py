@@ -0,0 +1,91 @@
+"""
+Startup time of the command line: --help, an argument error and a strict
+single-image run, each in a fresh interpreter, against target times.
+
+Usage: python -m benchmarks.bench_startup [--repeat 5] [--help-target 0.3]
+           [--strict-target 1.5]
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from .common import FIXTURES
+
+SCRIPT = os.path.join(os.path.dirname(os.path.dirname(__file__)), "face_crop.py")
+
+
+def time_command(args, repeat):
+    """Median wall time in seconds of running face_crop.py with args"""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run(
+            [sys.executable, SCRIPT, *args],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def loaded_modules(args):
+    """Heavy modules imported by a run of the command line"""
+    code = (
+        "import sys\n"
+        f"sys.argv = {[SCRIPT, *args]!r}\n"
+        "from src.cli import main\n"
+        "try:\n"
+        "    main()\n"
+        "except SystemExit:\n"
+        "    pass\n"
+        "print('loaded:', *(m for m in ('cv2', 'mediapipe', 'numpy', 'PIL')"
+        " if m in sys.modules))\n"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        capture_output=True,
+        text=True,
+        cwd=os.path.dirname(SCRIPT),
+    )
+    lines = [line for line in result.stdout.splitlines() if line.startswith("loaded:")]
+    return lines[-1][len("loaded:") :].strip() if lines else ""
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--help-target", type=float, default=0.3)
+    parser.add_argument("--strict-target", type=float, default=1.5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as output_dir:
+        output = os.path.join(output_dir, "out.png")
+        cases = [
+            ("--help", ["--help"], args.help_target),
+            ("argument error", ["--jobs", "0", "in.jpg"], args.help_target),
+            (
+                "strict, first result",
+                ["--strict", f"{FIXTURES}/Mona_Lisa.jpg", "--output", output],
+                args.strict_target,
+            ),
+        ]
+        failed = False
+        for name, command, target in cases:
+            elapsed = time_command(command, args.repeat)
+            status = "ok" if elapsed <= target else "OVER TARGET"
+            failed |= elapsed > target
+            print(
+                f"{name:22s} {elapsed * 1000:7.0f} ms  "
+                f"(target {target * 1000:.0f} ms, {status})"
+            )
+            print(f"{'':22s} loads: {loaded_modules(command) or '-'}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
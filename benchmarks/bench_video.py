@@ -0,0 +1,90 @@
+"""
+Tracking against per-frame detection on a synthetic clip: a fixture image
+panned and zoomed by a moving camera window.
+
+Usage: python -m benchmarks.bench_video [--frames 150] [--size 1080]
+           [--keyframe-interval 30] [--smoothing 0.6] [--strict]
+"""
+
+import argparse
+import time
+
+import cv2
+import numpy as np
+
+from src.detector import FaceDetector
+from src.video import FaceTracker
+
+from .common import FIXTURES, bbox_iou
+
+
+def synthesize_clip(img, frames, size):
+    """
+    Frames of a size x size window that pans across img and slowly zooms in
+    """
+    height, width = img.shape[:2]
+    clip = []
+    for index in range(frames):
+        t = index / max(1, frames - 1)
+        side = int(min(width, height) * (0.9 - 0.2 * t))
+        x = int((width - side) * (0.3 + 0.4 * np.sin(np.pi * t)))
+        y = int((height - side) * (0.4 + 0.2 * t))
+        window = img[y : y + side, x : x + side]
+        clip.append(cv2.resize(window, (size, size), interpolation=cv2.INTER_AREA))
+    return clip
+
+
+def jitter(boxes):
+    """Mean frame-to-frame movement of the box center, in pixels"""
+    centers = [(x + w / 2, y + h / 2) for x, y, w, h in boxes if w]
+    steps = [np.hypot(b[0] - a[0], b[1] - a[1]) for a, b in zip(centers, centers[1:])]
+    return float(np.mean(steps)) if steps else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--frames", type=int, default=150)
+    parser.add_argument("--size", type=int, default=1080)
+    parser.add_argument("--keyframe-interval", type=int, default=30)
+    parser.add_argument("--smoothing", type=float, default=0.6)
+    parser.add_argument("--strict", action="store_true")
+    args = parser.parse_args()
+
+    img = cv2.imread(f"{FIXTURES}/pexels-sample-3.jpg")
+    clip = synthesize_clip(img, args.frames, args.size)
+
+    with FaceDetector() as detector:
+        start = time.perf_counter()
+        reference = [detector.detect_face(frame, strict=args.strict) for frame in clip]
+        full_elapsed = time.perf_counter() - start
+
+        tracker = FaceTracker(
+            detector, args.strict, args.keyframe_interval, args.smoothing
+        )
+        start = time.perf_counter()
+        tracked = [tracker.update(frame) for frame in clip]
+        tracked_elapsed = time.perf_counter() - start
+
+    pairs = [(a, b) for a, b in zip(reference, tracked) if a and b]
+    mean_iou = np.mean([bbox_iou(a, b) for a, b in pairs]) if pairs else 0.0
+    stats = tracker.stats()
+    print(f"{len(clip)} frames at {args.size}x{args.size}")
+    print(
+        f"  per-frame detection: {len(clip) / full_elapsed:7.1f} frames/s, "
+        f"{sum(1 for b in reference if b)} faces, jitter "
+        f"{jitter([b or (0, 0, 0, 0) for b in reference]):.2f} px"
+    )
+    print(
+        f"  tracking:            {len(clip) / tracked_elapsed:7.1f} frames/s, "
+        f"{sum(1 for b in tracked if b)} faces, jitter "
+        f"{jitter([b or (0, 0, 0, 0) for b in tracked]):.2f} px"
+    )
+    print(
+        f"  {stats['full_detections']} full detections, "
+        f"{stats['roi_detections']} tracked, {stats['lost']} lost; "
+        f"mean IoU against per-frame detection {mean_iou:.3f}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+import glob
+import os
+
+import cv2
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "..", "tests", "fixtures", "images")
+
+
+def fixture_paths():
+    return sorted(glob.glob(os.path.join(FIXTURES, "*.jpg")))
+
+
+def load_fixture_images(max_side=None, upscale=None):
+    """
+    Load the fixture images as (name, image) pairs
+    Args:
+        max_side: Downscale so the longest side is at most this many pixels
+        upscale: Upscale by this factor to emulate large camera originals
+    """
+    images = []
+    for path in fixture_paths():
+        img = cv2.imread(path)
+        if max_side and max(img.shape[:2]) > max_side:
+            scale = max_side / max(img.shape[:2])
+            img = cv2.resize(
+                img, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA
+            )
+        if upscale:
+            img = cv2.resize(
+                img, None, fx=upscale, fy=upscale, interpolation=cv2.INTER_CUBIC
+            )
+        images.append((os.path.basename(path), img))
+    return images
+
+
+def bbox_iou(a, b):
+    """Intersection over union of two (x, y, w, h) boxes"""
+    x1, y1 = max(a[0], b[0]), max(a[1], b[1])
+    x2 = min(a[0] + a[2], b[0] + b[2])
+    y2 = min(a[1] + a[3], b[1] + b[3])
+    inter = max(0, x2 - x1) * max(0, y2 - y1)
+    return inter / float(a[2] * a[3] + b[2] * b[3] - inter)
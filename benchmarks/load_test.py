@@ -0,0 +1,170 @@
+"""
+Load generator for the HTTP service: requests/s and tail latency under
+concurrency, plus the server's batch sizes and queue depth.
+
+Usage: python -m benchmarks.load_test [--url http://127.0.0.1:8080]
+           [--endpoint crop|detect] [--concurrency 16] [--requests 200]
+           [--start-server] [--workers 2] [--max-batch-size 8]
+           [--max-wait-ms 10]
+
+With --start-server a local server is launched with the given worker and
+batching options and stopped afterwards.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+from collections import Counter
+from urllib.parse import urlsplit
+
+import cv2
+
+from src.profiling import percentile
+
+from .common import load_fixture_images
+
+
+async def request(reader, writer, host, method, path, body=b""):
+    writer.write(
+        f"{method} {path} HTTP/1.1\r\nHost: {host}\r\n"
+        f"Content-Length: {len(body)}\r\n\r\n".encode() + body
+    )
+    await writer.drain()
+    status_line = await reader.readline()
+    length = 0
+    while True:
+        header = await reader.readline()
+        if header in (b"\r\n", b""):
+            break
+        name, _, value = header.decode("latin-1").partition(":")
+        if name.strip().lower() == "content-length":
+            length = int(value)
+    payload = await reader.readexactly(length)
+    return int(status_line.split()[1]), payload
+
+
+async def run_load(host, port, path, images, concurrency, total):
+    latencies = []
+    statuses = Counter()
+    counter = iter(range(total))
+
+    async def client():
+        reader, writer = await asyncio.open_connection(host, port)
+        try:
+            for index in counter:
+                body = images[index % len(images)]
+                start = time.perf_counter()
+                status, _ = await request(reader, writer, host, "POST", path, body)
+                latencies.append(time.perf_counter() - start)
+                statuses[status] += 1
+        finally:
+            writer.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*[client() for _ in range(concurrency)])
+    elapsed = time.perf_counter() - start
+
+    reader, writer = await asyncio.open_connection(host, port)
+    _, payload = await request(reader, writer, host, "GET", "/metrics")
+    writer.close()
+    return elapsed, sorted(latencies), statuses, json.loads(payload)
+
+
+async def wait_until_ready(host, port, timeout=120):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            reader, writer = await asyncio.open_connection(host, port)
+        except OSError:
+            await asyncio.sleep(0.2)
+            continue
+        status, _ = await request(reader, writer, host, "GET", "/health")
+        writer.close()
+        if status == 200:
+            return
+    raise RuntimeError("Server did not start")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--url", default="http://127.0.0.1:8080")
+    parser.add_argument("--endpoint", choices=("crop", "detect"), default="crop")
+    parser.add_argument("--strict", action="store_true")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument(
+        "--max-side",
+        type=int,
+        default=1024,
+        help="Downscale the fixture images sent as requests (default: 1024)",
+    )
+    parser.add_argument("--start-server", action="store_true")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--max-batch-size", type=int, default=8)
+    parser.add_argument("--max-wait-ms", type=float, default=10)
+    args = parser.parse_args()
+
+    url = urlsplit(args.url)
+    host, port = url.hostname, url.port or 80
+    path = f"/{args.endpoint}" + ("?strict=1" if args.strict else "")
+    images = [
+        cv2.imencode(".jpg", img)[1].tobytes()
+        for _, img in load_fixture_images(max_side=args.max_side)
+    ]
+
+    server = None
+    if args.start_server:
+        server = subprocess.Popen(
+            [
+                sys.executable,
+                "-m",
+                "src.server",
+                "--host",
+                host,
+                "--port",
+                str(port),
+                "--workers",
+                str(args.workers),
+                "--max-batch-size",
+                str(args.max_batch_size),
+                "--max-wait-ms",
+                str(args.max_wait_ms),
+            ],
+            cwd=os.path.join(os.path.dirname(__file__), ".."),
+        )
+    try:
+        if server is not None:
+            asyncio.run(wait_until_ready(host, port))
+        elapsed, latencies, statuses, metrics = asyncio.run(
+            run_load(host, port, path, images, args.concurrency, args.requests)
+        )
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    print(
+        f"{len(latencies)} requests to {path} at concurrency {args.concurrency}: "
+        f"{len(latencies) / elapsed:.1f} req/s"
+    )
+    print(
+        "latency ms: "
+        + "  ".join(
+            f"{name} {percentile(latencies, q) * 1000:.1f}"
+            for name, q in (("p50", 50), ("p95", 95), ("p99", 99), ("max", 100))
+        )
+    )
+    print(f"status codes: {dict(sorted(statuses.items()))}")
+    print(
+        f"server: mean batch size {metrics['mean_batch_size']}, "
+        f"max queue depth {metrics['max_queue_depth']}, "
+        f"batches {metrics['batches']}"
+    )
+
+
+if __name__ == "__main__":
+    main()
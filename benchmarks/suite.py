@@ -0,0 +1,305 @@
+"""
+Benchmark suite for the detection and cropping hot paths, with baseline
+comparison for catching regressions.
+
+Generates a fixed corpus (frontal, profile and no-face images from VGA up to
+48 MP) and times detect_face in strict and normal mode, process_image end to
+end, mask creation and encoding. Each benchmark reports throughput, latency
+percentiles and peak traced memory.
+
+Usage: python -m benchmarks.suite [--sizes vga,12mp] [--repeat 5]
+           [--detection-size 1024] [--corpus DIR] [--save results.json]
+           [--compare baseline.json] [--threshold 0.2]
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+
+from src.encoder import Encoder
+from src.processor import ImageProcessor
+from src.profiling import percentile
+from src.utils import circular_mask_array
+
+from .common import FIXTURES
+
+RESOLUTIONS = {
+    "vga": (640, 480),
+    "2mp": (1920, 1080),
+    "12mp": (4000, 3000),
+    "24mp": (6000, 4000),
+    "48mp": (8000, 6000),
+}
+
+# pexels-sample-2 is the most turned head among the fixtures; the no-face
+# image is synthesized so it runs through every fallback stage
+CASES = {
+    "frontal": "pexels-sample-3.jpg",
+    "profile": "pexels-sample-2.jpg",
+    "noface": None,
+}
+
+CORPUS_SEED = 1234
+CORPUS_QUALITY = 90
+
+
+def synthesize_noface(width, height):
+    """Smooth seeded noise with no face-like structure"""
+    rng = np.random.default_rng(CORPUS_SEED)
+    small = rng.integers(0, 256, (12, 16, 3), dtype=np.uint8)
+    return cv2.resize(small, (width, height), interpolation=cv2.INTER_CUBIC)
+
+
+def fit_to(img, width, height):
+    """Scale to cover width x height and center crop to exactly that size"""
+    scale = max(width / img.shape[1], height / img.shape[0])
+    interpolation = cv2.INTER_AREA if scale < 1 else cv2.INTER_CUBIC
+    img = cv2.resize(img, None, fx=scale, fy=scale, interpolation=interpolation)
+    y = (img.shape[0] - height) // 2
+    x = (img.shape[1] - width) // 2
+    return img[y : y + height, x : x + width]
+
+
+def build_corpus(directory, sizes):
+    """
+    Write the benchmark corpus as JPEGs, reusing files already present
+    Args:
+        directory: Corpus directory
+        sizes: Resolution names from RESOLUTIONS
+    Returns: List of (size, case, path)
+    """
+    os.makedirs(directory, exist_ok=True)
+    corpus = []
+    for size in sizes:
+        width, height = RESOLUTIONS[size]
+        for case, fixture in CASES.items():
+            path = os.path.join(directory, f"{case}-{size}.jpg")
+            if not os.path.exists(path):
+                if fixture:
+                    source = cv2.imread(os.path.join(FIXTURES, fixture))
+                    img = fit_to(source, width, height)
+                else:
+                    img = synthesize_noface(width, height)
+                cv2.imwrite(path, img, [cv2.IMWRITE_JPEG_QUALITY, CORPUS_QUALITY])
+            corpus.append((size, case, path))
+    return corpus
+
+
+def measure(func, repeat, warmup=1):
+    """
+    Time repeated calls, then trace one extra call for peak memory
+    Args:
+        func: Zero-argument callable
+        repeat: Number of timed calls
+        warmup: Untimed calls before timing
+    Returns: dict with latency percentiles, throughput and peak memory
+    """
+    for _ in range(warmup):
+        func()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    # Tracing slows allocation down, so memory is taken from a separate call
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    samples.sort()
+    total = sum(samples)
+    return {
+        "count": repeat,
+        "mean_ms": total / repeat,
+        "p50_ms": percentile(samples, 50),
+        "p95_ms": percentile(samples, 95),
+        "p99_ms": percentile(samples, 99),
+        "throughput_per_s": repeat / total * 1000 if total else 0.0,
+        "peak_mib": peak / (1024 * 1024),
+    }
+
+
+def run_suite(corpus, repeat, output_dir, detection_size=None):
+    """
+    Run every benchmark over the corpus
+    Args:
+        corpus: List of (size, case, path) from build_corpus
+        repeat: Number of timed calls per benchmark
+        output_dir: Scratch directory for process_image output
+        detection_size: Passed through to ImageProcessor
+    Returns: dict mapping benchmark name to its measurement
+    """
+    results = {}
+    encoders = {preset: Encoder.from_preset(preset) for preset in Encoder.PRESETS}
+    with ImageProcessor(detection_size=detection_size) as processor:
+        detector = processor.detector
+        for size, case, path in corpus:
+            img = cv2.imread(path)
+            for mode, strict in (("normal", False), ("strict", True)):
+                name = f"detect.{mode}/{case}/{size}"
+                results[name] = measure(
+                    lambda: detector.detect_face(img, strict=strict), repeat
+                )
+                print_result(name, results[name])
+
+            output_path = os.path.join(output_dir, f"{case}-{size}.png")
+            name = f"process_image/{case}/{size}"
+
+            def process():
+                # Keep "No face detected" messages out of the report
+                with contextlib.redirect_stdout(io.StringIO()):
+                    processor.process_image(path, output_path, True, False)
+
+            results[name] = measure(process, repeat)
+            print_result(name, results[name])
+
+            if case != "frontal":
+                continue
+            face_bbox = detector.detect_face(img, strict=False)
+            if not face_bbox:
+                continue
+            crop = processor.crop_face(img, face_bbox, circular_mask=True)
+            crop_size = (crop.shape[1], crop.shape[0])
+            for label, supersample in (("mask", 1), ("mask.antialias", 4)):
+                name = f"{label}/{size}"
+
+                def create_mask(supersample=supersample):
+                    circular_mask_array.cache_clear()
+                    circular_mask_array(crop_size, supersample)
+
+                results[name] = measure(create_mask, repeat)
+                print_result(name, results[name])
+            for preset, encoder in encoders.items():
+                buffer = processor.crop_face(
+                    img, face_bbox, True, encoder.channel_order
+                )
+                name = f"encode.{preset}/{size}"
+                results[name] = measure(lambda: encoder.encode(buffer), repeat)
+                print_result(name, results[name])
+    return results
+
+
+def print_result(name, result):
+    print(
+        f"{name:<32} p50 {result['p50_ms']:9.1f} ms"
+        f"  p95 {result['p95_ms']:9.1f} ms"
+        f"  p99 {result['p99_ms']:9.1f} ms"
+        f"  {result['throughput_per_s']:8.2f}/s"
+        f"  peak {result['peak_mib']:8.1f} MiB"
+    )
+
+
+def environment():
+    """Versions that timings depend on, stored alongside results"""
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "opencv": cv2.__version__,
+        "numpy": np.__version__,
+    }
+
+
+def compare(results, baseline, threshold):
+    """
+    Compare results against a baseline
+    Args:
+        results: Current benchmark results
+        baseline: Baseline benchmark results
+        threshold: Allowed relative slowdown (or memory growth), e.g. 0.2
+    Returns: List of (name, metric, baseline value, current value) regressions
+    """
+    regressions = []
+    for name, result in sorted(results.items()):
+        base = baseline.get(name)
+        if not base:
+            continue
+        for metric in ("p50_ms", "peak_mib"):
+            # Ignore sub-millisecond / sub-MiB noise
+            if base[metric] < 1.0:
+                continue
+            if result[metric] > base[metric] * (1 + threshold):
+                regressions.append((name, metric, base[metric], result[metric]))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--sizes",
+        default=",".join(RESOLUTIONS),
+        help=f"Comma-separated resolutions ({', '.join(RESOLUTIONS)})",
+    )
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--detection-size", type=int)
+    parser.add_argument(
+        "--corpus", help="Keep the generated corpus in this directory and reuse it"
+    )
+    parser.add_argument("--save", help="Write results to this JSON file")
+    parser.add_argument("--compare", help="Baseline JSON to compare against")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.2,
+        help="Allowed relative regression before failing (default 0.2)",
+    )
+    args = parser.parse_args()
+
+    sizes = [size.strip().lower() for size in args.sizes.split(",") if size.strip()]
+    unknown = [size for size in sizes if size not in RESOLUTIONS]
+    if unknown:
+        parser.error(f"unknown sizes: {', '.join(unknown)}")
+    if args.repeat < 1:
+        parser.error("--repeat must be at least 1")
+
+    with tempfile.TemporaryDirectory() as scratch:
+        corpus_dir = args.corpus or os.path.join(scratch, "corpus")
+        output_dir = os.path.join(scratch, "output")
+        os.makedirs(output_dir)
+        corpus = build_corpus(corpus_dir, sizes)
+        print(f"{len(corpus)} corpus images, {args.repeat} repeats")
+        results = run_suite(corpus, args.repeat, output_dir, args.detection_size)
+
+    report = {
+        "environment": environment(),
+        "options": {"repeat": args.repeat, "detection_size": args.detection_size},
+        "results": results,
+    }
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+        print(f"Results written to {args.save}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("environment") != report["environment"]:
+            print("Warning: baseline was recorded in a different environment")
+        if baseline.get("options") != report["options"]:
+            print("Warning: baseline was recorded with different options")
+        regressions = compare(results, baseline.get("results", {}), args.threshold)
+        for name, metric, before, after in regressions:
+            print(
+                f"REGRESSION {name} {metric}: {before:.1f} -> {after:.1f}"
+                f" ({(after / before - 1) * 100:+.0f}%)"
+            )
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions beyond {args.threshold:.0%}")
+
+
+if __name__ == "__main__":
+    main()
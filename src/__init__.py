@@ -1,5 +1,24 @@
-from .processor import ImageProcessor
-from .detector import FaceDetector
-from .utils import create_circular_mask
+import importlib
+
+# Public names and the modules that define them. They are imported on first
+# access, so importing the package (or src.cli) does not load OpenCV and
+# MediaPipe.
+_LAZY = {
+    "ImageProcessor": ".processor",
+    "FaceDetector": ".detector",
+    "create_circular_mask": ".utils",
+}
 
 __all__ = ["ImageProcessor", "FaceDetector", "create_circular_mask"]
+
+
+def __getattr__(name):
+    if name not in _LAZY:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(_LAZY[name], __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
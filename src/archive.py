@@ -0,0 +1,178 @@
+import functools
+import io
+import posixpath
+import tarfile
+import threading
+import time
+import zipfile
+import zlib
+
+from .discovery import InputScanner
+
+ARCHIVE_EXTENSIONS = (".zip", ".tar", ".tar.gz", ".tgz")
+
+# Corrupt or truncated archives; reported as OSError
+_READ_ERRORS = (zipfile.BadZipFile, tarfile.TarError, EOFError, zlib.error)
+
+
+def is_archive(path):
+    return path.lower().endswith(ARCHIVE_EXTENSIONS)
+
+
+def _is_zip(path):
+    return path.lower().endswith(".zip")
+
+
+def _tar_compression(path):
+    return "gz" if path.lower().endswith((".tar.gz", ".tgz")) else ""
+
+
+def archive_member_path(relpath, extension):
+    """Output member name for an input relpath: a/photo.jpg -> a/photo_cropped.png"""
+    return posixpath.splitext(relpath)[0] + "_cropped" + extension
+
+
+class ArchiveMember:
+    """
+    An image read from an archive, standing in for an input path. The
+    encoded bytes are released once read, so finished tasks hold no pixels.
+    """
+
+    __slots__ = ("archive", "name", "_data")
+
+    def __init__(self, archive, name, data):
+        self.archive = archive
+        self.name = name
+        self._data = data
+
+    def read(self):
+        """Return the encoded bytes (only once)"""
+        data, self._data = self._data, None
+        return data
+
+    def __str__(self):
+        return f"{self.archive}:{self.name}"
+
+
+class ArchiveScanner(InputScanner):
+    """
+    Enumerate the images in a zip or tar archive one member at a time,
+    applying the same filters as InputScanner. Tar archives (also gzipped)
+    are read as a stream; zip archives through their central directory. A
+    member is only read once the consumer asks for the next image, so the
+    archive is never extracted or held in memory as a whole.
+    """
+
+    def scan(self):
+        """
+        Yields: (relpath, ArchiveMember) for each matching image, in archive order
+        Raises: OSError if the archive cannot be read or is truncated
+        """
+        self.start = time.perf_counter()
+        try:
+            members = self._zip_members() if _is_zip(self.root) else self._tar_members()
+            for name, size, read in members:
+                self.scanned += 1
+                relpath = self._relpath(name)
+                if (
+                    relpath is None
+                    or not self._accepts_name(relpath)
+                    or not self._accepts_size(size)
+                ):
+                    continue
+                self.matched += 1
+                yield relpath, ArchiveMember(self.root, relpath, read())
+        except _READ_ERRORS as e:
+            raise OSError(f"Could not read archive {self.root}: {e}") from None
+        finally:
+            self.done = True
+            self.elapsed = time.perf_counter() - self.start
+
+    def _relpath(self, name):
+        # Members outside the archive root (absolute or with "..") are skipped
+        relpath = posixpath.normpath(name)
+        if relpath.startswith(("/", "../")) or relpath == "..":
+            print(f"Warning: Skipping unsafe archive member {name}")
+            return None
+        if not self.recursive and "/" in relpath:
+            return None
+        if self.exclude and any(
+            self._matches(prefix, self.exclude) for prefix in _parent_dirs(relpath)
+        ):
+            return None
+        return relpath
+
+    def _zip_members(self):
+        with zipfile.ZipFile(self.root) as archive:
+            for info in archive.infolist():
+                if not info.is_dir():
+                    yield (
+                        info.filename,
+                        info.file_size,
+                        functools.partial(archive.read, info),
+                    )
+
+    def _tar_members(self):
+        with tarfile.open(self.root, "r|*") as archive:
+            for info in archive:
+                if info.isfile():
+                    yield info.name, info.size, archive.extractfile(info).read
+                # Stream mode keeps every header otherwise
+                archive.members = []
+
+
+def _parent_dirs(relpath):
+    parts = relpath.split("/")[:-1]
+    return ["/".join(parts[: i + 1]) for i in range(len(parts))]
+
+
+class ArchiveWriter:
+    """
+    Write output files as members of a zip or tar (optionally gzipped)
+    archive as they are produced, without temporary files. Safe to call from
+    several threads.
+    """
+
+    def __init__(self, path):
+        """
+        Args:
+            path: Archive to create; the format follows the extension
+                (.zip, .tar, .tar.gz or .tgz)
+        """
+        self.path = path
+        self.count = 0
+        self._lock = threading.Lock()
+        if _is_zip(path):
+            # Encoded PNG and WebP data does not compress further
+            self._zip = zipfile.ZipFile(path, "w", zipfile.ZIP_STORED)
+            self._tar = None
+        else:
+            self._zip = None
+            self._tar = tarfile.open(path, "w|" + _tar_compression(path))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def add(self, name, data):
+        """Add a member with the given name ("/"-separated) and bytes"""
+        with self._lock:
+            if self._zip is not None:
+                info = zipfile.ZipInfo(name, time.localtime()[:6])
+                self._zip.writestr(info, data)
+            else:
+                info = tarfile.TarInfo(name)
+                info.size = len(data)
+                info.mtime = int(time.time())
+                self._tar.addfile(info, io.BytesIO(data))
+                self._tar.members = []
+            self.count += 1
+
+    def close(self):
+        with self._lock:
+            if self._zip is not None:
+                self._zip.close()
+            else:
+                self._tar.close()
@@ -0,0 +1,140 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import Counter
+
+import numpy as np
+
+from .defaults import DEFAULT_CACHE_SIZE
+
+
+def content_digest(data):
+    """Hash encoded image bytes, or a decoded image array, for use as a cache key"""
+    digest = hashlib.blake2b(digest_size=16)
+    if isinstance(data, np.ndarray):
+        digest.update(f"{data.shape}{data.dtype}".encode())
+        data = np.ascontiguousarray(data)
+    digest.update(memoryview(data).cast("B"))
+    return digest.hexdigest()
+
+
+def file_digest(path, chunk_size=1024 * 1024):
+    """
+    content_digest of a file's bytes, read in chunks so large files are never
+    held in memory; None if the file cannot be read
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    try:
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(chunk_size), b""):
+                digest.update(chunk)
+    except OSError:
+        return None
+    return digest.hexdigest()
+
+
+class DetectionCache:
+    """
+    Persistent face detection results keyed by image content and detector
+    settings, stored in SQLite and bounded by LRU eviction. Results for
+    images without a face are cached too.
+    """
+
+    def __init__(self, path, max_entries=DEFAULT_CACHE_SIZE):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        # Autocommit plus WAL keeps single-row writes cheap and lets several
+        # worker processes share one cache file
+        self._conn = sqlite3.connect(
+            path, timeout=30, isolation_level=None, check_same_thread=False
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA mmap_size=268435456")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS detections ("
+            "key TEXT PRIMARY KEY, x INTEGER, y INTEGER, w INTEGER, h INTEGER, "
+            "last_used REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS detections_last_used ON detections (last_used)"
+        )
+        self._count = self._conn.execute("SELECT COUNT(*) FROM detections").fetchone()[
+            0
+        ]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM detections").fetchone()[0]
+
+    @staticmethod
+    def make_key(digest, settings):
+        """Combine a content digest with a dict of detector settings"""
+        settings_json = json.dumps(settings, sort_keys=True)
+        settings_hash = hashlib.blake2b(settings_json.encode(), digest_size=8)
+        return f"{digest}:{settings_hash.hexdigest()}"
+
+    def get(self, key):
+        """
+        Look up a detection result
+        Returns: tuple (hit, face_bbox); face_bbox is None for a cached no-face result
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT x, y, w, h FROM detections WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return False, None
+            self.hits += 1
+            self._conn.execute(
+                "UPDATE detections SET last_used = ? WHERE key = ?", (time.time(), key)
+            )
+        return True, (None if row[0] is None else tuple(row))
+
+    def put(self, key, face_bbox):
+        """Store a detection result (None for no face), evicting old entries if full"""
+        values = tuple(int(v) for v in face_bbox) if face_bbox else (None,) * 4
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT OR REPLACE INTO detections VALUES (?, ?, ?, ?, ?, ?)",
+                (key, *values, time.time()),
+            )
+            self._count += cursor.rowcount
+            if self._count > self.max_entries:
+                self._evict()
+
+    def _evict(self):
+        # Evict a little more than needed so eviction does not run on every put
+        self._count = self._conn.execute("SELECT COUNT(*) FROM detections").fetchone()[
+            0
+        ]
+        excess = self._count - self.max_entries
+        if excess <= 0:
+            return
+        excess += self.max_entries // 20
+        self._conn.execute(
+            "DELETE FROM detections WHERE key IN "
+            "(SELECT key FROM detections ORDER BY last_used LIMIT ?)",
+            (excess,),
+        )
+        self._count = max(0, self._count - excess)
+
+    def stats(self):
+        """Counter of cache hits and misses so far"""
+        return Counter(cache_hits=self.hits, cache_misses=self.misses)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
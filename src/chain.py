@@ -0,0 +1,254 @@
+import json
+import threading
+from collections import Counter
+
+from .defaults import MP_MIN_SCORE
+
+# Parameters of each stage type and their defaults. A MediaPipe stage keeps
+# its best detection if the score clears min_score; Haar stages keep their
+# largest face and profile stages their first one.
+STAGE_TYPES = {
+    "mediapipe": {
+        "min_confidence": 0.05,
+        "min_score": MP_MIN_SCORE,
+        "model_selection": 1,
+    },
+    "haar": {"scale_factor": 1.05, "min_neighbors": 3, "min_size": 30},
+    "profile": {
+        "scale_factor": 1.05,
+        "min_neighbors": 2,
+        "min_size": 30,
+        "flipped": False,
+    },
+}
+
+# Adaptive mode: stages keep their configured order until they have run this
+# many times; a stage that has never found a face after ADAPTIVE_SKIP_RUNS
+# runs is skipped, except on every ADAPTIVE_PROBE_INTERVAL-th image so it is
+# picked up again if the batch changes.
+ADAPTIVE_MIN_RUNS = 10
+ADAPTIVE_SKIP_RUNS = 50
+ADAPTIVE_PROBE_INTERVAL = 20
+
+
+class DetectorStage:
+    """One detection method of the chain and its parameters"""
+
+    def __init__(self, type, name=None, **params):
+        """
+        Args:
+            type: "mediapipe", "haar" or "profile"
+            name: Stage name in statistics and profiles (default: derived
+                from the type and parameters, e.g. haar_1.05)
+            **params: Parameters overriding the defaults in STAGE_TYPES
+        Raises: ValueError on an unknown type or parameter
+        """
+        if type not in STAGE_TYPES:
+            raise ValueError(
+                f"Unknown detector stage type {type!r} "
+                f"(expected one of {', '.join(STAGE_TYPES)})"
+            )
+        unknown = set(params) - set(STAGE_TYPES[type])
+        if unknown:
+            raise ValueError(
+                f"Unknown parameter(s) for {type} stage: {', '.join(sorted(unknown))}"
+            )
+        self.type = type
+        self.params = {**STAGE_TYPES[type], **params}
+        if "scale_factor" in self.params and self.params["scale_factor"] <= 1:
+            raise ValueError("Stage scale_factor must be greater than 1")
+        if "min_score" in self.params and not 0 <= self.params["min_score"] <= 1:
+            raise ValueError("Stage min_score must be between 0 and 1")
+        self.name = name or self._default_name()
+
+    def _default_name(self):
+        if self.type == "haar":
+            return f"haar_{self.params['scale_factor']}"
+        if self.type == "profile" and self.params["flipped"]:
+            return "profile_flipped"
+        return self.type
+
+    def settings(self):
+        """Stage settings that affect its result"""
+        return {"type": self.type, **self.params}
+
+
+class DetectorChain:
+    """
+    Ordered detection stages, tried on an image until one finds a face, with
+    an optional per-image time budget and adaptive ordering. Per-stage runs,
+    hits and time are counted across all images.
+    """
+
+    def __init__(self, stages, time_budget=None, adaptive=False):
+        """
+        Args:
+            stages: List of DetectorStage or of stage dicts ({"type": ...,
+                "name": ..., parameters})
+            time_budget: Seconds per image; a stage is not started once the
+                budget is used up or if its mean cost so far exceeds what is
+                left (the first stage always runs)
+            adaptive: Order stages by observed cost per hit and skip stages
+                that never find a face
+        Raises: ValueError on an invalid stage or duplicate stage names
+        """
+        self.stages = [
+            stage if isinstance(stage, DetectorStage) else DetectorStage(**stage)
+            for stage in stages
+        ]
+        if not self.stages:
+            raise ValueError("The detector chain needs at least one stage")
+        names = [stage.name for stage in self.stages]
+        if len(set(names)) != len(names):
+            raise ValueError("Detector stage names must be unique")
+        if time_budget is not None and time_budget <= 0:
+            raise ValueError("Time budget must be positive")
+        self.time_budget = time_budget
+        self.adaptive = adaptive
+        self._stats = Counter()
+        self._lock = threading.Lock()
+
+    def settings(self):
+        """Chain settings that affect detection results"""
+        return {
+            "stages": [stage.settings() for stage in self.stages],
+            "time_budget": self.time_budget,
+            "adaptive": self.adaptive,
+        }
+
+    def plan(self, strict=False):
+        """
+        Stages to try on the next image, in order
+        Args:
+            strict: Only MediaPipe stages
+        """
+        stages = [s for s in self.stages if not strict or s.type == "mediapipe"]
+        with self._lock:
+            self._stats["chain.images"] += 1
+            if not self.adaptive:
+                return stages
+            images = self._stats["chain.images"]
+            runs = {s.name: self._stats[f"chain.{s.name}.runs"] for s in stages}
+            hits = {s.name: self._stats[f"chain.{s.name}.hits"] for s in stages}
+            seconds = {s.name: self._stats[f"chain.{s.name}.seconds"] for s in stages}
+
+        # Stages with enough samples are sorted by expected time per face
+        # found, within the slots they occupy; the others keep their place
+        sampled = [i for i, s in enumerate(stages) if runs[s.name] >= ADAPTIVE_MIN_RUNS]
+
+        def cost_per_hit(stage):
+            if not hits[stage.name]:
+                return float("inf")
+            return seconds[stage.name] / hits[stage.name]
+
+        ordered = sorted((stages[i] for i in sampled), key=cost_per_hit)
+        for i, stage in zip(sampled, ordered):
+            stages[i] = stage
+
+        # Stages that never found a face are skipped, except on probe images;
+        # the first stage still runs if that would leave nothing
+        probe = images % ADAPTIVE_PROBE_INTERVAL == 0
+        planned = [
+            stage
+            for stage in stages
+            if probe or runs[stage.name] < ADAPTIVE_SKIP_RUNS or hits[stage.name]
+        ] or stages[:1]
+        with self._lock:
+            for stage in stages:
+                if stage not in planned:
+                    self._stats[f"chain.{stage.name}.skipped"] += 1
+        return planned
+
+    def fits_budget(self, stage, spent):
+        """
+        Whether stage can still run on an image that has had spent seconds of
+        detection: false once the time budget is used up or if the stage's
+        mean cost so far exceeds what is left of it. Counted as a budget skip
+        of the stage if not.
+        """
+        if self.time_budget is None:
+            return True
+        remaining = self.time_budget - spent
+        with self._lock:
+            runs = self._stats[f"chain.{stage.name}.runs"]
+            seconds = self._stats[f"chain.{stage.name}.seconds"]
+            if remaining > 0 and (not runs or seconds / runs <= remaining):
+                return True
+            self._stats[f"chain.{stage.name}.budget_skips"] += 1
+        return False
+
+    def record(self, stage, seconds, hit):
+        """Count one run of stage that took seconds and found a face or not"""
+        with self._lock:
+            self._stats[f"chain.{stage.name}.runs"] += 1
+            self._stats[f"chain.{stage.name}.seconds"] += seconds
+            if hit:
+                self._stats[f"chain.{stage.name}.hits"] += 1
+
+    def stats(self):
+        """Counter of images and per-stage runs, hits, seconds, skips and budget skips"""
+        with self._lock:
+            return Counter(self._stats)
+
+    def format_report(self, stats=None):
+        """
+        Per-stage hit rate and cost as text
+        Args:
+            stats: Counter from stats(), possibly summed over several chains
+                with the same stages (default: this chain's)
+        """
+        if stats is None:
+            stats = self.stats()
+        lines = [
+            f"Detector chain: {stats['chain.images']} images",
+            f"  {'stage':16s} {'runs':>7s} {'hits':>7s} {'hit rate':>9s} "
+            f"{'mean ms':>8s} {'total s':>8s} {'skipped':>8s} {'budget':>7s}",
+        ]
+        for stage in self.stages:
+            runs = stats[f"chain.{stage.name}.runs"]
+            hits = stats[f"chain.{stage.name}.hits"]
+            seconds = stats[f"chain.{stage.name}.seconds"]
+            hit_rate = f"{hits / runs:9.1%}" if runs else f"{'-':>9s}"
+            mean_ms = f"{seconds / runs * 1000:8.1f}" if runs else f"{'-':>8s}"
+            lines.append(
+                f"  {stage.name:16s} {runs:7d} {hits:7d} {hit_rate} {mean_ms} "
+                f"{seconds:8.2f} {stats[f'chain.{stage.name}.skipped']:8d} "
+                f"{stats[f'chain.{stage.name}.budget_skips']:7d}"
+            )
+        return "\n".join(lines)
+
+
+def load_chain_config(path):
+    """
+    Read a detector chain from a JSON file: either a list of stages or an
+    object with "stages" and optionally "time_budget_ms" and "adaptive"
+    Returns: dict with the keys stages, time_budget (seconds or None) and
+        adaptive
+    Raises: ValueError if the file cannot be read or is not a valid chain
+    """
+    try:
+        with open(path) as f:
+            config = json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        raise ValueError(f"Could not read detector chain {path}: {e}")
+    if isinstance(config, list):
+        config = {"stages": config}
+    if not isinstance(config, dict) or not isinstance(config.get("stages"), list):
+        raise ValueError(f"Detector chain {path} must define a list of stages")
+    unknown = set(config) - {"stages", "time_budget_ms", "adaptive"}
+    if unknown:
+        raise ValueError(
+            f"Unknown detector chain setting(s): {', '.join(sorted(unknown))}"
+        )
+    budget_ms = config.get("time_budget_ms")
+    chain = {
+        "stages": config["stages"],
+        "time_budget": budget_ms / 1000 if budget_ms is not None else None,
+        "adaptive": bool(config.get("adaptive", False)),
+    }
+    # Validate now so errors surface before any image is processed
+    try:
+        DetectorChain(**chain)
+    except TypeError as e:
+        raise ValueError(f"Invalid detector stage in {path}: {e}")
+    return chain
@@ -1,75 +1,608 @@
 import os
 import argparse
+import itertools
 import sys
-from .processor import ImageProcessor
+import time
+from collections import Counter
+from .defaults import (
+    DEFAULT_CACHE_SIZE,
+    DEFAULT_KEYFRAME_INTERVAL,
+    DEFAULT_SMOOTHING,
+    DEFAULT_TEMPLATE,
+    ENCODER_BACKENDS,
+    ENCODER_PRESETS,
+    LARGE_IMAGE_PIXELS,
+    MP_MIN_SCORE,
+)
+from .archive import ArchiveScanner, ArchiveWriter, archive_member_path, is_archive
+from .chain import DetectorChain, load_chain_config
+from .discovery import InputScanner, is_video, output_path_for, parse_size
+from .manifest import MANIFEST_NAME, RunManifest, settings_fingerprint
+from .profiling import Profiler
+
+# Modules that load OpenCV and MediaPipe are imported by the functions that
+# use them, so --help and argument errors return without loading either
+
+# Seconds between progress lines during a directory run
+PROGRESS_INTERVAL = 2.0
 
 
 def main():
     parser = argparse.ArgumentParser(description="Crop faces from images")
-    parser.add_argument("input", help="Input image file or directory")
     parser.add_argument(
-        "--output", help="Output directory (required for directory input)"
+        "input", help="Input image, video, directory or .zip/.tar/.tar.gz archive"
+    )
+    parser.add_argument(
+        "--output",
+        help="Output directory, or a .zip/.tar/.tar.gz archive to write the "
+        "crops into (required for directory and archive input)",
     )
     parser.add_argument("--circular", action="store_true", help="Create circular mask")
+    parser.add_argument(
+        "--antialias",
+        action="store_true",
+        help="Smooth the edge of the circular mask",
+    )
     parser.add_argument(
         "--strict",
         action="store_true",
         help="Only use MediaPipe for face detection (more accurate but may miss some faces)",
     )
+    parser.add_argument(
+        "--multi-face",
+        action="store_true",
+        help="Write one crop per detected face, numbered left to right "
+        "(photo_cropped_1.png, photo_cropped_2.png, ...)",
+    )
+    parser.add_argument(
+        "--min-score",
+        type=float,
+        help="With --multi-face, minimum MediaPipe detection score "
+        f"(default: {MP_MIN_SCORE})",
+    )
+    parser.add_argument(
+        "--variant",
+        action="append",
+        metavar="SPEC",
+        help="Write an output variant instead of the regular output, e.g. 256, "
+        "128,circular or 64/128/256,square/circular,webp-lossless; "
+        "repeatable, and the image is decoded and detected only once",
+    )
+    parser.add_argument(
+        "--name-template",
+        help="File name template for --variant outputs with the fields {stem}, "
+        "{size}, {mask}, {format} and {ext} "
+        f"(default: {DEFAULT_TEMPLATE})",
+    )
+    parser.add_argument(
+        "--sequence",
+        action="store_true",
+        help="Treat the input directory as the ordered frames of one video; "
+        "video files are detected by extension",
+    )
+    parser.add_argument(
+        "--keyframe-interval",
+        type=int,
+        default=DEFAULT_KEYFRAME_INTERVAL,
+        help="For video, run full face detection at least every N frames and "
+        f"track the face in between (default: {DEFAULT_KEYFRAME_INTERVAL})",
+    )
+    parser.add_argument(
+        "--smoothing",
+        type=float,
+        default=DEFAULT_SMOOTHING,
+        help="For video, how strongly the crop window follows its previous "
+        f"position, 0 to below 1 (default: {DEFAULT_SMOOTHING})",
+    )
+    parser.add_argument(
+        "--recursive",
+        action="store_true",
+        help="Process subdirectories too, mirroring the input tree under --output",
+    )
+    parser.add_argument(
+        "--include",
+        action="append",
+        metavar="GLOB",
+        help="Only process files whose name or relative path matches (repeatable)",
+    )
+    parser.add_argument(
+        "--exclude",
+        action="append",
+        metavar="GLOB",
+        help="Skip files and directories whose name or relative path matches "
+        "(repeatable)",
+    )
+    parser.add_argument(
+        "--min-size",
+        help="Skip files smaller than this, e.g. 50K (optional)",
+    )
+    parser.add_argument(
+        "--max-size",
+        help="Skip files larger than this, e.g. 40M (optional)",
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=1,
+        help="Number of worker processes for directory input (default: 1)",
+    )
+    parser.add_argument(
+        "--chunk-size",
+        type=int,
+        help="Images handed to a worker at a time with --jobs (default: automatic)",
+    )
+    parser.add_argument(
+        "--threads",
+        type=int,
+        default=4,
+        help="Reader and encoder threads in the directory pipeline (default: 4)",
+    )
+    parser.add_argument(
+        "--pipeline-stats",
+        action="store_true",
+        help="Print per-stage throughput and queue depth after a directory run",
+    )
+    parser.add_argument(
+        "--large-image",
+        type=float,
+        default=LARGE_IMAGE_PIXELS / 1e6,
+        metavar="MP",
+        help="Detect uncompressed TIFF, BMP and PPM images of at least this many "
+        "megapixels on a thumbnail and read only the crop region "
+        "(default: 0, disabled)",
+    )
+    parser.add_argument(
+        "--detection-size",
+        type=int,
+        help="Run face detection on a copy downscaled to this longest side in pixels "
+        "(faster on large images; the crop still uses full resolution)",
+    )
+    parser.add_argument(
+        "--detector-chain",
+        metavar="JSON",
+        help="JSON file defining the detection stages and their parameters, "
+        "optionally with time_budget_ms and adaptive (default: MediaPipe, "
+        "frontal Haar, then profile Haar)",
+    )
+    parser.add_argument(
+        "--time-budget",
+        type=float,
+        metavar="MS",
+        help="Per-image detection time budget: skip further stages once it is "
+        "used up or when a stage's mean cost exceeds what is left",
+    )
+    parser.add_argument(
+        "--adaptive-chain",
+        action="store_true",
+        help="Reorder detection stages by observed cost per face found and "
+        "skip stages that never find one",
+    )
+    parser.add_argument(
+        "--detector-stats",
+        action="store_true",
+        help="Print per-stage detection hit rates and costs after a directory run",
+    )
+    parser.add_argument(
+        "--preset",
+        choices=sorted(ENCODER_PRESETS),
+        default="png",
+        help="Output encoding preset (default: png)",
+    )
+    parser.add_argument(
+        "--backend",
+        choices=ENCODER_BACKENDS,
+        help="Encoder backend, overriding the preset's",
+    )
+    parser.add_argument(
+        "--compression",
+        type=int,
+        help="Compression level: 0-9 for PNG, 0-6 for WebP with the pil backend "
+        "(default: preset's)",
+    )
+    parser.add_argument(
+        "--cache",
+        help="SQLite file caching detection results across runs (optional)",
+    )
+    parser.add_argument(
+        "--cache-size",
+        type=int,
+        default=DEFAULT_CACHE_SIZE,
+        help=f"Maximum number of cached detection results (default: {DEFAULT_CACHE_SIZE})",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Skip images whose output is up to date and record results in a "
+        "manifest in the output directory, so interrupted runs resume",
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="With --incremental, reprocess every image even if up to date",
+    )
+    parser.add_argument(
+        "--profile",
+        metavar="OUT_JSON",
+        help="Write per-stage timing percentiles (p50/p95/p99) to a JSON file",
+    )
     args = parser.parse_args()
+    args.profiler = Profiler() if args.profile else None
+    if args.jobs < 1:
+        parser.error("--jobs must be at least 1")
+    if args.threads < 1:
+        parser.error("--threads must be at least 1")
+    if args.min_score is not None and not 0 <= args.min_score <= 1:
+        parser.error("--min-score must be between 0 and 1")
+    if args.keyframe_interval < 1:
+        parser.error("--keyframe-interval must be at least 1")
+    if not 0 <= args.smoothing < 1:
+        parser.error("--smoothing must be at least 0 and below 1")
+    if args.variant and args.multi_face:
+        parser.error("--variant cannot be combined with --multi-face")
+    if args.variant and (args.sequence or is_video(args.input)):
+        parser.error("--variant is not supported for video input")
+    if args.name_template and not args.variant:
+        parser.error("--name-template requires --variant")
+    if args.large_image < 0:
+        parser.error("--large-image must not be negative")
+    archive_input = is_archive(args.input) and os.path.isfile(args.input)
+    archive_output = bool(args.output) and is_archive(args.output)
+    if archive_output and (
+        args.sequence or (os.path.isfile(args.input) and not archive_input)
+    ):
+        parser.error("Archive output requires a directory or archive input")
+    if archive_output and args.jobs > 1:
+        parser.error("--jobs cannot be combined with archive output")
+    if args.incremental and (archive_input or archive_output):
+        parser.error("--incremental is not supported for archives")
+    if args.time_budget is not None and args.time_budget <= 0:
+        parser.error("--time-budget must be positive")
+    try:
+        args.chain = (
+            load_chain_config(args.detector_chain)
+            if args.detector_chain
+            else {"stages": None, "time_budget": None, "adaptive": False}
+        )
+    except ValueError as e:
+        parser.error(str(e))
+    if args.time_budget is not None:
+        args.chain["time_budget"] = args.time_budget / 1000
+    if args.adaptive_chain:
+        args.chain["adaptive"] = True
+    try:
+        args.min_size = parse_size(args.min_size) if args.min_size else None
+        args.max_size = parse_size(args.max_size) if args.max_size else None
+    except ValueError as e:
+        parser.error(str(e))
+
+    from .encoder import Encoder
+    from .variants import parse_variants
+
+    try:
+        args.encoder = Encoder.from_preset(args.preset, args.backend, args.compression)
+        args.variants = (
+            parse_variants(
+                args.variant, args.encoder, args.circular, args.name_template
+            )
+            if args.variant
+            else None
+        )
+    except ValueError as e:
+        parser.error(str(e))
+
+    # Check if input is a video, a file or a directory
+    if args.sequence or (os.path.isfile(args.input) and is_video(args.input)):
+        process_video_input(args)
+    elif os.path.isfile(args.input) and not archive_input:
+        process_file(args)
+    else:
+        process_directory(args)
+
+
+def processor_options(args):
+    """Keyword arguments for ImageProcessor built from the command line"""
+    return {
+        "detection_size": args.detection_size,
+        "cache_path": args.cache,
+        "cache_size": args.cache_size,
+        "encoder": args.encoder,
+        "antialias": args.antialias,
+        "large_image_pixels": int(args.large_image * 1e6),
+        "detector_stages": args.chain["stages"],
+        "time_budget": args.chain["time_budget"],
+        "adaptive": args.chain["adaptive"],
+    }
 
-    processor = ImageProcessor()
 
-    # Check if input is a file or directory
-    if os.path.isfile(args.input):
-        # Single file processing
-        output_path = (
-            args.output
-            if args.output
-            else os.path.splitext(args.input)[0] + "_cropped.png"
+def write_profile(args):
+    if args.profiler is not None:
+        args.profiler.write_json(args.profile)
+        print(f"Profile written to {args.profile}")
+
+
+def print_cache_stats(args, stats):
+    if args.cache:
+        print(
+            f"Detection cache: {stats['cache_hits']} hits, "
+            f"{stats['cache_misses']} misses"
         )
-        if processor.process_image(args.input, output_path, args.circular, args.strict):
-            print(f"Successfully processed {args.input} -> {output_path}")
-            sys.exit(0)
+
+
+def print_detector_stats(args, stats):
+    if args.detector_stats:
+        from .detector import FaceDetector
+
+        stages = args.chain["stages"] or FaceDetector.default_stages()
+        print(DetectorChain(stages).format_report(stats))
+
+
+def output_fingerprint(args):
+    """Fingerprint of every setting that affects the output images"""
+    from .detector import FaceDetector
+
+    detector = FaceDetector(
+        detection_size=args.detection_size,
+        stages=args.chain["stages"],
+        time_budget=args.chain["time_budget"],
+        adaptive=args.chain["adaptive"],
+    )
+    return settings_fingerprint(
+        {
+            "circular": args.circular,
+            "antialias": args.antialias,
+            "multi_face": args.multi_face,
+            "min_score": args.min_score,
+            "variants": [variant.settings() for variant in args.variants or []],
+            "large_image": args.large_image,
+            "detector": detector.settings(args.strict),
+            "encoder": args.encoder.settings(),
+        }
+    )
+
+
+def process_file(args):
+    # Single file processing
+    from .processor import ImageProcessor
+
+    output_path = (
+        args.output
+        if args.output
+        else os.path.splitext(args.input)[0] + "_cropped" + args.encoder.extension
+    )
+    with ImageProcessor(**processor_options(args), profiler=args.profiler) as processor:
+        if args.multi_face:
+            output_paths = processor.process_all_faces(
+                args.input, output_path, args.circular, args.strict, args.min_score
+            )
+            success = bool(output_paths)
+            output_path = ", ".join(output_paths)
+        elif args.variants:
+            output_paths = processor.process_variants(
+                args.input, output_path, args.variants, args.strict
+            )
+            success = bool(output_paths)
+            output_path = ", ".join(output_paths)
         else:
-            print(f"Failed to process {args.input}")
-            sys.exit(1)
+            success = processor.process_image(
+                args.input, output_path, args.circular, args.strict
+            )
+        print_cache_stats(args, processor.cache_stats())
+    write_profile(args)
+    if success:
+        print(f"Successfully processed {args.input} -> {output_path}")
+        sys.exit(0)
     else:
-        # Directory processing
-        if not args.output:
-            print("Error: Output directory is required when processing a directory")
-            sys.exit(1)
+        print(f"Failed to process {args.input}")
+        sys.exit(1)
 
-        if not os.path.exists(args.output):
-            os.makedirs(args.output)
-
-        success_count = 0
-        total_count = 0
-
-        for filename in os.listdir(args.input):
-            if filename.lower().endswith((".png", ".jpg", ".jpeg", ".webp")):
-                input_path = os.path.join(args.input, filename)
-                output_filename = os.path.splitext(filename)[0] + "_cropped.png"
-                output_path = os.path.join(args.output, output_filename)
-
-                total_count += 1
-                if processor.process_image(
-                    input_path, output_path, args.circular, args.strict
-                ):
-                    success_count += 1
-                    print(f"Successfully processed {filename}")
-                else:
-                    print(f"Failed to process {filename}")
-
-        if total_count == 0:
-            print("No image files found in directory")
-            sys.exit(1)
-        elif success_count == 0:
-            print("Failed to process any images")
+
+def process_video_input(args):
+    # Video file or frame sequence: one tracked face per frame
+    from .processor import ImageProcessor
+    from .video import process_video
+
+    output = args.output or os.path.splitext(args.input.rstrip("/\\"))[0] + "_cropped"
+    with ImageProcessor(**processor_options(args), profiler=args.profiler) as processor:
+        try:
+            stats = process_video(
+                processor,
+                args.input,
+                output,
+                args.circular,
+                args.strict,
+                args.keyframe_interval,
+                args.smoothing,
+            )
+        except ValueError as e:
+            print(f"Error: {e}")
             sys.exit(1)
-        else:
-            print(f"Successfully processed {success_count} out of {total_count} images")
-            sys.exit(0)
+    write_profile(args)
+    print(
+        f"Processed {stats['frames']} frames in {stats['seconds']:.2f} s "
+        f"({stats['fps']:.1f} frames/s): {stats['full_detections']} full "
+        f"detections, {stats['roi_detections']} tracked, {stats['lost']} "
+        "tracking losses"
+    )
+    if stats["written"] == 0:
+        print("No face detected in any frame")
+        sys.exit(1)
+    print(f"Wrote {stats['written']} cropped frames to {output}")
+    sys.exit(0)
+
+
+def process_directory(args):
+    # Directory or archive processing
+    from .processor import face_output_path
+
+    if not args.output:
+        print("Error: Output directory is required when processing a directory")
+        sys.exit(1)
+
+    # Archive output is written as results arrive; nothing goes to disk first
+    args.output_archive = None
+    if is_archive(args.output):
+        args.output_archive = ArchiveWriter(args.output)
+    elif not os.path.exists(args.output):
+        os.makedirs(args.output)
+
+    scanner = (ArchiveScanner if is_archive(args.input) else InputScanner)(
+        args.input,
+        recursive=args.recursive,
+        include=args.include,
+        exclude=args.exclude,
+        min_size=args.min_size,
+        max_size=args.max_size,
+        skip_dirs=[args.output],
+    )
+    counts = Counter()
+    # Only tasks still in flight are kept, so memory stays flat on huge trees
+    in_flight = {}
+
+    manifest = None
+    fingerprint = None
+    if args.incremental:
+        manifest = RunManifest(os.path.join(args.output, MANIFEST_NAME))
+        fingerprint = output_fingerprint(args)
+
+    def discover():
+        created = set()
+        for relpath, input_path in scanner.scan():
+            if args.output_archive:
+                output_path = archive_member_path(relpath, args.encoder.extension)
+            else:
+                output_path = output_path_for(
+                    relpath, args.output, args.encoder.extension, created
+                )
+            task = (relpath, input_path, output_path)
+            counts["total"] += 1
+            # The first face's crop or first variant stands for the image
+            check_path = output_path
+            if args.multi_face:
+                check_path = face_output_path(output_path, 1)
+            elif args.variants:
+                check_path = args.variants[0].output_path(output_path)
+            if (
+                manifest
+                and not args.force
+                and manifest.is_up_to_date(relpath, input_path, check_path, fingerprint)
+            ):
+                # Up-to-date images count as successfully processed
+                counts["skipped"] += 1
+                continue
+            in_flight[relpath] = task
+            yield task
+
+    stats = Counter()
+    last_progress = time.perf_counter()
+    try:
+        for filename, success in run_tasks(discover(), args, stats):
+            counts["done"] += 1
+            if success:
+                counts["success"] += 1
+                print(f"Successfully processed {filename}")
+            else:
+                print(f"Failed to process {filename}")
+            task = in_flight.pop(filename)
+            if manifest:
+                manifest.record(*task, success, fingerprint)
+            if time.perf_counter() - last_progress >= PROGRESS_INTERVAL:
+                last_progress = time.perf_counter()
+                print_progress(scanner, counts)
+    except OSError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    finally:
+        if manifest:
+            manifest.close()
+        if args.output_archive:
+            args.output_archive.close()
+
+    if counts["skipped"]:
+        print(
+            f"Skipped {counts['skipped']} up-to-date images (use --force to reprocess)"
+        )
+    print_cache_stats(args, stats)
+    print_detector_stats(args, stats)
+    write_profile(args)
+    success_count = counts["success"] + counts["skipped"]
+    total_count = counts["total"]
+    if total_count == 0:
+        print("No image files found in directory")
+        sys.exit(1)
+    elif success_count == 0:
+        print("Failed to process any images")
+        sys.exit(1)
+    else:
+        print(f"Successfully processed {success_count} out of {total_count} images")
+        if args.output_archive:
+            print(
+                f"Wrote {args.output_archive.count} files to {args.output_archive.path}"
+            )
+        sys.exit(0)
+
+
+def print_progress(scanner, counts):
+    """Print completed and pending image counts and the directory scan rate"""
+    pending = counts["total"] - counts["skipped"] - counts["done"]
+    scan = "scan complete" if scanner.done else "scanning"
+    print(
+        f"Progress: {counts['done']} processed, {pending} pending, "
+        f"{counts['skipped']} skipped; {scan}, {scanner.scanned} entries "
+        f"({scanner.rate():.0f}/s)"
+    )
+
+
+def run_tasks(tasks, args, stats):
+    """
+    Yield (filename, success) for each task: on a process pool when --jobs > 1,
+    otherwise through the threaded decode/detect/encode pipeline
+    """
+    # Peek so an empty listing never starts workers; the rest stays lazy
+    tasks = iter(tasks)
+    first = next(tasks, None)
+    if first is None:
+        return
+    tasks = itertools.chain([first], tasks)
+    if args.jobs > 1:
+        from .parallel import process_parallel
+
+        yield from process_parallel(
+            tasks,
+            args.jobs,
+            args.circular,
+            args.strict,
+            args.chunk_size,
+            processor_options(args),
+            stats,
+            args.profiler,
+            args.multi_face,
+            args.min_score,
+            args.variants,
+        )
+        return
+
+    from .pipeline import Pipeline
+    from .processor import ImageProcessor
+
+    with ImageProcessor(
+        **processor_options(args),
+        profiler=args.profiler,
+        output_archive=args.output_archive,
+    ) as processor:
+        pipeline = Pipeline(
+            processor,
+            args.circular,
+            args.strict,
+            readers=args.threads,
+            encoders=args.threads,
+            multi_face=args.multi_face,
+            min_score=args.min_score,
+            variants=args.variants,
+        )
+        yield from pipeline.run(tasks)
+        stats.update(processor.run_stats())
+        if args.pipeline_stats:
+            print(pipeline.format_report())
 
 
 if __name__ == "__main__":
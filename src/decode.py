@@ -0,0 +1,65 @@
+import io
+
+import cv2
+import numpy as np
+from PIL import Image
+
+# Reduced-resolution decode flags, largest reduction first. For JPEG these
+# use DCT scaling, so the full-resolution image is never materialized.
+REDUCED_COLOR_FLAGS = (
+    (8, cv2.IMREAD_REDUCED_COLOR_8),
+    (4, cv2.IMREAD_REDUCED_COLOR_4),
+    (2, cv2.IMREAD_REDUCED_COLOR_2),
+)
+
+EXIF_ORIENTATION = 0x0112
+
+
+def decode(source, flags=cv2.IMREAD_COLOR):
+    """Decode an image from a file path or encoded bytes; None on failure"""
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return cv2.imdecode(np.frombuffer(source, dtype=np.uint8), flags)
+    return cv2.imread(source, flags)
+
+
+def read_image_info(source):
+    """
+    Read the format and size from the image header without decoding pixels.
+    The size is the one decode() returns: OpenCV applies the EXIF
+    orientation, so width and height are swapped for orientations 5 to 8.
+    Returns: tuple (format, (width, height)) or None if unreadable
+    """
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        source = io.BytesIO(source)
+    try:
+        with Image.open(source) as img:
+            width, height = img.size
+            if img.getexif().get(EXIF_ORIENTATION, 1) in (5, 6, 7, 8):
+                width, height = height, width
+            return img.format, (width, height)
+    except (OSError, ValueError):
+        return None
+
+
+def reduced_decode_flag(size, min_side):
+    """Largest reduction that keeps the longest side at or above min_side, or None"""
+    longest = max(size)
+    for factor, flag in REDUCED_COLOR_FLAGS:
+        if longest / factor >= min_side:
+            return flag
+    return None
+
+
+def decode_for_detection(source, detection_size):
+    """
+    Decode a JPEG at reduced resolution for detection
+    Returns: BGR image, or None when the source is not a JPEG large enough to
+        benefit (callers should fall back to a full decode)
+    """
+    info = read_image_info(source)
+    if info is None or info[0] != "JPEG":
+        return None
+    flag = reduced_decode_flag(info[1], detection_size)
+    if flag is None:
+        return None
+    return decode(source, flag)
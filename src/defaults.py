@@ -0,0 +1,32 @@
+# Defaults shared by the command line and the modules that implement them.
+# This module must not import OpenCV, MediaPipe, NumPy or Pillow: the CLI
+# builds its parser from it, so --help and argument errors return without
+# loading them.
+
+# Maximum number of cached detection results
+DEFAULT_CACHE_SIZE = 100000
+
+# Minimum MediaPipe score for a detection to count as a face
+MP_MIN_SCORE = 0.1
+
+ENCODER_BACKENDS = ("pil", "opencv")
+ENCODER_PRESETS = {
+    # Byte-for-byte identical to the original PIL PNG output
+    "png": {"format": "png", "backend": "pil"},
+    # OpenCV's libpng defaults trade a larger file for much faster encoding
+    "fast-png": {"format": "png", "backend": "opencv"},
+    "webp-lossless": {"format": "webp", "backend": "pil", "compression": 4},
+}
+
+# Large-image mode (off by default): uncompressed images with at least this
+# many pixels are detected on a thumbnail and cropped by reading only the
+# needed region
+LARGE_IMAGE_PIXELS = 0
+
+# Output variant file names; {stem} is the regular output name without
+# extension, e.g. photo_cropped
+DEFAULT_TEMPLATE = "{stem}_{size}_{mask}{ext}"
+
+VIDEO_EXTENSIONS = (".mp4", ".mov", ".avi", ".mkv", ".webm", ".m4v")
+DEFAULT_KEYFRAME_INTERVAL = 30
+DEFAULT_SMOOTHING = 0.6
@@ -1,82 +1,515 @@
+import threading
+import time
+
 import cv2
 import mediapipe as mp
 import numpy as np
 
+from . import defaults
+from .chain import DetectorChain, DetectorStage
+from .profiling import NULL_PROFILER
+
 
 class FaceDetector:
-    def __init__(self):
-        self.mp_face_detection = mp.solutions.face_detection
-        self.haar_cascade = cv2.CascadeClassifier(
-            cv2.data.haarcascades + "haarcascade_frontalface_default.xml"
+    # MediaPipe runs with a very low confidence threshold and keeps the best
+    # detection if its score clears MP_MIN_SCORE
+    MP_MIN_DETECTION_CONFIDENCE = 0.05
+    MP_MIN_SCORE = defaults.MP_MIN_SCORE
+    MP_MODEL_SELECTION = 1
+    HAAR_SCALE_FACTORS = (1.02, 1.05, 1.08)
+    PROFILE_SCALE_FACTOR = 1.05
+    HAAR_CASCADE_FILE = "haarcascade_frontalface_default.xml"
+    PROFILE_CASCADE_FILE = "haarcascade_profileface.xml"
+    # Multi-face mode: a box is dropped when this fraction of the smaller of
+    # it and an already kept box overlap (the stages disagree on box size, so
+    # plain IoU would keep duplicates). The Haar stages run with a stricter
+    # neighbor count and their boxes must be at least a fraction of the
+    # largest face's width, since they fire on textures when not a fallback.
+    NMS_OVERLAP = 0.3
+    MULTI_HAAR_MIN_NEIGHBORS = 8
+    MULTI_HAAR_MIN_RELATIVE_SIZE = 0.5
+
+    def __init__(
+        self,
+        detection_size=None,
+        profiler=None,
+        stages=None,
+        time_budget=None,
+        adaptive=False,
+    ):
+        """
+        Args:
+            detection_size: If set, detection runs on a proxy image whose longest
+                side is at most this many pixels, and the bbox is mapped back to
+                the original resolution
+            profiler: Profiler receiving per-stage timings (optional)
+            stages: Detector chain stages for detect_face (see DetectorChain;
+                default: default_stages())
+            time_budget: Seconds per image after which no further stage is
+                started (optional)
+            adaptive: Reorder and skip stages based on their observed hit
+                rates and costs
+        """
+        self.detection_size = detection_size
+        self.profiler = profiler or NULL_PROFILER
+        self.custom_chain = stages is not None or time_budget is not None or adaptive
+        self.chain = DetectorChain(
+            self.default_stages() if stages is None else stages, time_budget, adaptive
         )
-        self.profile_cascade = cv2.CascadeClassifier(
-            cv2.data.haarcascades + "haarcascade_profileface.xml"
+        self.mp_face_detection = mp.solutions.face_detection
+        # Haar cascades are loaded on first use: strict mode never needs them
+        self._cascades = {}
+        self._cascades_lock = threading.Lock()
+
+        # MediaPipe graphs are expensive to build, so they are kept open and
+        # reused. Each thread gets its own sessions because a graph must not
+        # be driven by two threads at once.
+        self._local = threading.local()
+        self._sessions_lock = threading.Lock()
+        self._open_sessions = []
+        self._generation = 0
+
+    @classmethod
+    def default_stages(cls):
+        """
+        The standard chain: MediaPipe, frontal Haar at increasingly coarse
+        scales, then profile Haar facing either way
+        """
+        return (
+            [
+                DetectorStage(
+                    "mediapipe",
+                    min_confidence=cls.MP_MIN_DETECTION_CONFIDENCE,
+                    min_score=cls.MP_MIN_SCORE,
+                    model_selection=cls.MP_MODEL_SELECTION,
+                )
+            ]
+            + [
+                DetectorStage("haar", scale_factor=scale, min_neighbors=3)
+                for scale in cls.HAAR_SCALE_FACTORS
+            ]
+            + [
+                DetectorStage(
+                    "profile",
+                    scale_factor=cls.PROFILE_SCALE_FACTOR,
+                    min_neighbors=2,
+                    flipped=flipped,
+                )
+                for flipped in [False, True]
+            ]
         )
 
+    @property
+    def haar_cascade(self):
+        """Frontal face Haar cascade, loaded on first access"""
+        return self._cascade(self.HAAR_CASCADE_FILE)
+
+    @property
+    def profile_cascade(self):
+        """Profile face Haar cascade, loaded on first access"""
+        return self._cascade(self.PROFILE_CASCADE_FILE)
+
+    def _cascade(self, filename):
+        cascade = self._cascades.get(filename)
+        if cascade is None:
+            with self._cascades_lock:
+                cascade = self._cascades.get(filename)
+                if cascade is None:
+                    cascade = cv2.CascadeClassifier(cv2.data.haarcascades + filename)
+                    self._cascades[filename] = cascade
+        return cascade
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def open(self, model_selection=1, min_detection_confidence=0.05):
+        """Open (or return the already open) MediaPipe session for this thread"""
+        sessions = self._thread_sessions()
+        key = (model_selection, min_detection_confidence)
+        session = sessions.get(key)
+        if session is None:
+            session = self.mp_face_detection.FaceDetection(
+                min_detection_confidence=min_detection_confidence,
+                model_selection=model_selection,
+            )
+            sessions[key] = session
+            with self._sessions_lock:
+                self._open_sessions.append(session)
+        return session
+
+    def close(self):
+        """Release every MediaPipe session opened by this detector, in all threads"""
+        with self._sessions_lock:
+            sessions, self._open_sessions = self._open_sessions, []
+            self._generation += 1
+        for session in sessions:
+            session.close()
+
+    def close_thread(self):
+        """Release the MediaPipe sessions opened by the calling thread"""
+        sessions = list(self._thread_sessions().values())
+        self._local.sessions = {}
+        with self._sessions_lock:
+            self._open_sessions = [
+                session
+                for session in self._open_sessions
+                if not any(session is closed for closed in sessions)
+            ]
+        for session in sessions:
+            session.close()
+
+    @property
+    def session_count(self):
+        """Number of MediaPipe sessions currently open"""
+        with self._sessions_lock:
+            return len(self._open_sessions)
+
+    def _thread_sessions(self):
+        # Sessions closed by close() are dropped lazily by comparing generations
+        if getattr(self._local, "generation", None) != self._generation:
+            self._local.generation = self._generation
+            self._local.sessions = {}
+        return self._local.sessions
+
+    def settings(self, strict=False):
+        """Detector settings that affect the result of detect_face"""
+        settings = {
+            "strict": strict,
+            "detection_size": self.detection_size,
+            "mp_min_detection_confidence": self.MP_MIN_DETECTION_CONFIDENCE,
+            "mp_min_score": self.MP_MIN_SCORE,
+            "mp_model_selection": self.MP_MODEL_SELECTION,
+            "haar_scale_factors": list(self.HAAR_SCALE_FACTORS),
+            "profile_scale_factor": self.PROFILE_SCALE_FACTOR,
+        }
+        # Only a customized chain is added, so existing caches and manifests
+        # stay valid for the default one
+        if self.custom_chain:
+            settings["chain"] = self.chain.settings()
+        return settings
+
     def detect_face(self, img, strict=False):
         """
         Detect face in image using multiple methods
         Args:
             img: Input image
             strict: If True, only use MediaPipe detection (more accurate but may miss some faces)
-        Returns: tuple (x, y, w, h) or None if no face detected
+        Returns: tuple (x, y, w, h) in original image coordinates or None if no face detected
+        """
+        return self.detect_faces([img], strict=strict)[0]
+
+    def detect_faces(self, images, strict=False):
+        """
+        Detect the face in each of a batch of images
+        The detector chain runs stage by stage over the batch: all images
+        share the MediaPipe pass, and only the images it misses go through
+        the Haar and profile fallbacks, together. Conversion buffers are
+        reused across images of the same shape.
+        Args:
+            images: Sequence or iterator of BGR images
+            strict: If True, only use MediaPipe detection
+        Returns: List of (x, y, w, h) tuples or None, in input order
+        """
+        return [face_bbox for face_bbox, _ in self.run_chain(images, strict)]
+
+    def run_chain(self, images, strict=False):
+        """
+        detect_faces, also reporting whether each image went through every
+        stage of the chain
+        Returns: List of (face_bbox, complete) in input order; complete is
+            False if a stage was skipped for the time budget or by adaptive
+            ordering, so a None result is not final and should not be cached
+        """
+        with self.profiler.stage("detect"):
+            return self._run_chain(images, strict)
+
+    def _run_chain(self, images, strict):
+        profiler = self.profiler
+        stage_count = sum(
+            1 for stage in self.chain.stages if not strict or stage.type == "mediapipe"
+        )
+        buffers = {}
+        runs = []
+        for img in images:
+            start = time.perf_counter()
+            with profiler.stage("detect.downscale"):
+                proxy = self.downscale(img)
+            run = _ChainRun(img, proxy, self.chain.plan(strict))
+            run.spent = time.perf_counter() - start
+            run.complete = len(run.plan) == stage_count
+            runs.append(run)
+
+        active = [run for run in runs if run.plan]
+        while active:
+            # Advance every unresolved image to its next stage, and run each
+            # stage once over the group of images that reached it
+            groups = {}
+            for run in active:
+                stage = run.plan[run.step]
+                run.step += 1
+                if run.step > 1 and not self.chain.fits_budget(stage, run.spent):
+                    run.complete = False
+                    continue
+                groups.setdefault(stage.name, (stage, []))[1].append(run)
+            for stage, group in groups.values():
+                for run in group:
+                    stage_start = time.perf_counter()
+                    source = self._stage_input(stage, run, buffers)
+                    with profiler.stage(f"detect.{stage.name}"):
+                        run.face_bbox = self._run_stage(stage, source)
+                    seconds = time.perf_counter() - stage_start
+                    run.spent += seconds
+                    self.chain.record(stage, seconds, run.face_bbox is not None)
+                    if run.face_bbox is not None:
+                        profiler.count(f"detected_by.{stage.type}")
+            active = [
+                run
+                for run in active
+                if run.face_bbox is None and run.step < len(run.plan)
+            ]
+
+        results = []
+        for run in runs:
+            face_bbox = run.face_bbox
+            if face_bbox is not None and run.img.shape != run.proxy.shape:
+                face_bbox = scale_bbox(face_bbox, run.proxy.shape, run.img.shape)
+            results.append((face_bbox, run.complete))
+        profiler.count("detected_by.none", sum(1 for bbox, _ in results if not bbox))
+        return results
+
+    def _stage_input(self, stage, run, buffers):
+        # MediaPipe takes RGB, converted into a shared buffer right before
+        # use; the Haar stages an equalized grayscale image, computed once
+        # per image
+        if stage.type == "mediapipe":
+            return _convert(run.proxy, cv2.COLOR_BGR2RGB, buffers)
+        if run.gray is None:
+            with self.profiler.stage("detect.preprocess"):
+                gray = _convert(run.proxy, cv2.COLOR_BGR2GRAY, buffers)
+                run.gray = cv2.equalizeHist(gray)
+        return run.gray
+
+    def _run_stage(self, stage, source):
+        params = stage.params
+        if stage.type == "mediapipe":
+            face_detection = self.open(
+                min_detection_confidence=params["min_confidence"],
+                model_selection=params["model_selection"],
+            )
+            return self._detect_mediapipe(face_detection, source, params["min_score"])
+
+        cascade = self.haar_cascade if stage.type == "haar" else self.profile_cascade
+        flipped = params.get("flipped", False)
+        faces = cascade.detectMultiScale(
+            cv2.flip(source, 1) if flipped else source,
+            scaleFactor=params["scale_factor"],
+            minNeighbors=params["min_neighbors"],
+            minSize=(params["min_size"], params["min_size"]),
+            flags=cv2.CASCADE_SCALE_IMAGE,
+        )
+        if len(faces) == 0:
+            return None
+        if stage.type == "haar":
+            faces = sorted(faces, key=lambda x: x[2] * x[3], reverse=True)
+        x, y, w, h = faces[0]
+        if flipped:
+            x = source.shape[1] - x - w
+        return (x, y, w, h)
+
+    def detect_all_faces(self, img, strict=False, min_score=None):
         """
+        Detect every face in an image
+        MediaPipe detections scoring above min_score come first, then (unless
+        strict) frontal and profile Haar detections; overlapping boxes from
+        later stages are suppressed.
+        Args:
+            img: Input image
+            strict: If True, only use MediaPipe detection
+            min_score: Minimum MediaPipe score (default: MP_MIN_SCORE)
+        Returns: List of (x, y, w, h) tuples in original image coordinates,
+            ordered left to right (then top to bottom)
+        """
+        with self.profiler.stage("detect"):
+            return self._detect_all_faces(img, strict, min_score)
+
+    def _detect_all_faces(self, img, strict, min_score):
+        if min_score is None:
+            min_score = self.MP_MIN_SCORE
+        profiler = self.profiler
+        with profiler.stage("detect.downscale"):
+            proxy = self.downscale(img)
+        buffers = {}
+        face_detection = self.open(
+            min_detection_confidence=self.MP_MIN_DETECTION_CONFIDENCE,
+            model_selection=self.MP_MODEL_SELECTION,
+        )
+        with profiler.stage("detect.mediapipe"):
+            rgb_img = _convert(proxy, cv2.COLOR_BGR2RGB, buffers)
+            candidates = self._detect_mediapipe_all(face_detection, rgb_img, min_score)
+        if not strict:
+            with profiler.stage("detect.preprocess"):
+                gray = _convert(proxy, cv2.COLOR_BGR2GRAY, buffers)
+                gray_eq = cv2.equalizeHist(gray)
+            haar_faces = self._detect_haar_all(gray_eq)
+            if haar_faces:
+                largest = max(w for _, _, w, _ in candidates + haar_faces)
+                min_width = largest * self.MULTI_HAAR_MIN_RELATIVE_SIZE
+                candidates += [face for face in haar_faces if face[2] >= min_width]
+
+        faces = suppress_overlaps(candidates, self.NMS_OVERLAP)
+        profiler.count("faces_detected", len(faces))
+        if img.shape != proxy.shape:
+            faces = [scale_bbox(face, proxy.shape, img.shape) for face in faces]
+        return sorted(faces, key=lambda face: (face[0], face[1]))
+
+    def downscale(self, img):
+        """Return the proxy image used for detection (img itself if small enough)"""
+        if not self.detection_size:
+            return img
         height, width = img.shape[:2]
-        rgb_img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-
-        # Try MediaPipe detection first with very low confidence threshold
-        face_detected = False
-        x = y = w = h = 0
-
-        with self.mp_face_detection.FaceDetection(
-            min_detection_confidence=0.05, model_selection=1
-        ) as face_detection:
-            results = face_detection.process(rgb_img)
-            if results.detections:
-                detection = max(results.detections, key=lambda x: x.score[0])
-                if detection.score[0] > 0.1:
-                    bbox = detection.location_data.relative_bounding_box
-                    x = int(bbox.xmin * width)
-                    y = int(bbox.ymin * height)
-                    w = int(bbox.width * width)
-                    h = int(bbox.height * height)
-                    face_detected = True
-
-        # If MediaPipe fails and not in strict mode, try Haar Cascade
-        if not face_detected and not strict:
-            gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-            gray_eq = cv2.equalizeHist(gray)
-
-            for scale in [1.02, 1.05, 1.08]:
-                faces = self.haar_cascade.detectMultiScale(
+        scale = self.detection_size / max(height, width)
+        if scale >= 1:
+            return img
+        size = (max(1, round(width * scale)), max(1, round(height * scale)))
+        return cv2.resize(img, size, interpolation=cv2.INTER_AREA)
+
+    def _detect_mediapipe(self, face_detection, rgb_img, min_score):
+        # Best MediaPipe detection if its score clears min_score
+        height, width = rgb_img.shape[:2]
+        results = face_detection.process(rgb_img)
+        if results.detections:
+            detection = max(results.detections, key=lambda x: x.score[0])
+            if detection.score[0] > min_score:
+                bbox = detection.location_data.relative_bounding_box
+                x = int(bbox.xmin * width)
+                y = int(bbox.ymin * height)
+                w = int(bbox.width * width)
+                h = int(bbox.height * height)
+                return (x, y, w, h)
+        return None
+
+    def _detect_mediapipe_all(self, face_detection, rgb_img, min_score):
+        # Every MediaPipe detection above min_score, best first
+        height, width = rgb_img.shape[:2]
+        results = face_detection.process(rgb_img)
+        faces = []
+        for detection in sorted(
+            results.detections or [], key=lambda x: x.score[0], reverse=True
+        ):
+            if detection.score[0] <= min_score:
+                break
+            bbox = detection.location_data.relative_bounding_box
+            x = max(0, int(bbox.xmin * width))
+            y = max(0, int(bbox.ymin * height))
+            w = min(width - x, int(bbox.width * width))
+            h = min(height - y, int(bbox.height * height))
+            if w > 0 and h > 0:
+                faces.append((x, y, w, h))
+        return faces
+
+    def _detect_haar_all(self, gray_eq):
+        # Frontal faces from the first scale that finds any, largest first,
+        # then profile faces facing either way
+        profiler = self.profiler
+        faces = []
+        for scale in self.HAAR_SCALE_FACTORS:
+            with profiler.stage(f"detect.haar_{scale}"):
+                found = self.haar_cascade.detectMultiScale(
                     gray_eq,
                     scaleFactor=scale,
-                    minNeighbors=3,
+                    minNeighbors=self.MULTI_HAAR_MIN_NEIGHBORS,
+                    minSize=(30, 30),
+                    flags=cv2.CASCADE_SCALE_IMAGE,
+                )
+            if len(found) > 0:
+                found = sorted(found, key=lambda x: x[2] * x[3], reverse=True)
+                faces += [tuple(int(v) for v in face) for face in found]
+                break
+
+        width = gray_eq.shape[1]
+        for is_flipped in [False, True]:
+            stage = "detect.profile_flipped" if is_flipped else "detect.profile"
+            with profiler.stage(stage):
+                current_img = cv2.flip(gray_eq, 1) if is_flipped else gray_eq
+                found = self.profile_cascade.detectMultiScale(
+                    current_img,
+                    scaleFactor=self.PROFILE_SCALE_FACTOR,
+                    minNeighbors=self.MULTI_HAAR_MIN_NEIGHBORS,
                     minSize=(30, 30),
                     flags=cv2.CASCADE_SCALE_IMAGE,
                 )
-                if len(faces) > 0:
-                    faces = sorted(faces, key=lambda x: x[2] * x[3], reverse=True)
-                    x, y, w, h = faces[0]
-                    face_detected = True
-                    break
-
-            # If frontal detection fails, try profile face detection
-            if not face_detected:
-                for is_flipped in [False, True]:
-                    current_img = cv2.flip(gray_eq, 1) if is_flipped else gray_eq
-                    faces = self.profile_cascade.detectMultiScale(
-                        current_img,
-                        scaleFactor=1.05,
-                        minNeighbors=2,
-                        minSize=(30, 30),
-                        flags=cv2.CASCADE_SCALE_IMAGE,
-                    )
-                    if len(faces) > 0:
-                        x, y, w, h = faces[0]
-                        if is_flipped:
-                            x = width - x - w
-                        face_detected = True
-                        break
-
-        return (x, y, w, h) if face_detected else None
+            for x, y, w, h in found:
+                if is_flipped:
+                    x = width - x - w
+                faces.append((int(x), int(y), int(w), int(h)))
+        return faces
+
+
+class _ChainRun:
+    """One image's progress through the detector chain"""
+
+    __slots__ = (
+        "img",
+        "proxy",
+        "plan",
+        "step",
+        "spent",
+        "complete",
+        "gray",
+        "face_bbox",
+    )
+
+    def __init__(self, img, proxy, plan):
+        self.img = img
+        self.proxy = proxy
+        self.plan = plan
+        self.step = 0
+        self.spent = 0.0
+        self.complete = True
+        self.gray = None
+        self.face_bbox = None
+
+
+def suppress_overlaps(boxes, max_overlap):
+    """
+    Greedy non-maximum suppression over boxes given in priority order
+    Args:
+        boxes: List of (x, y, w, h), highest priority first
+        max_overlap: Drop a box when its intersection with a kept box exceeds
+            this fraction of the smaller box's area
+    Returns: List of kept boxes, in priority order
+    """
+    kept = []
+    for box in boxes:
+        x, y, w, h = box
+        for kx, ky, kw, kh in kept:
+            iw = min(x + w, kx + kw) - max(x, kx)
+            ih = min(y + h, ky + kh) - max(y, ky)
+            if iw > 0 and ih > 0 and iw * ih > max_overlap * min(w * h, kw * kh):
+                break
+        else:
+            kept.append(box)
+    return kept
+
+
+def _convert(img, code, buffers):
+    """cv2.cvtColor into a buffer reused across images of the same shape"""
+    key = (code, img.shape)
+    buffers[key] = cv2.cvtColor(img, code, dst=buffers.get(key))
+    return buffers[key]
+
+
+def scale_bbox(bbox, from_shape, to_shape):
+    """Map a bbox (x, y, w, h) between images of the given shapes"""
+    x, y, w, h = bbox
+    sx = to_shape[1] / from_shape[1]
+    sy = to_shape[0] / from_shape[0]
+    x1 = min(to_shape[1], max(0, round(x * sx)))
+    y1 = min(to_shape[0], max(0, round(y * sy)))
+    x2 = min(to_shape[1], max(0, round((x + w) * sx)))
+    y2 = min(to_shape[0], max(0, round((y + h) * sy)))
+    return (x1, y1, x2 - x1, y2 - y1)
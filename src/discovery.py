@@ -0,0 +1,174 @@
+import fnmatch
+import os
+import time
+
+from .defaults import VIDEO_EXTENSIONS
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".webp", ".tif", ".tiff")
+
+_SIZE_UNITS = {"": 1, "K": 1024, "M": 1024**2, "G": 1024**3}
+
+
+def is_video(path):
+    return path.lower().endswith(VIDEO_EXTENSIONS)
+
+
+def parse_size(value):
+    """
+    Parse a file size such as 500, 200K, 20M or 1G into bytes
+    Raises: ValueError for anything else
+    """
+    text = str(value).strip().upper().removesuffix("B")
+    unit = text[-1:] if text[-1:] in _SIZE_UNITS else ""
+    number = text[: len(text) - len(unit)]
+    try:
+        size = float(number)
+    except ValueError:
+        raise ValueError(f"Invalid size: {value}") from None
+    if size < 0:
+        raise ValueError(f"Invalid size: {value}")
+    return int(size * _SIZE_UNITS[unit])
+
+
+class InputScanner:
+    """
+    Lazily enumerate image files under a directory with os.scandir, so work
+    can start before the listing is complete and memory does not grow with
+    the number of files. Counts what it has seen for progress reporting.
+    """
+
+    def __init__(
+        self,
+        root,
+        recursive=False,
+        include=None,
+        exclude=None,
+        min_size=None,
+        max_size=None,
+        skip_dirs=(),
+    ):
+        """
+        Args:
+            root: Directory to scan
+            recursive: Descend into subdirectories
+            include: Glob patterns; if given, a file's relative path (or name)
+                must match one of them
+            exclude: Glob patterns for files and directories to leave out
+            min_size: Smallest file size in bytes to include
+            max_size: Largest file size in bytes to include
+            skip_dirs: Directories never descended into, e.g. the output
+        """
+        self.root = root
+        self.recursive = recursive
+        self.include = list(include or [])
+        self.exclude = list(exclude or [])
+        self.min_size = min_size
+        self.max_size = max_size
+        self.skip_dirs = {os.path.realpath(path) for path in skip_dirs}
+        self.scanned = 0
+        self.matched = 0
+        self.done = False
+        self.start = None
+        self.elapsed = 0.0
+
+    @staticmethod
+    def _matches(relpath, patterns):
+        name = relpath.rsplit("/", 1)[-1]
+        return any(
+            fnmatch.fnmatch(relpath, pattern) or fnmatch.fnmatch(name, pattern)
+            for pattern in patterns
+        )
+
+    def _wanted(self, entry, relpath):
+        if not self._accepts_name(relpath):
+            return False
+        if self.min_size is not None or self.max_size is not None:
+            try:
+                size = entry.stat().st_size
+            except OSError:
+                return False
+            return self._accepts_size(size)
+        return True
+
+    def _accepts_name(self, relpath):
+        # Image extension and include/exclude globs
+        if not relpath.lower().endswith(IMAGE_EXTENSIONS):
+            return False
+        if self.include and not self._matches(relpath, self.include):
+            return False
+        if self.exclude and self._matches(relpath, self.exclude):
+            return False
+        return True
+
+    def _accepts_size(self, size):
+        if self.min_size is not None and size < self.min_size:
+            return False
+        if self.max_size is not None and size > self.max_size:
+            return False
+        return True
+
+    def scan(self):
+        """
+        Yields: (relpath, path) for each matching image, relpath using "/"
+        """
+        self.start = time.perf_counter()
+        # Depth-first with an explicit stack; entries are visited in
+        # directory order so huge directories are never read into a list
+        stack = [(self.root, "")]
+        try:
+            while stack:
+                directory, prefix = stack.pop()
+                try:
+                    entries = os.scandir(directory)
+                except OSError as e:
+                    if directory == self.root:
+                        raise
+                    print(f"Warning: Could not read directory {directory}: {e}")
+                    continue
+                with entries:
+                    for entry in entries:
+                        self.scanned += 1
+                        relpath = prefix + entry.name
+                        try:
+                            is_dir = entry.is_dir()
+                        except OSError:
+                            continue
+                        if is_dir:
+                            if (
+                                self.recursive
+                                and not self._matches(relpath, self.exclude)
+                                and os.path.realpath(entry.path) not in self.skip_dirs
+                            ):
+                                stack.append((entry.path, relpath + "/"))
+                        elif self._wanted(entry, relpath):
+                            self.matched += 1
+                            yield relpath, entry.path
+        finally:
+            self.done = True
+            self.elapsed = time.perf_counter() - self.start
+
+    def rate(self):
+        """Directory entries scanned per second so far"""
+        if self.start is None:
+            return 0.0
+        elapsed = self.elapsed if self.done else time.perf_counter() - self.start
+        return self.scanned / elapsed if elapsed else 0.0
+
+
+def output_path_for(relpath, output_dir, extension, created=None):
+    """
+    Output path mirroring relpath under output_dir, creating the subdirectory
+    Args:
+        relpath: Input path relative to the scanned root, using "/"
+        extension: Output extension including the dot
+        created: Set of directories already created, to skip repeat makedirs
+    """
+    parts = relpath.split("/")
+    directory = os.path.join(output_dir, *parts[:-1])
+    if created is None or directory not in created:
+        os.makedirs(directory, exist_ok=True)
+        if created is not None:
+            created.add(directory)
+    return os.path.join(
+        directory, os.path.splitext(parts[-1])[0] + "_cropped" + extension
+    )
@@ -0,0 +1,120 @@
+import io
+
+import cv2
+from PIL import Image
+
+from .defaults import ENCODER_BACKENDS, ENCODER_PRESETS
+
+
+class Encoder:
+    """
+    Encodes cropped images through a selectable backend. The pixel buffer is
+    built once by the caller in the backend's native channel order
+    (see channel_order) and handed to the backend without further copies.
+    """
+
+    EXTENSIONS = {"png": ".png", "webp": ".webp"}
+    BACKENDS = ENCODER_BACKENDS
+    PRESETS = ENCODER_PRESETS
+
+    def __init__(self, format="png", backend="pil", compression=None):
+        """
+        Args:
+            format: "png" or "webp" (always lossless, with alpha)
+            backend: "pil" or "opencv"
+            compression: zlib level 0-9 for PNG, method 0-6 for WebP; None
+                keeps the backend default. OpenCV has no WebP method setting,
+                so it is rejected for WebP with the opencv backend.
+        """
+        if format not in self.EXTENSIONS:
+            raise ValueError(f"Unsupported output format: {format}")
+        if backend not in self.BACKENDS:
+            raise ValueError(f"Unsupported encoder backend: {backend}")
+        if compression is not None and format == "webp" and backend == "opencv":
+            raise ValueError(
+                "Compression is not supported for webp with the opencv backend"
+            )
+        max_compression = 9 if format == "png" else 6
+        if compression is not None and not 0 <= compression <= max_compression:
+            raise ValueError(
+                f"Compression for {format} must be between 0 and {max_compression}"
+            )
+        self.format = format
+        self.backend = backend
+        self.compression = compression
+
+    @classmethod
+    def from_preset(cls, preset, backend=None, compression=None):
+        """Build an encoder from a preset, optionally overriding backend and compression"""
+        if preset not in cls.PRESETS:
+            raise ValueError(f"Unknown encoder preset: {preset}")
+        options = dict(cls.PRESETS[preset])
+        if backend is not None:
+            options["backend"] = backend
+            if options["format"] == "webp" and backend == "opencv":
+                # The preset's WebP method only applies to Pillow
+                options.pop("compression", None)
+        if compression is not None:
+            options["compression"] = compression
+        return cls(**options)
+
+    @property
+    def extension(self):
+        return self.EXTENSIONS[self.format]
+
+    @property
+    def mime_type(self):
+        return f"image/{self.format}"
+
+    @property
+    def channel_order(self):
+        """Channel order of the buffers passed to encode and write"""
+        return "BGRA" if self.backend == "opencv" else "RGBA"
+
+    def settings(self):
+        """Encoder settings that affect the output bytes"""
+        return {
+            "format": self.format,
+            "backend": self.backend,
+            "compression": self.compression,
+        }
+
+    def encode(self, buffer):
+        """Encode a 4-channel buffer in channel_order and return the bytes"""
+        if self.backend == "opencv":
+            return self._encode_opencv(buffer)
+        output = io.BytesIO()
+        self._save_pil(buffer, output)
+        return output.getvalue()
+
+    def write(self, buffer, output_path):
+        """Encode a 4-channel buffer in channel_order to a file"""
+        if self.backend == "opencv":
+            with open(output_path, "wb") as f:
+                f.write(self._encode_opencv(buffer))
+        else:
+            self._save_pil(buffer, output_path)
+
+    def _save_pil(self, buffer, output):
+        img = Image.fromarray(buffer, "RGBA")
+        if self.format == "png":
+            params = {}
+            if self.compression is not None:
+                params["compress_level"] = self.compression
+            img.save(output, "PNG", **params)
+        else:
+            method = 4 if self.compression is None else self.compression
+            img.save(output, "WEBP", lossless=True, method=method)
+
+    def _encode_opencv(self, buffer):
+        if self.format == "png":
+            params = []
+            if self.compression is not None:
+                params = [cv2.IMWRITE_PNG_COMPRESSION, self.compression]
+        else:
+            # A quality above 100 selects lossless WebP
+            params = [cv2.IMWRITE_WEBP_QUALITY, 101]
+        ok, encoded = cv2.imencode(self.extension, buffer, params)
+        if not ok:
+            raise ValueError(f"OpenCV could not encode {self.format}")
+        return encoded.tobytes()
@@ -0,0 +1,99 @@
+import hashlib
+import json
+import os
+import time
+
+MANIFEST_NAME = ".facecrop-manifest.jsonl"
+
+
+def settings_fingerprint(settings):
+    """Stable hash of a dict of output-affecting settings"""
+    settings_json = json.dumps(settings, sort_keys=True)
+    return hashlib.blake2b(settings_json.encode(), digest_size=8).hexdigest()
+
+
+class RunManifest:
+    """
+    Append-only JSON-lines record of per-file results in an output directory,
+    used to skip up-to-date inputs and resume interrupted runs. The latest
+    line for an input wins; a truncated last line from a crash is ignored and
+    terminated before new records are appended.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        line_count = 0
+        partial = False
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    line_count += 1
+                    partial = not line.endswith("\n")
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    self.entries[entry["input"]] = entry
+
+        # Keep the file proportional to the number of inputs across many runs
+        if line_count > 2 * len(self.entries) + 1000:
+            self._compact()
+            partial = False
+        self._file = open(path, "a", encoding="utf-8")
+        if partial:
+            # Otherwise the first new record would be glued onto the partial line
+            self._file.write("\n")
+            self._file.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _compact(self):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for entry in self.entries.values():
+                f.write(json.dumps(entry) + "\n")
+        os.replace(tmp_path, self.path)
+
+    def is_up_to_date(self, name, input_path, output_path, fingerprint):
+        """True if name was processed successfully from the current input with the same settings"""
+        entry = self.entries.get(name)
+        if not entry or entry["status"] != "ok" or entry["fingerprint"] != fingerprint:
+            return False
+        try:
+            input_stat = os.stat(input_path)
+            output_stat = os.stat(output_path)
+        except OSError:
+            return False
+        return (
+            entry["input_mtime"] == input_stat.st_mtime
+            and entry["input_size"] == input_stat.st_size
+            and output_stat.st_mtime >= input_stat.st_mtime
+        )
+
+    def record(self, name, input_path, output_path, success, fingerprint):
+        """Append the result for one input"""
+        try:
+            input_stat = os.stat(input_path)
+            input_mtime, input_size = input_stat.st_mtime, input_stat.st_size
+        except OSError:
+            input_mtime = input_size = None
+        entry = {
+            "input": name,
+            "output": os.path.basename(output_path),
+            "status": "ok" if success else "failed",
+            "fingerprint": fingerprint,
+            "input_mtime": input_mtime,
+            "input_size": input_size,
+            "time": time.time(),
+        }
+        self.entries[name] = entry
+        self._file.write(json.dumps(entry) + "\n")
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
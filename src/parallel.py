@@ -0,0 +1,136 @@
+import itertools
+import multiprocessing
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from multiprocessing.util import Finalize
+
+from .processor import ImageProcessor
+from .profiling import Profiler
+
+# Each worker process builds one processor in its initializer and keeps it
+# (and its MediaPipe sessions) for the whole run.
+_processor = None
+
+# Chunk size when the number of tasks is not known up front
+STREAM_CHUNK_SIZE = 8
+
+
+def init_worker(processor_options, profile=False):
+    global _processor
+    profiler = Profiler() if profile else None
+    _processor = ImageProcessor(**processor_options, profiler=profiler)
+    Finalize(_processor, _processor.close, exitpriority=10)
+
+
+def process_chunk(
+    tasks, circular_mask, strict, multi_face=False, min_score=None, variants=None
+):
+    """
+    Process a chunk of (name, input_path, output_path) tasks in a worker
+    Returns: tuple (results, stats, profile) with (name, success) results, a
+        Counter of the worker's cache and detector chain statistics and, when
+        profiling, the profiler samples for this chunk
+    """
+    before = _processor.run_stats()
+    results = []
+    for name, input_path, output_path in tasks:
+        if multi_face:
+            success = bool(
+                _processor.process_all_faces(
+                    input_path, output_path, circular_mask, strict, min_score
+                )
+            )
+        elif variants:
+            success = bool(
+                _processor.process_variants(input_path, output_path, variants, strict)
+            )
+        else:
+            success = _processor.process_image(
+                input_path, output_path, circular_mask, strict
+            )
+        results.append((name, success))
+    profiler = _processor.profiler
+    profile = profiler.drain() if profiler.enabled else None
+    return results, _processor.run_stats() - before, profile
+
+
+def default_chunk_size(total, jobs):
+    """Hand out roughly four chunks per worker, capped to keep progress flowing"""
+    return max(1, min(32, -(-total // (jobs * 4))))
+
+
+def process_parallel(
+    tasks,
+    jobs,
+    circular_mask=False,
+    strict=False,
+    chunk_size=None,
+    processor_options=None,
+    stats=None,
+    profiler=None,
+    multi_face=False,
+    min_score=None,
+    variants=None,
+):
+    """
+    Process tasks on a pool of worker processes
+    Args:
+        tasks: List or lazy iterator of (name, input_path, output_path) tuples
+        jobs: Number of worker processes
+        chunk_size: Tasks handed to a worker at a time (default: automatic)
+        processor_options: Keyword arguments for each worker's ImageProcessor
+        stats: Counter updated with the workers' cache and detector chain
+            statistics (optional)
+        profiler: Profiler merging the workers' stage timings (optional)
+        multi_face: Write one crop per face (see ImageProcessor.process_all_faces)
+        min_score: Minimum MediaPipe score in multi-face mode
+        variants: List of OutputSpec to write instead of the regular output
+    Yields: (name, success) as results complete
+    """
+    if not chunk_size:
+        chunk_size = (
+            default_chunk_size(len(tasks), jobs)
+            if hasattr(tasks, "__len__")
+            else STREAM_CHUNK_SIZE
+        )
+    tasks = iter(tasks)
+    # Keep a couple of chunks queued per worker; iterators are only read as
+    # far as needed, so processing starts while tasks are still discovered
+    max_pending = jobs * 2
+
+    # MediaPipe is not fork-safe, so workers always start from a fresh interpreter
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(
+        max_workers=jobs,
+        mp_context=context,
+        initializer=init_worker,
+        initargs=(processor_options or {}, profiler is not None),
+    ) as executor:
+        pending = set()
+        exhausted = False
+        while pending or not exhausted:
+            while not exhausted and len(pending) < max_pending:
+                chunk = list(itertools.islice(tasks, chunk_size))
+                if not chunk:
+                    exhausted = True
+                    break
+                pending.add(
+                    executor.submit(
+                        process_chunk,
+                        chunk,
+                        circular_mask,
+                        strict,
+                        multi_face,
+                        min_score,
+                        variants,
+                    )
+                )
+            if not pending:
+                break
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                results, chunk_stats, profile = future.result()
+                if stats is not None:
+                    stats.update(chunk_stats)
+                if profiler is not None and profile is not None:
+                    profiler.merge(profile)
+                yield from results
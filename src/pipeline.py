@@ -0,0 +1,354 @@
+import queue
+import threading
+import time
+
+from .detector import scale_bbox
+from .processor import face_output_path
+
+# Queue marker telling a stage worker that no more jobs will arrive
+_DONE = object()
+
+
+class _Job:
+    """State of one image as it moves through the pipeline"""
+
+    __slots__ = (
+        "name",
+        "input_path",
+        "output_path",
+        "data",
+        "key",
+        "cached",
+        "detection_img",
+        "reduced",
+        "face_bbox",
+        "success",
+        "start",
+    )
+
+    def __init__(self, name, input_path, output_path):
+        self.name = name
+        self.input_path = input_path
+        self.output_path = output_path
+        self.data = None
+        self.key = None
+        self.cached = False
+        self.detection_img = None
+        self.reduced = False
+        self.face_bbox = None
+        # None while in flight; later stages pass failed jobs straight through
+        self.success = None
+        self.start = time.perf_counter()
+
+    def fail(self, message):
+        print(message)
+        self.success = False
+        self.data = self.detection_img = None
+
+
+class StageStats:
+    """Counters for one pipeline stage"""
+
+    def __init__(self, name, workers):
+        self.name = name
+        self.workers = workers
+        self.items = 0
+        self.busy = 0.0
+        self.queue_samples = 0
+        self.queue_total = 0
+        self.max_queue_depth = 0
+        self._lock = threading.Lock()
+
+    def sample_queue(self, depth):
+        with self._lock:
+            self.queue_samples += 1
+            self.queue_total += depth
+            self.max_queue_depth = max(self.max_queue_depth, depth)
+
+    def add(self, busy):
+        with self._lock:
+            self.items += 1
+            self.busy += busy
+
+    def report(self, elapsed):
+        return {
+            "workers": self.workers,
+            "items": self.items,
+            "busy_seconds": round(self.busy, 3),
+            "throughput": round(self.items / elapsed, 2) if elapsed else 0.0,
+            "utilization": (
+                round(self.busy / (elapsed * self.workers), 3) if elapsed else 0.0
+            ),
+            "mean_queue_depth": (
+                round(self.queue_total / self.queue_samples, 2)
+                if self.queue_samples
+                else 0.0
+            ),
+            "max_queue_depth": self.max_queue_depth,
+        }
+
+
+class Pipeline:
+    """
+    Streaming read/decode -> detect -> crop/encode/write pipeline around an
+    ImageProcessor. Each stage runs in its own threads and stages are linked
+    by bounded queues, so disk I/O, decoding and PNG encoding (which release
+    the GIL inside OpenCV and zlib) overlap with detection, while backpressure
+    keeps the number of images in memory fixed regardless of batch size.
+    """
+
+    def __init__(
+        self,
+        processor,
+        circular_mask=False,
+        strict=False,
+        readers=4,
+        encoders=4,
+        queue_size=8,
+        multi_face=False,
+        min_score=None,
+        variants=None,
+    ):
+        """
+        Args:
+            processor: ImageProcessor used by every stage
+            readers: Threads reading and decoding inputs
+            encoders: Threads cropping, encoding and writing outputs
+            queue_size: Capacity of each queue between stages
+            multi_face: Write one crop per detected face (see
+                ImageProcessor.process_all_faces) instead of the best face
+            min_score: Minimum MediaPipe score in multi-face mode
+            variants: List of OutputSpec to write instead of the regular
+                output (see ImageProcessor.process_variants)
+        """
+        self.processor = processor
+        self.circular_mask = circular_mask
+        self.strict = strict
+        self.multi_face = multi_face
+        self.min_score = min_score
+        self.variants = variants
+        self.queue_size = queue_size
+        # Detection stays on one thread: the Haar cascades are shared
+        self.stages = [
+            ("read", self._read, readers),
+            ("detect", self._detect, 1),
+            ("encode", self._encode, encoders),
+        ]
+        self.stats = {
+            name: StageStats(name, workers) for name, _, workers in self.stages
+        }
+        self.elapsed = 0.0
+
+    def run(self, tasks):
+        """
+        Process (name, input_path, output_path) tasks, which may be a lazy iterator
+        Yields: (name, success) as images complete
+        Raises: The exception raised by tasks, if any, once the tasks taken
+            before it have completed
+        """
+        start = time.perf_counter()
+        queues = [queue.Queue(self.queue_size) for _ in range(len(self.stages) + 1)]
+        feed_errors = []
+        threads = [
+            threading.Thread(
+                target=self._feed,
+                args=(tasks, queues[0], self.stages[0][2], feed_errors),
+                daemon=True,
+            )
+        ]
+        for index, (name, func, workers) in enumerate(self.stages):
+            next_workers = (
+                self.stages[index + 1][2] if index + 1 < len(self.stages) else 1
+            )
+            remaining = [workers]
+            lock = threading.Lock()
+            for _ in range(workers):
+                threads.append(
+                    threading.Thread(
+                        target=self._detect_worker if name == "detect" else self._work,
+                        args=(
+                            self.stats[name],
+                            func,
+                            queues[index],
+                            queues[index + 1],
+                            remaining,
+                            lock,
+                            next_workers,
+                        ),
+                        daemon=True,
+                    )
+                )
+        for thread in threads:
+            thread.start()
+
+        results = queues[-1]
+        try:
+            while True:
+                job = results.get()
+                if job is _DONE:
+                    break
+                self.processor.profiler.record(
+                    "pipeline.latency", time.perf_counter() - job.start
+                )
+                yield job.name, job.success
+        finally:
+            self.elapsed = time.perf_counter() - start
+        if feed_errors:
+            raise feed_errors[0]
+
+    @staticmethod
+    def _feed(tasks, out_queue, workers, errors):
+        try:
+            for name, input_path, output_path in tasks:
+                out_queue.put(_Job(name, input_path, output_path))
+        except Exception as e:
+            # E.g. a truncated archive: the images read so far still finish,
+            # then run() raises the error
+            errors.append(e)
+        finally:
+            for _ in range(workers):
+                out_queue.put(_DONE)
+
+    @staticmethod
+    def _work(stats, func, in_queue, out_queue, remaining, lock, next_workers):
+        while True:
+            stats.sample_queue(in_queue.qsize())
+            job = in_queue.get()
+            if job is _DONE:
+                # The last worker of a stage to finish closes the next stage
+                with lock:
+                    remaining[0] -= 1
+                    last = remaining[0] == 0
+                if last:
+                    for _ in range(next_workers):
+                        out_queue.put(_DONE)
+                return
+
+            if job.success is None:
+                start = time.perf_counter()
+                try:
+                    func(job)
+                except Exception as e:
+                    job.fail(f"Error processing {job.input_path}: {e}")
+                stats.add(time.perf_counter() - start)
+            out_queue.put(job)
+
+    def _detect_worker(self, *args):
+        # A new detect thread runs for every run(); its MediaPipe sessions
+        # would otherwise stay open until the detector is closed
+        try:
+            self._work(*args)
+        finally:
+            self.processor.detector.close_thread()
+
+    def _read(self, job):
+        processor = self.processor
+        # Large images are read lazily, region by region
+        job.data = processor.large_image(job.input_path) or processor.read_source(
+            job.input_path
+        )
+        if job.data is None:
+            job.fail(f"Error: Could not read image {job.input_path}")
+            return
+
+        # The detection cache holds single faces only
+        if not self.multi_face:
+            job.key, job.cached, job.face_bbox = processor.lookup_detection(
+                job.data, self.strict
+            )
+        if job.cached:
+            if not job.face_bbox:
+                job.fail(f"No face detected in {job.input_path}")
+            return
+
+        job.detection_img, job.reduced = processor.decode_detection_image(job.data)
+        if job.detection_img is None:
+            job.fail(f"Error: Could not read image {job.input_path}")
+
+    def _detect(self, job):
+        if job.cached:
+            return
+        if self.multi_face:
+            job.face_bbox = self.processor.detector.detect_all_faces(
+                job.detection_img, strict=self.strict, min_score=self.min_score
+            )
+            if not job.face_bbox:
+                job.fail(f"No face detected in {job.input_path}")
+            return
+        job.face_bbox, complete = self.processor.detector.run_chain(
+            [job.detection_img], strict=self.strict
+        )[0]
+        if not job.face_bbox:
+            self.processor.store_detection(job.key, None, complete)
+            job.fail(f"No face detected in {job.input_path}")
+
+    def _encode(self, job):
+        processor = self.processor
+        if self.multi_face:
+            self._encode_all(job)
+            return
+        if job.cached:
+            img = processor.decode_full(job.data)
+            face_bbox = job.face_bbox
+        else:
+            img, face_bbox = processor.full_resolution(
+                job.data, job.detection_img, job.reduced, job.face_bbox
+            )
+            if img is not None:
+                processor.store_detection(job.key, face_bbox)
+        job.data = job.detection_img = None
+        if img is None:
+            job.fail(f"Error: Could not read image {job.input_path}")
+            return
+
+        if self.variants:
+            processor.write_variants(img, face_bbox, job.output_path, self.variants)
+        else:
+            processor.write_output(img, face_bbox, job.output_path, self.circular_mask)
+        job.success = True
+
+    def _encode_all(self, job):
+        processor = self.processor
+        img = job.detection_img
+        face_bboxes = job.face_bbox
+        if job.reduced:
+            img = processor.decode_full(job.data)
+            if img is not None:
+                face_bboxes = [
+                    scale_bbox(face_bbox, job.detection_img.shape, img.shape)
+                    for face_bbox in face_bboxes
+                ]
+        job.data = job.detection_img = None
+        if img is None:
+            job.fail(f"Error: Could not read image {job.input_path}")
+            return
+
+        for index, face_bbox in enumerate(face_bboxes, 1):
+            processor.write_output(
+                img,
+                face_bbox,
+                face_output_path(job.output_path, index),
+                self.circular_mask,
+            )
+        job.success = True
+
+    def report(self):
+        """Per-stage counters, throughput (items/s) and queue depths of the last run"""
+        return {
+            "elapsed_seconds": round(self.elapsed, 3),
+            "stages": {
+                name: stats.report(self.elapsed) for name, stats in self.stats.items()
+            },
+        }
+
+    def format_report(self):
+        lines = [f"Pipeline: {self.elapsed:.2f} s"]
+        for name, stage in self.report()["stages"].items():
+            lines.append(
+                f"  {name:<7} {stage['items']:>6} items  "
+                f"{stage['throughput']:>8.2f}/s  "
+                f"utilization {stage['utilization']:.0%}  "
+                f"queue mean {stage['mean_queue_depth']:.1f} "
+                f"max {stage['max_queue_depth']}"
+            )
+        return "\n".join(lines)
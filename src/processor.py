@@ -1,31 +1,495 @@
+import os
+from collections import Counter
+
 import cv2
-from PIL import Image
-from .detector import FaceDetector
-from .utils import create_circular_mask
+from .archive import ArchiveMember
+from .cache import DEFAULT_CACHE_SIZE, DetectionCache, content_digest, file_digest
+from .decode import decode, decode_for_detection
+from .defaults import LARGE_IMAGE_PIXELS
+from .detector import FaceDetector, scale_bbox
+from .encoder import Encoder
+from .profiling import NULL_PROFILER
+from .region import THUMBNAIL_SIZE, RegionReader, RegionReadError, open_large_image
+from .utils import apply_circular_mask, resize_pyramid
+
+ANTIALIAS_SUPERSAMPLE = 4
 
 
 class ImageProcessor:
-    def __init__(self):
-        self.detector = FaceDetector()
+    def __init__(
+        self,
+        detection_size=None,
+        cache_path=None,
+        cache_size=DEFAULT_CACHE_SIZE,
+        encoder=None,
+        antialias=False,
+        profiler=None,
+        large_image_pixels=LARGE_IMAGE_PIXELS,
+        detector_stages=None,
+        time_budget=None,
+        adaptive=False,
+        output_archive=None,
+    ):
+        """
+        Args:
+            detection_size: Longest side of the proxy image used for detection
+            cache_path: SQLite file for persistent detection results (optional)
+            cache_size: Maximum number of cached detection results
+            encoder: Encoder for output files and process_bytes (default: PNG)
+            antialias: Smooth the edge of the circular mask by supersampling
+            profiler: Profiler receiving per-stage timings (optional)
+            large_image_pixels: Uncompressed image files (TIFF, BMP, PPM)
+                with at least this many pixels are detected on a thumbnail and
+                cropped by reading only the crop region (0, the default,
+                disables)
+            detector_stages: Detector chain stages (see DetectorChain;
+                default: FaceDetector.default_stages())
+            time_budget: Seconds of detection per image after which no
+                further stage is started (optional)
+            adaptive: Reorder and skip detector stages based on their observed
+                hit rates and costs
+            output_archive: ArchiveWriter receiving the outputs; output
+                paths then name members of the archive (optional)
+        """
+        self.profiler = profiler or NULL_PROFILER
+        self.detector = FaceDetector(
+            detection_size=detection_size,
+            profiler=self.profiler,
+            stages=detector_stages,
+            time_budget=time_budget,
+            adaptive=adaptive,
+        )
+        self.encoder = encoder or Encoder()
+        self.mask_supersample = ANTIALIAS_SUPERSAMPLE if antialias else 1
+        self.cache = DetectionCache(cache_path, cache_size) if cache_path else None
+        self.large_image_pixels = large_image_pixels
+        self.output_archive = output_archive
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """Release the detection sessions held by the detector and the cache"""
+        self.detector.close()
+        if self.cache is not None:
+            self.cache.close()
+
+    def cache_stats(self):
+        """Counter of detection cache hits and misses (empty without a cache)"""
+        return self.cache.stats() if self.cache is not None else Counter()
+
+    def run_stats(self):
+        """Counter of cache hits/misses and detector chain statistics"""
+        return self.cache_stats() + self.detector.chain.stats()
 
     def process_image(self, input_path, output_path, circular_mask=False, strict=False):
         """Process a single image: detect face, crop upper body, and create transparent background"""
-        # Read image
-        img = cv2.imread(input_path)
+        with self.profiler.stage("process_image"):
+            return self._process_image(input_path, output_path, circular_mask, strict)
+
+    def _process_image(self, input_path, output_path, circular_mask, strict):
+        img, face_bbox = self.decode_and_detect(input_path, strict=strict)
         if img is None:
             print(f"Error: Could not read image {input_path}")
             return False
+        if not face_bbox:
+            print(f"No face detected in {input_path}")
+            return False
+
+        try:
+            self.write_output(img, face_bbox, output_path, circular_mask)
+        except RegionReadError as e:
+            # Large images are only read once the crop region is known
+            print(f"Error: Could not read image {input_path}: {e}")
+            return False
+        return True
 
-        # Keep original for final crop
-        original = img.copy()
+    def process_all_faces(
+        self, input_path, output_path, circular_mask=False, strict=False, min_score=None
+    ):
+        """
+        Write one crop per detected face, from a single decode and a single
+        detection pass, to face_output_path(output_path, n) for n = 1, 2, ...
+        in left-to-right order
+        Returns: List of the paths written (empty if the image could not be
+            read or no face was detected)
+        """
+        with self.profiler.stage("process_image"):
+            img, face_bboxes = self.decode_and_detect_all(input_path, strict, min_score)
+            if img is None:
+                print(f"Error: Could not read image {input_path}")
+                return []
+            if not face_bboxes:
+                print(f"No face detected in {input_path}")
+                return []
+
+            paths = []
+            for index, face_bbox in enumerate(face_bboxes, 1):
+                path = face_output_path(output_path, index)
+                try:
+                    self.write_output(img, face_bbox, path, circular_mask)
+                except RegionReadError as e:
+                    print(f"Error: Could not read image {input_path}: {e}")
+                    return paths
+                paths.append(path)
+            return paths
+
+    def process_variants(self, input_path, output_path, variants, strict=False):
+        """
+        Write several variants of the crop (see variants.OutputSpec) from a
+        single decode and a single detection pass
+        Args:
+            output_path: Regular output path the variant names derive from
+            variants: List of OutputSpec
+        Returns: List of the paths written (empty if the image could not be
+            read or no face was detected)
+        """
+        with self.profiler.stage("process_image"):
+            img, face_bbox = self.decode_and_detect(input_path, strict=strict)
+            if img is None:
+                print(f"Error: Could not read image {input_path}")
+                return []
+            if not face_bbox:
+                print(f"No face detected in {input_path}")
+                return []
+            try:
+                return self.write_variants(img, face_bbox, output_path, variants)
+            except RegionReadError as e:
+                print(f"Error: Could not read image {input_path}: {e}")
+                return []
+
+    def write_variants(self, img, face_bbox, output_path, variants):
+        """
+        Crop around face_bbox once, resize the crop to every variant size
+        through an area-interpolated pyramid and write each variant
+        Returns: List of the paths written
+        """
         height, width = img.shape[:2]
+        x1, y1, x2, y2 = self.calculate_crop_box(face_bbox, width, height)
+        crop = img[y1:y2, x1:x2]
+        with self.profiler.stage("resize"):
+            levels = resize_pyramid(crop, [variant.size for variant in variants])
+
+        # Variants differing only in file format share the masked buffer
+        buffers = {}
+        paths = []
+        for variant in variants:
+            channel_order = variant.encoder.channel_order
+            key = (variant.size, variant.circular, channel_order)
+            if key not in buffers:
+                buffers[key] = self.finish_crop(
+                    levels[variant.size], variant.circular, channel_order
+                )
+            path = variant.output_path(output_path)
+            with self.profiler.stage("encode"):
+                self.write_file(variant.encoder, buffers[key], path)
+            paths.append(path)
+        return paths
+
+    def decode_and_detect_all(self, source, strict=False, min_score=None):
+        """
+        Decode an image (path or bytes) and detect every face in it
+        Returns: tuple (img, face_bboxes); img is None if the image could not
+            be decoded, face_bboxes is empty if no face was detected
+        """
+        if isinstance(source, ArchiveMember):
+            source = self.read_source(source)
+        source = self.large_image(source) or source
+        detection_img, reduced = self.decode_detection_image(source)
+        if detection_img is None:
+            return None, []
+        face_bboxes = self.detector.detect_all_faces(
+            detection_img, strict=strict, min_score=min_score
+        )
+        if not face_bboxes or not reduced:
+            return detection_img, face_bboxes
+
+        img = self.decode_full(source)
+        if img is None:
+            return None, []
+        return img, [
+            scale_bbox(face_bbox, detection_img.shape, img.shape)
+            for face_bbox in face_bboxes
+        ]
 
-        # Detect face
-        face_bbox = self.detector.detect_face(img, strict=strict)
+    def process_bytes(self, data, circular_mask=False, strict=False):
+        """
+        Process an encoded image held in memory
+        Args:
+            data: Encoded image bytes (JPG, PNG, WEBP)
+        Returns: Encoded bytes of the cropped image (PNG unless another encoder
+            is configured), or None if the image could not be decoded or no
+            face was detected
+        """
+        img, face_bbox = self.decode_and_detect(data, strict=strict)
+        if img is None or not face_bbox:
+            return None
+        buffer = self.crop_face(
+            img, face_bbox, circular_mask, self.encoder.channel_order
+        )
+        with self.profiler.stage("encode"):
+            return self.encoder.encode(buffer)
+
+    def process_array(self, img, circular_mask=False, strict=False):
+        """
+        Process a decoded BGR image
+        Returns: RGBA array of the cropped image, or None if no face was detected
+        """
+        face_bbox = self.detect_array(img, strict=strict)
         if not face_bbox:
-            print(f"No face detected in {input_path}")
-            return False
+            return None
+        return self.crop_face(img, face_bbox, circular_mask)
+
+    def process_arrays(self, images, circular_mask=False, strict=False):
+        """
+        Process a batch of decoded BGR images with one batched detection pass
+        Returns: List of RGBA arrays, or None where no face was detected, in input order
+        """
+        images = list(images)
+        face_bboxes = self.detect_arrays(images, strict=strict)
+        return [
+            self.crop_face(img, face_bbox, circular_mask) if face_bbox else None
+            for img, face_bbox in zip(images, face_bboxes)
+        ]
+
+    def detect_array(self, img, strict=False):
+        """Detect the face in a decoded image, through the detection cache if enabled"""
+        return self.detect_arrays([img], strict=strict)[0]
+
+    def detect_arrays(self, images, strict=False):
+        """
+        Detect the faces in a list of decoded images; only cache misses are
+        passed to the detector, as one batch
+        """
+        if self.cache is None:
+            return self.detector.detect_faces(images, strict=strict)
 
+        settings = self.detector.settings(strict)
+        keys = [self.cache.make_key(content_digest(img), settings) for img in images]
+        results = []
+        pending = []
+        for index, key in enumerate(keys):
+            hit, face_bbox = self.cache.get(key)
+            results.append(face_bbox)
+            if not hit:
+                pending.append(index)
+
+        detected = self.detector.run_chain(
+            [images[index] for index in pending], strict=strict
+        )
+        for index, (face_bbox, complete) in zip(pending, detected):
+            self.store_detection(keys[index], face_bbox, complete)
+            results[index] = face_bbox
+        return results
+
+    def decode_and_detect(self, source, strict=False):
+        """
+        Decode an image (path or bytes) and detect its face
+        When a detection size is set and the source is a large JPEG, detection
+        runs on a reduced-resolution decode and the full image is only decoded
+        once a face has been found.
+        With a detection cache, a cached result skips detection entirely.
+        Large image files are detected on a thumbnail and img is a
+        RegionReader that reads only the region that gets cropped.
+        Returns: tuple (img, face_bbox). img is None if the image could not be
+            decoded; face_bbox is None if no face was detected, in which case
+            img is only guaranteed not to be None.
+        """
+        large = self.large_image(source)
+        if large is not None:
+            source = large
+        elif self.cache is not None or isinstance(source, ArchiveMember):
+            # Hash the encoded content; read the file once and decode from memory
+            source = self.read_source(source)
+            if source is None:
+                return None, None
+
+        key, hit, face_bbox = self.lookup_detection(source, strict)
+        if hit:
+            if not face_bbox:
+                return source, None
+            img = self.decode_full(source)
+            return (img, face_bbox) if img is not None else (None, None)
+
+        detection_img, reduced = self.decode_detection_image(source)
+        if detection_img is None:
+            return None, None
+        face_bbox, complete = self.detector.run_chain([detection_img], strict)[0]
+        if not face_bbox:
+            self.store_detection(key, None, complete)
+            return detection_img, None
+
+        img, face_bbox = self.full_resolution(source, detection_img, reduced, face_bbox)
+        if img is not None:
+            self.store_detection(key, face_bbox)
+        return img, face_bbox
+
+    def large_image(self, source):
+        """
+        RegionReader for a path to an uncompressed image with at least
+        large_image_pixels pixels; None for other sources. Compressed formats
+        are decoded in full for the crop anyway, so they take the regular path.
+        """
+        if not self.large_image_pixels or not isinstance(source, str):
+            return None
+        with self.profiler.stage("read.header"):
+            reader = open_large_image(source, self.large_image_pixels)
+        return reader if reader is not None and reader.raw else None
+
+    def read_source(self, source):
+        """
+        Return the encoded bytes of a path, bytes or ArchiveMember source, or
+        None if unreadable
+        """
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            return source
+        if isinstance(source, ArchiveMember):
+            return source.read()
+        try:
+            with self.profiler.stage("read"), open(source, "rb") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def lookup_detection(self, data, strict=False):
+        """
+        Look up a detection result for encoded image bytes, or the file of a
+        RegionReader, in the cache
+        Returns: tuple (key, hit, face_bbox); key is None without a cache or
+            if the file cannot be read
+        """
+        if self.cache is None:
+            return None, False, None
+        with self.profiler.stage("cache.lookup"):
+            settings = self.detector.settings(strict)
+            if isinstance(data, RegionReader):
+                # Same digest as the file's bytes; the thumbnail is part of
+                # the settings since it changes the result
+                digest = file_digest(data.path)
+                settings["thumbnail"] = self.detector.detection_size or THUMBNAIL_SIZE
+            else:
+                digest = content_digest(data)
+            if digest is None:
+                return None, False, None
+            key = self.cache.make_key(digest, settings)
+            hit, face_bbox = self.cache.get(key)
+        return key, hit, face_bbox
+
+    def store_detection(self, key, face_bbox, complete=True):
+        """
+        Store a full-resolution detection result under a key from
+        lookup_detection. A miss from an incomplete chain run (see
+        FaceDetector.run_chain) is not stored: with more time or the full
+        chain, a later run may find the face.
+        """
+        if key is not None and (face_bbox or complete):
+            self.cache.put(key, face_bbox)
+
+    def decode_detection_image(self, source):
+        """
+        Decode the image used for detection: a thumbnail of a RegionReader, a
+        reduced-resolution decode for large JPEGs when a detection size is
+        set, the full image otherwise
+        Returns: tuple (img, reduced); img is None if the image could not be decoded
+        """
+        if isinstance(source, RegionReader):
+            with self.profiler.stage("decode.thumbnail"):
+                try:
+                    return (
+                        source.thumbnail(
+                            self.detector.detection_size or THUMBNAIL_SIZE
+                        ),
+                        True,
+                    )
+                except OSError:
+                    return None, False
+        if self.detector.detection_size:
+            with self.profiler.stage("decode.reduced"):
+                small = decode_for_detection(source, self.detector.detection_size)
+            if small is not None:
+                return small, True
+        with self.profiler.stage("decode"):
+            return decode(source), False
+
+    def full_resolution(self, source, detection_img, reduced, face_bbox):
+        """
+        Full-resolution image and bbox for a face detected on detection_img
+        Returns: tuple (img, face_bbox), or (None, None) if the decode failed
+        """
+        if not reduced:
+            return detection_img, face_bbox
+        img = self.decode_full(source)
+        if img is None:
+            return None, None
+        return img, scale_bbox(face_bbox, detection_img.shape, img.shape)
+
+    def decode_full(self, source):
+        """
+        Full-resolution image of a source, or None if it could not be decoded
+        A RegionReader is returned as is: crops read their region on demand.
+        """
+        if isinstance(source, RegionReader):
+            return source
+        with self.profiler.stage("decode"):
+            return decode(source)
+
+    def write_output(self, img, face_bbox, output_path, circular_mask=False):
+        """Crop around face_bbox and write the result with the configured encoder"""
+        buffer = self.crop_face(
+            img, face_bbox, circular_mask, self.encoder.channel_order
+        )
+        with self.profiler.stage("encode"):
+            self.write_file(self.encoder, buffer, output_path)
+
+    def write_file(self, encoder, buffer, output_path):
+        """Encode buffer to output_path, or to that member of the output archive"""
+        if self.output_archive is None:
+            encoder.write(buffer, output_path)
+        else:
+            self.output_archive.add(output_path, encoder.encode(buffer))
+
+    def crop_face(self, img, face_bbox, circular_mask=False, channel_order="RGBA"):
+        """
+        Crop the upper body around face_bbox from a BGR image
+        Returns: 4-channel array in channel_order ("RGBA" or "BGRA")
+        """
+        height, width = img.shape[:2]
+        x1, y1, x2, y2 = self.calculate_crop_box(face_bbox, width, height)
+        return self.finish_crop(img[y1:y2, x1:x2], circular_mask, channel_order)
+
+    def finish_crop(self, crop, circular_mask=False, channel_order="RGBA"):
+        """
+        Output buffer for a BGR crop
+        Returns: 4-channel array in channel_order ("RGBA" or "BGRA")
+        """
+        # Build the output buffer in a single conversion from the BGR crop
+        code = cv2.COLOR_BGR2BGRA if channel_order == "BGRA" else cv2.COLOR_BGR2RGBA
+        with self.profiler.stage("crop"):
+            rgba = cv2.cvtColor(crop, code)
+
+        if circular_mask:
+            with self.profiler.stage("mask"):
+                apply_circular_mask(rgba, self.mask_supersample)
+
+        return rgba
+
+    @staticmethod
+    def encode_png(rgba):
+        """Encode an RGBA array as PNG bytes"""
+        return Encoder().encode(rgba)
+
+    @staticmethod
+    def calculate_crop_box(face_bbox, width, height):
+        """
+        Calculate the square upper-body crop around a face
+        Args:
+            face_bbox: tuple (x, y, w, h) of the detected face
+            width, height: Dimensions of the image
+        Returns: tuple (x1, y1, x2, y2)
+        """
         x, y, w, h = face_bbox
 
         # Calculate crop dimensions
@@ -53,14 +517,10 @@ class ImageProcessor:
         x2 = x1 + actual_size
         y2 = y1 + actual_size
 
-        # Create final image
-        cropped = cv2.cvtColor(original[y1:y2, x1:x2], cv2.COLOR_BGR2RGB)
-        pil_img = Image.fromarray(cropped)
-        rgba = pil_img.convert("RGBA")
+        return x1, y1, x2, y2
 
-        if circular_mask:
-            mask = create_circular_mask(rgba.size)
-            rgba.putalpha(mask)
 
-        rgba.save(output_path, "PNG")
-        return True
+def face_output_path(output_path, index):
+    """Output path of the index-th face (from 1): photo_cropped.png -> photo_cropped_2.png"""
+    stem, extension = os.path.splitext(output_path)
+    return f"{stem}_{index}{extension}"
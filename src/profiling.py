@@ -0,0 +1,108 @@
+import contextlib
+import json
+import math
+import threading
+import time
+from collections import Counter, defaultdict
+
+
+class Profiler:
+    """
+    Collects per-stage timings and counters from FaceDetector and
+    ImageProcessor. Hooks are called with (kind, name, value) for every
+    event, where kind is "stage" (value in seconds) or "count".
+    """
+
+    enabled = True
+
+    def __init__(self, hooks=None):
+        self.samples = defaultdict(list)
+        self.counters = Counter()
+        self.hooks = list(hooks or [])
+        self._lock = threading.Lock()
+
+    def add_hook(self, hook):
+        self.hooks.append(hook)
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        """Time the enclosed block as one sample of stage name"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def record(self, name, seconds):
+        with self._lock:
+            self.samples[name].append(seconds)
+        for hook in self.hooks:
+            hook("stage", name, seconds)
+
+    def count(self, name, value=1):
+        with self._lock:
+            self.counters[name] += value
+        for hook in self.hooks:
+            hook("count", name, value)
+
+    def drain(self):
+        """Return and clear the collected samples and counters, e.g. to send from a worker"""
+        with self._lock:
+            snapshot = {"samples": dict(self.samples), "counters": dict(self.counters)}
+            self.samples = defaultdict(list)
+            self.counters = Counter()
+        return snapshot
+
+    def merge(self, snapshot):
+        """Add samples and counters returned by another profiler's drain()"""
+        with self._lock:
+            for name, values in snapshot["samples"].items():
+                self.samples[name].extend(values)
+            self.counters.update(snapshot["counters"])
+
+    def report(self):
+        """Aggregated count, total, mean and p50/p95/p99 (milliseconds) per stage"""
+        with self._lock:
+            samples = {name: sorted(values) for name, values in self.samples.items()}
+            counters = dict(self.counters)
+        stages = {}
+        for name, values in sorted(samples.items()):
+            total = sum(values)
+            stages[name] = {
+                "count": len(values),
+                "total_ms": round(total * 1000, 3),
+                "mean_ms": round(total / len(values) * 1000, 3),
+                "p50_ms": round(percentile(values, 50) * 1000, 3),
+                "p95_ms": round(percentile(values, 95) * 1000, 3),
+                "p99_ms": round(percentile(values, 99) * 1000, 3),
+            }
+        return {"stages": stages, "counters": dict(sorted(counters.items()))}
+
+    def write_json(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.report(), f, indent=2)
+
+
+class NullProfiler:
+    """Profiler stand-in used when profiling is disabled; every call is a no-op"""
+
+    enabled = False
+    _context = contextlib.nullcontext()
+
+    def stage(self, name):
+        return self._context
+
+    def record(self, name, seconds):
+        pass
+
+    def count(self, name, value=1):
+        pass
+
+
+NULL_PROFILER = NullProfiler()
+
+
+def percentile(sorted_values, q):
+    """Nearest-rank percentile of an already sorted, non-empty list"""
+    rank = max(1, math.ceil(q / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
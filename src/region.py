@@ -0,0 +1,191 @@
+import cv2
+import numpy as np
+from PIL import Image
+
+from .decode import decode, decode_for_detection
+
+# Longest side of the detection thumbnail when no detection size is set
+THUMBNAIL_SIZE = 1024
+# Upper bound on the source rows held at a time while building a thumbnail
+BAND_BYTES = 16 * 1024 * 1024
+
+# Uncompressed pixel layouts that can be read straight from the file:
+# raw mode -> (channels, conversion to BGR)
+_RAW_MODES = {
+    "RGB": (3, cv2.COLOR_RGB2BGR),
+    "BGR": (3, None),
+    "L": (1, cv2.COLOR_GRAY2BGR),
+}
+
+
+class RegionReadError(OSError):
+    """A RegionReader could not read pixels from its file"""
+
+
+def open_header(path):
+    """
+    Parse an image file header with Pillow without decoding any pixels
+    Unlike Image.open, this does not apply Pillow's decompression-bomb pixel
+    limit, which the large local scans handled here exceed by design.
+    Returns: PIL image (to be closed by the caller), or None if the format is
+        not recognized
+    """
+    Image.init()
+    try:
+        with open(path, "rb") as f:
+            prefix = f.read(16)
+    except OSError:
+        return None
+    for format_id in Image.ID:
+        factory, accept = Image.OPEN[format_id]
+        if accept is not None and not accept(prefix):
+            continue
+        try:
+            return factory(path)
+        except (OSError, SyntaxError, ValueError):
+            continue
+    return None
+
+
+def _raw_layout(header):
+    """
+    File layout of an uncompressed image
+    Returns: tuple (rawmode, strips) with (y0, y1, offset, stride, ystep)
+        strips of full-width rows, or None if the pixels are compressed or
+        laid out in a way that cannot be read row by row
+    """
+    if getattr(header, "tag_v2", {}).get(274, 1) != 1:
+        # Rotated TIFF (Orientation tag); leave it to the decoder
+        return None
+    width = header.size[0]
+    modes = set()
+    strips = []
+    for codec, (x0, y0, x1, y1), offset, args in header.tile:
+        if codec != "raw" or x0 != 0 or x1 != width:
+            return None
+        rawmode, stride, ystep = (args, 0, 1) if isinstance(args, str) else args
+        if rawmode not in _RAW_MODES:
+            return None
+        modes.add(rawmode)
+        stride = stride or width * _RAW_MODES[rawmode][0]
+        strips.append((y0, y1, offset, stride, ystep))
+    if len(modes) != 1:
+        return None
+    return modes.pop(), strips
+
+
+class RegionReader:
+    """
+    A large image that is only decoded on demand. Indexing with
+    [y1:y2, x1:x2] returns that region as a BGR array, so it can stand in
+    for a decoded image when cropping. Uncompressed rasters (TIFF, BMP, PPM)
+    are read straight from the file and memory stays proportional to the
+    region; other formats are decoded in full for each read.
+    """
+
+    def __init__(self, path, header):
+        """
+        Args:
+            path: Image file
+            header: PIL image from open_header(path)
+        """
+        self.path = path
+        self.format = header.format
+        width, height = header.size
+        self.shape = (height, width, 3)
+        self._layout = _raw_layout(header)
+
+    @property
+    def raw(self):
+        """Whether regions are read directly from the file"""
+        return self._layout is not None
+
+    def __getitem__(self, key):
+        rows, columns = key
+        height, width = self.shape[:2]
+        y1, y2, _ = rows.indices(height)
+        x1, x2, _ = columns.indices(width)
+        return self.read_region(x1, y1, x2, y2)
+
+    def read_region(self, x1, y1, x2, y2):
+        """Pixels in [y1:y2, x1:x2] as a BGR array"""
+        if not self.raw:
+            img = decode(self.path)
+            if img is None:
+                raise RegionReadError(f"Could not decode {self.path}")
+            return img[y1:y2, x1:x2].copy()
+
+        rawmode, strips = self._layout
+        channels, code = _RAW_MODES[rawmode]
+        region = np.empty((max(0, y2 - y1), max(0, x2 - x1), channels), np.uint8)
+        row_bytes = region.shape[1] * channels
+        try:
+            with open(self.path, "rb") as f:
+                for y0, y_end, offset, stride, ystep in strips:
+                    for y in range(max(y1, y0), min(y2, y_end)):
+                        row = y - y0 if ystep > 0 else y_end - 1 - y
+                        f.seek(offset + row * stride + x1 * channels)
+                        view = memoryview(region[y - y1]).cast("B")
+                        if f.readinto(view) < row_bytes:
+                            raise EOFError
+        except EOFError:
+            raise RegionReadError(f"Truncated image {self.path}") from None
+        except OSError as e:
+            raise RegionReadError(f"Could not read {self.path}: {e}") from None
+        return region if code is None else cv2.cvtColor(region, code)
+
+    def thumbnail(self, max_side):
+        """
+        Downscaled BGR copy with the longest side at most max_side
+        Uncompressed rasters are reduced band by band (box filter over whole
+        blocks of pixels), so the full image is never held in memory.
+        """
+        height, width = self.shape[:2]
+        if not self.raw:
+            img = None
+            if self.format == "JPEG":
+                img = decode_for_detection(self.path, max_side)
+            if img is None:
+                img = decode(self.path)
+            if img is None:
+                raise RegionReadError(f"Could not decode {self.path}")
+            scale = max_side / max(img.shape[:2])
+            if scale >= 1:
+                return img
+            return cv2.resize(
+                img, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA
+            )
+
+        factor = -(-max(height, width) // max_side)
+        out_width = width // factor
+        channels = _RAW_MODES[self._layout[0]][0]
+        rows_per_band = max(1, BAND_BYTES // (width * channels * factor)) * factor
+        bands = []
+        for y in range(0, height - height % factor, rows_per_band):
+            y_end = min(y + rows_per_band, height - height % factor)
+            band = self.read_region(0, y, out_width * factor, y_end)
+            bands.append(
+                cv2.resize(
+                    band,
+                    (out_width, (y_end - y) // factor),
+                    interpolation=cv2.INTER_AREA,
+                )
+            )
+        return np.vstack(bands)
+
+
+def open_large_image(path, min_pixels):
+    """
+    RegionReader for an image file with at least min_pixels pixels
+    Returns: RegionReader, or None for smaller or unrecognized images
+    """
+    header = open_header(path)
+    if header is None:
+        return None
+    try:
+        width, height = header.size
+        if width * height < min_pixels:
+            return None
+        return RegionReader(path, header)
+    finally:
+        header.close()
@@ -0,0 +1,545 @@
+import argparse
+import asyncio
+import json
+import threading
+import time
+from collections import Counter, defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+
+from .decode import decode, read_image_info
+from .detector import scale_bbox
+from .encoder import Encoder
+from .processor import ImageProcessor
+from .profiling import percentile
+
+DEFAULT_PORT = 8080
+DEFAULT_WORKERS = 2
+DEFAULT_MAX_BATCH_SIZE = 8
+DEFAULT_MAX_WAIT_MS = 10
+MAX_BODY_SIZE = 64 * 1024 * 1024
+# Latency percentiles are computed over this many most recent samples
+METRICS_WINDOW = 10000
+
+_REASONS = {
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    411: "Length Required",
+    413: "Payload Too Large",
+    422: "Unprocessable Entity",
+    500: "Internal Server Error",
+}
+
+
+def json_response(status, payload):
+    return status, "application/json", json.dumps(payload).encode()
+
+
+class _Request:
+    """One crop or detect request waiting for a batch"""
+
+    __slots__ = ("kind", "data", "strict", "circular_mask", "future", "enqueued")
+
+    def __init__(self, kind, data, strict, circular_mask, future, enqueued):
+        self.kind = kind
+        self.data = data
+        self.strict = strict
+        self.circular_mask = circular_mask
+        self.future = future
+        self.enqueued = enqueued
+
+
+def run_batch(processor, batch):
+    """
+    Handle a batch of requests with one detection pass per detection mode
+    Args:
+        processor: ImageProcessor owned by the calling worker thread
+        batch: List of _Request
+    Returns: List of (status, content_type, body) in batch order
+    """
+    results = [None] * len(batch)
+    detected = {}
+    misses = defaultdict(list)
+    for index, request in enumerate(batch):
+        key, hit, face_bbox = processor.lookup_detection(request.data, request.strict)
+        if hit:
+            detected[index] = (key, None, False, face_bbox)
+            continue
+        img, reduced = processor.decode_detection_image(request.data)
+        if img is None:
+            results[index] = json_response(400, {"error": "Could not decode image"})
+            continue
+        misses[request.strict].append((index, key, img, reduced))
+
+    for strict, items in misses.items():
+        chain_results = processor.detector.run_chain(
+            [img for _, _, img, _ in items], strict=strict
+        )
+        for (index, key, img, reduced), (face_bbox, complete) in zip(
+            items, chain_results
+        ):
+            if not face_bbox:
+                processor.store_detection(key, None, complete)
+            detected[index] = (key, img, reduced, face_bbox)
+
+    for index, (key, img, reduced, face_bbox) in detected.items():
+        results[index] = _finish(processor, batch[index], key, img, reduced, face_bbox)
+    return results
+
+
+def _finish(processor, request, key, img, reduced, face_bbox):
+    cached = img is None
+    if not face_bbox:
+        if request.kind == "detect":
+            return json_response(200, {"face": None})
+        return json_response(422, {"error": "No face detected"})
+
+    if request.kind == "detect":
+        if reduced:
+            # Map back using the header size instead of a full decode
+            info = read_image_info(request.data)
+            if info is None:
+                return json_response(400, {"error": "Could not decode image"})
+            width, height = info[1]
+            face_bbox = scale_bbox(face_bbox, img.shape, (height, width))
+        if not cached:
+            processor.store_detection(key, face_bbox)
+        x, y, w, h = (int(value) for value in face_bbox)
+        return json_response(200, {"face": {"x": x, "y": y, "w": w, "h": h}})
+
+    if cached:
+        # Cached boxes are already in full-resolution coordinates
+        img = decode(request.data)
+    else:
+        img, face_bbox = processor.full_resolution(
+            request.data, img, reduced, face_bbox
+        )
+        if img is not None:
+            processor.store_detection(key, face_bbox)
+    if img is None:
+        return json_response(400, {"error": "Could not decode image"})
+    encoder = processor.encoder
+    buffer = processor.crop_face(
+        img, face_bbox, request.circular_mask, encoder.channel_order
+    )
+    return 200, encoder.mime_type, encoder.encode(buffer)
+
+
+class WorkerPool:
+    """
+    Threads that each keep a warm ImageProcessor (Haar cascades loaded,
+    MediaPipe sessions open), so batches never pay for model setup
+    """
+
+    def __init__(self, workers=DEFAULT_WORKERS, processor_options=None):
+        self.workers = workers
+        self.processor_options = processor_options or {}
+        self.processors = []
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="facecrop-worker"
+        )
+        # Blocking every task on a barrier makes the executor start all of
+        # its threads now, and each warms up its own processor
+        barrier = threading.Barrier(workers)
+        futures = [self.executor.submit(self._warm, barrier) for _ in range(workers)]
+        for future in futures:
+            future.result()
+
+    def _processor(self):
+        processor = getattr(self._local, "processor", None)
+        if processor is None:
+            processor = ImageProcessor(**self.processor_options)
+            for strict in (True, False):
+                processor.detector.detect_faces(
+                    [np.zeros((64, 64, 3), dtype=np.uint8)], strict=strict
+                )
+            self._local.processor = processor
+            with self._lock:
+                self.processors.append(processor)
+        return processor
+
+    def _warm(self, barrier):
+        self._processor()
+        barrier.wait()
+
+    def run(self, batch):
+        """Run a batch on the calling worker thread"""
+        return run_batch(self._processor(), batch)
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+        for processor in self.processors:
+            processor.close()
+
+
+class Metrics:
+    """Request counters, queue depth and recent latencies of a running server"""
+
+    def __init__(self, window=METRICS_WINDOW):
+        self.counters = Counter()
+        self.latencies = defaultdict(lambda: deque(maxlen=window))
+        self.batch_sizes = Counter()
+        self.max_queue_depth = 0
+        self.start = time.time()
+
+    def record(self, name, seconds):
+        self.latencies[name].append(seconds)
+
+    def report(self, queue_depth, in_flight, workers):
+        batches = sum(self.batch_sizes.values())
+        batched = sum(size * count for size, count in self.batch_sizes.items())
+        latency = {}
+        for name, values in sorted(self.latencies.items()):
+            values = sorted(values)
+            if not values:
+                continue
+            latency[name] = {
+                "count": len(values),
+                "mean_ms": round(sum(values) / len(values) * 1000, 3),
+                "p50_ms": round(percentile(values, 50) * 1000, 3),
+                "p95_ms": round(percentile(values, 95) * 1000, 3),
+                "p99_ms": round(percentile(values, 99) * 1000, 3),
+            }
+        return {
+            "uptime_seconds": round(time.time() - self.start, 3),
+            "workers": workers,
+            "queue_depth": queue_depth,
+            "max_queue_depth": self.max_queue_depth,
+            "in_flight_batches": in_flight,
+            "batches": batches,
+            "mean_batch_size": round(batched / batches, 3) if batches else 0.0,
+            "batch_sizes": {
+                str(size): n for size, n in sorted(self.batch_sizes.items())
+            },
+            "requests": dict(sorted(self.counters.items())),
+            "latency": latency,
+        }
+
+
+class MicroBatcher:
+    """
+    Merges concurrent requests into batches of up to max_batch_size. A batch
+    is dispatched once it is full, or max_wait after its oldest request
+    arrived, whichever comes first, and only when a worker is free, so
+    requests that queue behind busy workers are batched together.
+    """
+
+    def __init__(self, pool, max_batch_size, max_wait, metrics):
+        self.pool = pool
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.metrics = metrics
+        self.pending = deque()
+        self.in_flight = 0
+        self._arrived = asyncio.Event()
+        self._slots = asyncio.Semaphore(pool.workers)
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def submit(self, kind, data, strict=False, circular_mask=False):
+        """Queue a request and wait for its (status, content_type, body)"""
+        loop = asyncio.get_running_loop()
+        request = _Request(
+            kind, data, strict, circular_mask, loop.create_future(), loop.time()
+        )
+        self.pending.append(request)
+        self.metrics.max_queue_depth = max(
+            self.metrics.max_queue_depth, len(self.pending)
+        )
+        self._arrived.set()
+        return await request.future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            while not self.pending:
+                self._arrived.clear()
+                await self._arrived.wait()
+            await self._slots.acquire()
+
+            deadline = self.pending[0].enqueued + self.max_wait
+            while len(self.pending) < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                self._arrived.clear()
+                try:
+                    await asyncio.wait_for(self._arrived.wait(), timeout)
+                except asyncio.TimeoutError:
+                    break
+
+            size = min(self.max_batch_size, len(self.pending))
+            batch = [self.pending.popleft() for _ in range(size)]
+            self.in_flight += 1
+            loop.create_task(self._dispatch(batch))
+
+    async def _dispatch(self, batch):
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        for request in batch:
+            self.metrics.record("queue_wait", now - request.enqueued)
+        self.metrics.batch_sizes[len(batch)] += 1
+        try:
+            start = time.perf_counter()
+            results = await loop.run_in_executor(
+                self.pool.executor, self.pool.run, batch
+            )
+            self.metrics.record("batch", time.perf_counter() - start)
+        except Exception as e:
+            results = [json_response(500, {"error": str(e)})] * len(batch)
+        finally:
+            self.in_flight -= 1
+            self._slots.release()
+        for request, result in zip(batch, results):
+            if not request.future.done():
+                request.future.set_result(result)
+
+
+def _flag(query, name):
+    value = query.get(name, ["0"])[-1].lower()
+    return value in ("1", "true", "yes", "on")
+
+
+class FaceCropServer:
+    """
+    Local HTTP service for face detection and cropping
+
+    Endpoints:
+        POST /detect?strict=1          image bytes -> {"face": {x, y, w, h} or null}
+        POST /crop?strict=1&circular=1 image bytes -> encoded crop (422 if no face)
+        GET  /metrics                  queue depth, batch sizes and latencies
+        GET  /health
+    """
+
+    def __init__(
+        self,
+        host="127.0.0.1",
+        port=DEFAULT_PORT,
+        workers=DEFAULT_WORKERS,
+        max_batch_size=DEFAULT_MAX_BATCH_SIZE,
+        max_wait_ms=DEFAULT_MAX_WAIT_MS,
+        processor_options=None,
+    ):
+        if workers < 1:
+            raise ValueError("workers must be at least 1")
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be at least 1")
+        if max_wait_ms < 0:
+            raise ValueError("max_wait_ms must not be negative")
+        self.host = host
+        self.port = port
+        self.workers = workers
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.processor_options = processor_options or {}
+        self.metrics = Metrics()
+        self.pool = None
+        self.batcher = None
+        self._server = None
+
+    async def start(self):
+        """Warm up the workers and start listening; sets port if it was 0"""
+        loop = asyncio.get_running_loop()
+        self.pool = await loop.run_in_executor(
+            None, WorkerPool, self.workers, self.processor_options
+        )
+        self.batcher = MicroBatcher(
+            self.pool, self.max_batch_size, self.max_wait, self.metrics
+        )
+        self.batcher.start()
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def serve_forever(self):
+        await self._server.serve_forever()
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        if self.batcher is not None:
+            await self.batcher.stop()
+        if self.pool is not None:
+            await asyncio.get_running_loop().run_in_executor(None, self.pool.close)
+
+    async def _handle(self, reader, writer):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line.strip():
+                    break
+                try:
+                    method, target, version = line.decode("latin-1").split()
+                except ValueError:
+                    await self._respond(
+                        writer, json_response(400, {"error": "Bad request line"})
+                    )
+                    break
+                headers = {}
+                while True:
+                    header = await reader.readline()
+                    if header in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = header.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                if "transfer-encoding" in headers:
+                    await self._respond(
+                        writer, json_response(411, {"error": "Content-Length required"})
+                    )
+                    break
+                try:
+                    length = int(headers.get("content-length", 0))
+                except ValueError:
+                    length = -1
+                if length < 0 or length > MAX_BODY_SIZE:
+                    status = 400 if length < 0 else 413
+                    await self._respond(
+                        writer, json_response(status, {"error": "Invalid body size"})
+                    )
+                    break
+                body = await reader.readexactly(length) if length else b""
+
+                response = await self._route(method, target, body)
+                keep_alive = (
+                    version == "HTTP/1.1"
+                    and headers.get("connection", "").lower() != "close"
+                )
+                await self._respond(writer, response, keep_alive)
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def _route(self, method, target, body):
+        url = urlsplit(target)
+        query = parse_qs(url.query)
+        path = url.path.rstrip("/")
+        if path in ("/crop", "/detect"):
+            if method != "POST":
+                return json_response(405, {"error": "Use POST"})
+            if not body:
+                return json_response(400, {"error": "Empty body"})
+            kind = path[1:]
+            start = time.perf_counter()
+            response = await self.batcher.submit(
+                kind, body, _flag(query, "strict"), _flag(query, "circular")
+            )
+            self.metrics.record(kind, time.perf_counter() - start)
+            self.metrics.counters[f"{kind}.{response[0]}"] += 1
+            return response
+        if path == "/metrics" and method == "GET":
+            return json_response(
+                200,
+                self.metrics.report(
+                    len(self.batcher.pending), self.batcher.in_flight, self.workers
+                ),
+            )
+        if path == "/health" and method == "GET":
+            return json_response(200, {"status": "ok"})
+        return json_response(404, {"error": "Not found"})
+
+    @staticmethod
+    async def _respond(writer, response, keep_alive=False):
+        status, content_type, body = response
+        head = (
+            f"HTTP/1.1 {status} {_REASONS.get(status, '')}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+        )
+        writer.write(head.encode("latin-1") + body)
+        await writer.drain()
+
+
+async def serve(server):
+    await server.start()
+    print(
+        f"Serving on http://{server.host}:{server.port} "
+        f"({server.workers} workers, batches of up to {server.max_batch_size}, "
+        f"max wait {server.max_wait * 1000:g} ms)"
+    )
+    try:
+        await server.serve_forever()
+    finally:
+        await server.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Face detection and cropping service")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=DEFAULT_WORKERS,
+        help=f"Worker threads, each with its own detector (default: {DEFAULT_WORKERS})",
+    )
+    parser.add_argument(
+        "--max-batch-size",
+        type=int,
+        default=DEFAULT_MAX_BATCH_SIZE,
+        help=f"Most requests merged into one batch (default: {DEFAULT_MAX_BATCH_SIZE})",
+    )
+    parser.add_argument(
+        "--max-wait-ms",
+        type=float,
+        default=DEFAULT_MAX_WAIT_MS,
+        help="Longest a request waits for others to join its batch "
+        f"(default: {DEFAULT_MAX_WAIT_MS})",
+    )
+    parser.add_argument("--detection-size", type=int)
+    parser.add_argument(
+        "--preset",
+        choices=sorted(Encoder.PRESETS),
+        default="png",
+        help="Encoding of /crop responses (default: png)",
+    )
+    parser.add_argument("--antialias", action="store_true")
+    parser.add_argument("--cache", help="SQLite detection cache file (optional)")
+    args = parser.parse_args()
+
+    options = {
+        "detection_size": args.detection_size,
+        "antialias": args.antialias,
+        "encoder": Encoder.from_preset(args.preset),
+    }
+    if args.cache:
+        options["cache_path"] = args.cache
+    try:
+        server = FaceCropServer(
+            args.host,
+            args.port,
+            args.workers,
+            args.max_batch_size,
+            args.max_wait_ms,
+            options,
+        )
+    except ValueError as e:
+        parser.error(str(e))
+    try:
+        asyncio.run(serve(server))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
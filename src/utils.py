@@ -1,9 +1,72 @@
+import functools
+
+import cv2
+import numpy as np
 from PIL import Image, ImageDraw
 
+# Batch outputs share a handful of sizes, so a few masks cover most images
+MASK_CACHE_SIZE = 32
+
 
-def create_circular_mask(size):
+def create_circular_mask(size, supersample=1):
     """Create a circular mask for the image"""
-    mask = Image.new("L", size, 0)
-    draw = ImageDraw.Draw(mask)
-    draw.ellipse((0, 0, size[0], size[1]), fill=255)
+    return Image.fromarray(circular_mask_array(tuple(size), supersample).copy())
+
+
+@functools.lru_cache(maxsize=MASK_CACHE_SIZE)
+def circular_mask_array(size, supersample=1):
+    """
+    Cached circular alpha mask
+    Args:
+        size: tuple (width, height)
+        supersample: Rasterize at this many times the size and average down
+            for anti-aliased edges; 1 gives the original hard-edged mask
+    Returns: Read-only uint8 array of shape (height, width)
+    """
+    width, height = size
+    if supersample <= 1:
+        mask = Image.new("L", size, 0)
+        draw = ImageDraw.Draw(mask)
+        draw.ellipse((0, 0, size[0], size[1]), fill=255)
+        mask = np.asarray(mask)
+    else:
+        big = Image.new("L", (width * supersample, height * supersample), 0)
+        draw = ImageDraw.Draw(big)
+        draw.ellipse(
+            (0, 0, width * supersample - 1, height * supersample - 1), fill=255
+        )
+        # Area interpolation averages each supersample x supersample block
+        mask = cv2.resize(np.asarray(big), size, interpolation=cv2.INTER_AREA)
+    mask.flags.writeable = False
     return mask
+
+
+def apply_circular_mask(buffer, supersample=1):
+    """Write a circular mask into the alpha channel of a 4-channel buffer in place"""
+    height, width = buffer.shape[:2]
+    buffer[:, :, 3] = circular_mask_array((width, height), supersample)
+    return buffer
+
+
+def resize_pyramid(img, sizes):
+    """
+    Square resizes of a square image for several sizes at once
+    Downscales are chained largest first with area interpolation, so each
+    level is averaged from the next larger one instead of from the original.
+    Args:
+        img: Square image
+        sizes: Side lengths; None stands for the image itself
+    Returns: dict mapping each size to its image
+    """
+    levels = {None: img}
+    source = img
+    for size in sorted({size for size in sizes if size is not None}, reverse=True):
+        if size > img.shape[0]:
+            # Upscales start from the original
+            levels[size] = cv2.resize(img, (size, size), interpolation=cv2.INTER_CUBIC)
+        elif size == img.shape[0]:
+            levels[size] = img
+        else:
+            source = cv2.resize(source, (size, size), interpolation=cv2.INTER_AREA)
+            levels[size] = source
+    return levels
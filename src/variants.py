@@ -0,0 +1,104 @@
+import itertools
+import os
+
+from .defaults import DEFAULT_TEMPLATE
+from .encoder import Encoder
+
+MASKS = ("square", "circular")
+
+
+class OutputSpec:
+    """One output variant of a crop: size, mask, encoding and file name"""
+
+    def __init__(self, size=None, circular=False, encoder=None, template=None):
+        """
+        Args:
+            size: Side length in pixels, or None for the crop's own size
+            circular: Apply the circular mask
+            encoder: Encoder for this variant (default: PNG)
+            template: File name template with the fields {stem}, {size},
+                {mask}, {format} and {ext} (default: DEFAULT_TEMPLATE)
+        """
+        if size is not None and size < 1:
+            raise ValueError("Variant size must be at least 1")
+        self.size = size
+        self.circular = circular
+        self.encoder = encoder or Encoder()
+        self.template = template or DEFAULT_TEMPLATE
+        try:
+            self.output_path("photo.png")
+        except (KeyError, IndexError, ValueError) as e:
+            raise ValueError(f"Invalid name template {self.template!r}: {e}")
+
+    @property
+    def mask(self):
+        return "circular" if self.circular else "square"
+
+    def output_path(self, output_path):
+        """Path of this variant next to the regular output_path"""
+        directory, name = os.path.split(output_path)
+        return os.path.join(
+            directory,
+            self.template.format(
+                stem=os.path.splitext(name)[0],
+                size=self.size or "original",
+                mask=self.mask,
+                format=self.encoder.format,
+                ext=self.encoder.extension,
+            ),
+        )
+
+    def settings(self):
+        """Variant settings that affect the output files"""
+        return {
+            "size": self.size,
+            "mask": self.mask,
+            "encoder": self.encoder.settings(),
+            "template": self.template,
+        }
+
+
+def parse_variants(specs, encoder=None, circular=False, template=None):
+    """
+    Parse variant specs such as "256", "128,circular" or
+    "64/128/256,square/circular,webp-lossless"
+    Each comma-separated field is a size (pixels or "original"), a mask
+    ("square" or "circular") or an encoder preset; "/" lists alternatives,
+    and every combination becomes a variant.
+    Args:
+        specs: List of spec strings
+        encoder: Encoder for variants without a preset
+        circular: Mask for variants that do not name one
+        template: File name template shared by all variants
+    Returns: List of OutputSpec
+    Raises: ValueError on an invalid spec or when two variants would write
+        the same file
+    """
+    variants = []
+    for spec in specs:
+        sizes, masks, presets = [None], [circular], [None]
+        for field in spec.split(","):
+            options = [option.strip().lower() for option in field.split("/")]
+            if all(option in MASKS for option in options):
+                masks = [option == "circular" for option in options]
+            elif all(option in Encoder.PRESETS for option in options):
+                presets = options
+            else:
+                sizes = [_parse_size(option, spec) for option in options]
+        for size, mask, preset in itertools.product(sizes, masks, presets):
+            variant_encoder = Encoder.from_preset(preset) if preset else encoder
+            variants.append(OutputSpec(size, mask, variant_encoder, template))
+
+    paths = [variant.output_path("photo.png") for variant in variants]
+    if len(set(paths)) != len(paths):
+        raise ValueError("Several variants would write the same file")
+    return variants
+
+
+def _parse_size(option, spec):
+    if option == "original":
+        return None
+    try:
+        return int(option)
+    except ValueError:
+        raise ValueError(f"Invalid variant {spec!r}: unknown field {option!r}")
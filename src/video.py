@@ -0,0 +1,237 @@
+import os
+import re
+import time
+
+import cv2
+import numpy as np
+
+from .decode import decode
+from .defaults import DEFAULT_KEYFRAME_INTERVAL, DEFAULT_SMOOTHING
+from .discovery import IMAGE_EXTENSIONS, is_video
+
+# Side length of the frames in a cropped output video
+VIDEO_OUTPUT_SIZE = 512
+_VIDEO_CODECS = {".mp4": "mp4v", ".m4v": "mp4v", ".mov": "mp4v", ".avi": "MJPG"}
+
+
+def _natural_key(name):
+    return [int(part) if part.isdigit() else part for part in re.split(r"(\d+)", name)]
+
+
+def read_frames(source):
+    """
+    Yield (name, frame) for each frame of a video file, or of an image
+    sequence directory in natural filename order (frame2 before frame10)
+    """
+    if os.path.isdir(source):
+        names = sorted(
+            (
+                name
+                for name in os.listdir(source)
+                if name.lower().endswith(IMAGE_EXTENSIONS)
+            ),
+            key=_natural_key,
+        )
+        for name in names:
+            frame = decode(os.path.join(source, name))
+            if frame is not None:
+                yield os.path.splitext(name)[0], frame
+        return
+
+    capture = cv2.VideoCapture(source)
+    try:
+        index = 0
+        while True:
+            ok, frame = capture.read()
+            if not ok:
+                break
+            yield f"frame_{index:06d}", frame
+            index += 1
+    finally:
+        capture.release()
+
+
+def video_fps(source, default=25.0):
+    """Frame rate of a video file, or default for image sequences"""
+    if os.path.isdir(source):
+        return default
+    capture = cv2.VideoCapture(source)
+    fps = capture.get(cv2.CAP_PROP_FPS)
+    capture.release()
+    return fps if fps and fps > 0 else default
+
+
+class FaceTracker:
+    """
+    Follows one face through consecutive frames. Full detection runs on
+    keyframes and whenever tracking is lost; in between, only MediaPipe
+    searches a region around the previous face, since a Haar fallback there
+    would make lost frames cost more than a full detection and could lock
+    onto texture. The returned box is exponentially smoothed so the crop
+    window does not jitter.
+    """
+
+    # Tracking is considered lost when the face size jumps by more than this
+    MAX_SIZE_CHANGE = 1.5
+
+    def __init__(
+        self,
+        detector,
+        strict=False,
+        keyframe_interval=DEFAULT_KEYFRAME_INTERVAL,
+        smoothing=DEFAULT_SMOOTHING,
+        roi_margin=1.0,
+    ):
+        """
+        Args:
+            detector: FaceDetector
+            keyframe_interval: Run full detection at least every this many frames
+            smoothing: Weight of the previous box, 0 (none) to below 1
+            roi_margin: Search region padding on each side, in face sizes
+        """
+        if keyframe_interval < 1:
+            raise ValueError("keyframe_interval must be at least 1")
+        if not 0 <= smoothing < 1:
+            raise ValueError("smoothing must be at least 0 and below 1")
+        self.detector = detector
+        self.strict = strict
+        self.keyframe_interval = keyframe_interval
+        self.smoothing = smoothing
+        self.roi_margin = roi_margin
+        self.frames = 0
+        self.full_detections = 0
+        self.roi_detections = 0
+        self.lost = 0
+        self._since_keyframe = 0
+        self._last = None
+        self._smoothed = None
+
+    def update(self, frame):
+        """
+        Track the face into the next frame
+        Returns: Smoothed (x, y, w, h) or None if no face was found
+        """
+        self.frames += 1
+        face_bbox = None
+        if self._last is not None and self._since_keyframe < self.keyframe_interval:
+            face_bbox = self._search_roi(frame)
+            if face_bbox is None:
+                self.lost += 1
+        if face_bbox is None:
+            face_bbox = self.detector.detect_face(frame, strict=self.strict)
+            self.full_detections += 1
+            self._since_keyframe = 0
+        self._since_keyframe += 1
+
+        self._last = face_bbox
+        if face_bbox is None:
+            self._smoothed = None
+            return None
+        self._smoothed = self._smooth(face_bbox)
+        return tuple(int(round(value)) for value in self._smoothed)
+
+    def _search_roi(self, frame):
+        x, y, w, h = self._last
+        height, width = frame.shape[:2]
+        pad_x, pad_y = int(w * self.roi_margin), int(h * self.roi_margin)
+        x1, y1 = max(0, x - pad_x), max(0, y - pad_y)
+        x2, y2 = min(width, x + w + pad_x), min(height, y + h + pad_y)
+        face_bbox = self.detector.detect_face(frame[y1:y2, x1:x2], strict=True)
+        if face_bbox is None:
+            return None
+        fx, fy, fw, fh = face_bbox
+        ratio = (fw * fh) / float(w * h)
+        if not 1 / self.MAX_SIZE_CHANGE**2 <= ratio <= self.MAX_SIZE_CHANGE**2:
+            return None
+        self.roi_detections += 1
+        return (fx + x1, fy + y1, fw, fh)
+
+    def _smooth(self, face_bbox):
+        # Smooth the center and size rather than the corner, so a growing
+        # face does not drift
+        x, y, w, h = face_bbox
+        current = np.array([x + w / 2, y + h / 2, w, h], dtype=np.float64)
+        if self._smoothed is not None:
+            sx, sy, sw, sh = self._smoothed
+            previous = np.array([sx + sw / 2, sy + sh / 2, sw, sh])
+            current = self.smoothing * previous + (1 - self.smoothing) * current
+        cx, cy, w, h = current
+        return (cx - w / 2, cy - h / 2, w, h)
+
+    def stats(self):
+        return {
+            "frames": self.frames,
+            "full_detections": self.full_detections,
+            "roi_detections": self.roi_detections,
+            "lost": self.lost,
+        }
+
+
+def process_video(
+    processor,
+    source,
+    output,
+    circular_mask=False,
+    strict=False,
+    keyframe_interval=DEFAULT_KEYFRAME_INTERVAL,
+    smoothing=DEFAULT_SMOOTHING,
+    output_size=VIDEO_OUTPUT_SIZE,
+):
+    """
+    Crop the tracked face from every frame of a video or image sequence
+    Args:
+        processor: ImageProcessor (its detector and encoder are used)
+        source: Video file or directory of frames
+        output: Directory for per-frame crops, or a video file path
+            (.mp4, .mov, .avi, ...) for a cropped video
+        output_size: Frame size of a cropped output video
+    Returns: dict of frame counts, detection counts and frames per second
+    """
+    tracker = FaceTracker(processor.detector, strict, keyframe_interval, smoothing)
+    writer = None
+    to_video = is_video(output)
+    if to_video:
+        fourcc = cv2.VideoWriter_fourcc(
+            *_VIDEO_CODECS.get(os.path.splitext(output)[1].lower(), "mp4v")
+        )
+        writer = cv2.VideoWriter(
+            output, fourcc, video_fps(source), (output_size, output_size)
+        )
+        if not writer.isOpened():
+            raise ValueError(f"Cannot write video {output}")
+    else:
+        os.makedirs(output, exist_ok=True)
+
+    written = 0
+    start = time.perf_counter()
+    try:
+        for name, frame in read_frames(source):
+            face_bbox = tracker.update(frame)
+            if face_bbox is None:
+                continue
+            if to_video:
+                crop = processor.crop_face(frame, face_bbox, circular_mask, "BGRA")
+                writer.write(_video_frame(crop, output_size))
+            else:
+                path = os.path.join(
+                    output, f"{name}_cropped{processor.encoder.extension}"
+                )
+                processor.write_output(frame, face_bbox, path, circular_mask)
+            written += 1
+    finally:
+        if writer is not None:
+            writer.release()
+    elapsed = time.perf_counter() - start
+
+    stats = tracker.stats()
+    stats["written"] = written
+    stats["seconds"] = round(elapsed, 3)
+    stats["fps"] = round(tracker.frames / elapsed, 2) if elapsed else 0.0
+    return stats
+
+
+def _video_frame(bgra, size):
+    # Video has no alpha channel, so transparent areas become black
+    frame = cv2.resize(bgra, (size, size), interpolation=cv2.INTER_AREA)
+    alpha = frame[:, :, 3:4].astype(np.uint16)
+    return (frame[:, :, :3] * alpha // 255).astype(np.uint8)
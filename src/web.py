@@ -1,13 +1,110 @@
+import functools
 import os
 import tempfile
-import cv2
-import numpy as np
+import threading
+import time
 import streamlit as st
-from PIL import Image
 import zipfile
-import io
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+from .cache import content_digest
+from .decode import decode
 from .processor import ImageProcessor
-from .utils import create_circular_mask
+
+# Results kept across reruns, shared by every session on the server; the
+# least recently used entries are evicted first
+MAX_CACHED_DETECTIONS = 1000
+MAX_CACHED_CROPS = 200
+
+# Uploads processed at once across all sessions, so concurrent users queue
+# for the same workers instead of oversubscribing the CPU
+MAX_WORKERS = min(4, os.cpu_count() or 1)
+
+# The batch ZIP is kept in memory up to this size, then spills to disk
+ZIP_SPOOL_SIZE = 16 * 1024 * 1024
+
+
+@st.cache_resource(show_spinner=False)
+def get_processor(antialias=False):
+    """Processor shared across reruns and sessions, one per mask edge setting"""
+    return ImageProcessor(antialias=antialias)
+
+
+@st.cache_resource(show_spinner=False)
+def get_executor():
+    """Worker pool shared by every session on the server"""
+    return ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="facecrop")
+
+
+@st.cache_resource(show_spinner=False)
+def detection_processors():
+    """Thread-local slot for each pool thread's detection processor"""
+    return threading.local()
+
+
+def thread_processor():
+    """
+    Processor owned by the calling thread, so pool threads detect in
+    parallel without sharing Haar cascades or MediaPipe sessions
+    """
+    local = detection_processors()
+    processor = getattr(local, "processor", None)
+    if processor is None:
+        processor = local.processor = ImageProcessor()
+    return processor
+
+
+@st.cache_data(max_entries=MAX_CACHED_DETECTIONS, show_spinner=False)
+def detect_upload(digest, strict, _img):
+    """
+    Face bbox of an uploaded image, memoized by content digest and mode
+    Args:
+        digest: content_digest of the uploaded bytes
+        _img: Decoded BGR image (not hashed by Streamlit)
+    Returns: tuple (x, y, w, h) or None
+    """
+    return thread_processor().detect_array(_img, strict=strict)
+
+
+@st.cache_data(max_entries=MAX_CACHED_CROPS, show_spinner=False)
+def crop_upload(digest, strict, circular_mask, antialias, _data):
+    """
+    PNG of the cropped upload, memoized by content digest and every setting,
+    so toggling an option only redoes the steps it affects
+    Args:
+        digest: content_digest of _data
+        _data: Uploaded file bytes (not hashed by Streamlit)
+    Returns: PNG bytes, or None if the image is unreadable or has no face
+    """
+    img = decode(_data)
+    if img is None:
+        return None
+    face_bbox = detect_upload(digest, strict, img)
+    if not face_bbox:
+        return None
+    processor = get_processor(antialias)
+    return processor.encode_png(processor.crop_face(img, face_bbox, circular_mask))
+
+
+def run_in_session(ctx, func, *args):
+    """Run func on a pool thread attached to the submitting session"""
+    add_script_run_ctx(threading.current_thread(), ctx)
+    return func(*args)
+
+
+def read_spooled(spooled_file):
+    """Whole contents of a spooled temporary file, for a deferred download"""
+    spooled_file.seek(0)
+    return spooled_file.read()
+
+
+def format_progress(done, total, elapsed):
+    """Progress bar text with the estimated time remaining"""
+    text = f"Processed {done} of {total} images"
+    if 0 < done < total:
+        remaining = elapsed / done * (total - done)
+        text += f", about {remaining:.0f} s remaining"
+    return text
 
 
 def main():
@@ -25,12 +122,12 @@ def main():
     """
     )
 
-    # Initialize processor
-    processor = ImageProcessor()
-
     # Sidebar controls
     st.sidebar.header("Settings")
     circular_mask = st.sidebar.checkbox("Apply Circular Mask", value=False)
+    antialias = st.sidebar.checkbox(
+        "Smooth Mask Edges", value=False, disabled=not circular_mask
+    )
     strict_mode = st.sidebar.checkbox(
         "Strict Mode (More accurate but may miss faces)", value=False
     )
@@ -43,90 +140,117 @@ def main():
     )
 
     if uploaded_files:
+        total = len(uploaded_files)
+        progress = st.progress(0.0, text=format_progress(0, total, 0.0))
+
         # Create a container for all images
         image_container = st.container()
 
-        # Create a zip buffer for all processed images
-        zip_buffer = io.BytesIO()
+        # Add each processed image to the zip as it finishes; the PNGs are
+        # already compressed, so they are stored rather than deflated again
+        zip_file = tempfile.SpooledTemporaryFile(max_size=ZIP_SPOOL_SIZE)
+        archive = zipfile.ZipFile(zip_file, "w", zipfile.ZIP_STORED)
         successful_processes = 0
-        processed_images = []  # Store processed images for zip creation
 
-        # Process each uploaded file
-        for uploaded_file in uploaded_files:
+        # Lay out every upload first, then fill in results as workers finish
+        executor = get_executor()
+        ctx = get_script_run_ctx()
+        futures = {}
+        placeholders = []
+        for index, uploaded_file in enumerate(uploaded_files):
             with image_container:
                 st.markdown(f"### Processing: {uploaded_file.name}")
                 col1, col2 = st.columns(2)
 
-                # Read and display original image
-                file_bytes = np.asarray(bytearray(uploaded_file.read()), dtype=np.uint8)
-                img = cv2.imdecode(file_bytes, cv2.IMREAD_COLOR)
-
+                # Display the original straight from the upload
+                data = uploaded_file.getvalue()
                 with col1:
                     st.subheader("Original Image")
-                    st.image(cv2.cvtColor(img, cv2.COLOR_BGR2RGB))
-
-                # Process image
-                with tempfile.NamedTemporaryFile(
-                    suffix=".png", delete=False
-                ) as tmp_input, tempfile.NamedTemporaryFile(
-                    suffix=".png", delete=False
-                ) as tmp_output:
-                    # Save uploaded file to temporary location
-                    cv2.imwrite(tmp_input.name, img)
-
-                    # Process the image
-                    success = processor.process_image(
-                        tmp_input.name,
-                        tmp_output.name,
-                        circular_mask=circular_mask,
-                        strict=strict_mode,
-                    )
-
-                    if success:
-                        successful_processes += 1
-                        with col2:
-                            st.subheader("Processed Image")
-                            processed_img = Image.open(tmp_output.name)
-                            st.image(processed_img)
-
-                            # Store processed image data for zip
-                            output_filename = f"processed_{os.path.splitext(uploaded_file.name)[0]}.png"
-                            with open(tmp_output.name, "rb") as f:
-                                processed_images.append((output_filename, f.read()))
-
-                            # Individual download button
-                            with open(tmp_output.name, "rb") as file:
-                                btn = st.download_button(
-                                    label=f"Download processed {uploaded_file.name}",
-                                    data=file,
-                                    file_name=output_filename,
-                                    mime="image/png",
-                                )
-                    else:
-                        with col2:
-                            st.error(
-                                f"No face detected in {uploaded_file.name}. Try disabling strict mode or uploading a different image."
-                            )
-
-                    # Cleanup temporary files
-                    os.unlink(tmp_input.name)
-                    os.unlink(tmp_output.name)
+                    st.image(data)
+
+                with col2:
+                    placeholder = st.empty()
+                    placeholder.info("Processing...")
+                placeholders.append(placeholder)
 
                 # Add a separator between images
                 st.markdown("---")
 
-        # Create zip file after processing all images
-        if successful_processes > 0:
-            with zipfile.ZipFile(zip_buffer, "w", zipfile.ZIP_DEFLATED) as zf:
-                for filename, data in processed_images:
-                    zf.writestr(filename, data)
+            future = executor.submit(
+                run_in_session,
+                ctx,
+                crop_upload,
+                content_digest(data),
+                strict_mode,
+                circular_mask,
+                antialias and circular_mask,
+                data,
+            )
+            futures[future] = index
+
+        start = time.perf_counter()
+        finished = False
+        try:
+            results = as_completed(futures)
+            for done, future in enumerate(results, 1):
+                index = futures[future]
+                uploaded_file = uploaded_files[index]
+                placeholder = placeholders[index]
+                try:
+                    png_data = future.result()
+                except Exception as e:
+                    placeholder.error(f"Error processing {uploaded_file.name}: {e}")
+                    png_data = None
+                else:
+                    if png_data is None:
+                        placeholder.error(
+                            f"No face detected in {uploaded_file.name}. Try disabling strict mode or uploading a different image."
+                        )
 
-            # Add download all button
+                if png_data is not None:
+                    successful_processes += 1
+                    with placeholder.container():
+                        st.subheader("Processed Image")
+                        st.image(png_data)
+
+                        output_filename = (
+                            f"processed_{os.path.splitext(uploaded_file.name)[0]}.png"
+                        )
+                        archive.writestr(output_filename, png_data)
+
+                        # Individual download button. Every displayed result
+                        # stays in memory until the next rerun (st.image holds
+                        # the same bytes), so page memory still grows with the
+                        # number of images; only the batch ZIP is bounded
+                        btn = st.download_button(
+                            label=f"Download processed {uploaded_file.name}",
+                            data=png_data,
+                            file_name=output_filename,
+                            mime="image/png",
+                        )
+
+                progress.progress(
+                    done / total,
+                    text=format_progress(done, total, time.perf_counter() - start),
+                )
+            finished = True
+        finally:
+            # A rerun (e.g. a changed setting) stops this script; drop the
+            # uploads that have not started so they do not hold up the pool
+            for future in futures:
+                future.cancel()
+            archive.close()
+            if not finished or not successful_processes:
+                zip_file.close()
+
+        if successful_processes > 0:
+            # Add download all button; the archive is only read when the
+            # button is clicked, and the spooled file is released once the
+            # next rerun replaces the button
             st.sidebar.markdown("### Batch Download")
-            zip_buffer.seek(0)
             st.sidebar.download_button(
                 label=f"Download All Processed Images ({successful_processes})",
-                data=zip_buffer.getvalue(),
+                data=functools.partial(read_spooled, zip_file),
                 file_name="processed_images.zip",
                 mime="application/zip",
             )
@@ -0,0 +1,139 @@
+import unittest
+import os
+import shutil
+import tarfile
+import tempfile
+import tracemalloc
+import zipfile
+from src.archive import (
+    ArchiveMember,
+    ArchiveScanner,
+    ArchiveWriter,
+    archive_member_path,
+    is_archive,
+)
+from src.processor import ImageProcessor
+
+
+class TestArchive(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        with open(
+            os.path.join("tests", "fixtures", "images", "Mona_Lisa.jpg"), "rb"
+        ) as f:
+            cls.image = f.read()
+        cls.members = {
+            "a.jpg": cls.image,
+            "notes.txt": b"not an image",
+            "sub/b.jpg": cls.image,
+            "skip/c.jpg": cls.image,
+            "../escape.jpg": cls.image,
+        }
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def write_archive(self, name, members=None):
+        path = os.path.join(self.test_dir, name)
+        with ArchiveWriter(path) as writer:
+            for member, data in (members or self.members).items():
+                writer.add(member, data)
+        return path
+
+    def test_is_archive(self):
+        """Test archive detection by extension"""
+        for name in ["a.zip", "a.tar", "a.tar.gz", "A.TGZ"]:
+            self.assertTrue(is_archive(name))
+        self.assertFalse(is_archive("a.jpg"))
+        self.assertEqual(archive_member_path("a/b.jpg", ".png"), "a/b_cropped.png")
+
+    def test_scan_formats_and_filters(self):
+        """Test zip, tar and tar.gz input with the directory scan filters"""
+        for name in ["in.zip", "in.tar", "in.tar.gz"]:
+            path = self.write_archive(name)
+            found = dict(ArchiveScanner(path).scan())
+            self.assertEqual(list(found), ["a.jpg"])
+            self.assertEqual(found["a.jpg"].read(), self.image)
+
+            scanner = ArchiveScanner(path, recursive=True, exclude=["skip"])
+            found = dict(scanner.scan())
+            self.assertEqual(sorted(found), ["a.jpg", "sub/b.jpg"])
+            self.assertEqual(str(found["sub/b.jpg"]), f"{path}:sub/b.jpg")
+            self.assertEqual(scanner.matched, 2)
+            self.assertTrue(scanner.done)
+
+            scanner = ArchiveScanner(path, recursive=True, max_size=100)
+            self.assertEqual(list(scanner.scan()), [])
+
+    def test_member_is_read_once(self):
+        """Test that a member releases its bytes once read"""
+        member = ArchiveMember("in.zip", "a.jpg", b"data")
+        self.assertEqual(member.read(), b"data")
+        self.assertIsNone(member.read())
+
+    def test_corrupt_archives(self):
+        """Test that unreadable and truncated archives raise OSError"""
+        path = os.path.join(self.test_dir, "bad.zip")
+        with open(path, "wb") as f:
+            f.write(b"not a zip file")
+        with self.assertRaises(OSError):
+            list(ArchiveScanner(path).scan())
+
+        path = self.write_archive("in.tar.gz")
+        with open(path, "rb") as f:
+            data = f.read()
+        with open(path, "wb") as f:
+            f.write(data[: len(data) // 2])
+        with self.assertRaises(OSError):
+            list(ArchiveScanner(path, recursive=True).scan())
+
+    def test_writer_round_trip(self):
+        """Test that written members can be read back by the standard tools"""
+        members = {"a_cropped.png": b"first", "sub/b_cropped.png": b"second"}
+        path = self.write_archive("out.zip", members)
+        with zipfile.ZipFile(path) as archive:
+            self.assertEqual(archive.read("sub/b_cropped.png"), b"second")
+        for name in ["out.tar", "out.tgz"]:
+            path = self.write_archive(name, members)
+            with tarfile.open(path) as archive:
+                self.assertEqual(archive.getnames(), list(members))
+                self.assertEqual(archive.extractfile("a_cropped.png").read(), b"first")
+
+    def test_scan_memory_is_bounded(self):
+        """Test that scanning holds one member at a time, not the archive"""
+        members = {f"{i}.jpg": os.urandom(1024 * 1024) for i in range(16)}
+        path = self.write_archive("big.tar", members)
+        del members
+        tracemalloc.start()
+        try:
+            for _, member in ArchiveScanner(path).scan():
+                member.read()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        self.assertLess(peak, 4 * 1024 * 1024)
+
+    def test_process_into_archive(self):
+        """Test cropping an archive member into an output archive"""
+        path = self.write_archive("in.zip")
+        output = os.path.join(self.test_dir, "out.zip")
+        with ArchiveWriter(output) as writer:
+            with ImageProcessor(output_archive=writer) as processor:
+                for relpath, member in ArchiveScanner(path).scan():
+                    self.assertTrue(
+                        processor.process_image(
+                            member, archive_member_path(relpath, ".png")
+                        )
+                    )
+        with zipfile.ZipFile(output) as archive:
+            self.assertEqual(archive.namelist(), ["a_cropped.png"])
+            data = archive.read("a_cropped.png")
+        self.assertEqual(data[:8], b"\x89PNG\r\n\x1a\n")
+        self.assertFalse(os.path.exists("a_cropped.png"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,115 @@
+import unittest
+import os
+import tempfile
+import shutil
+import numpy as np
+import cv2
+from src.cache import DetectionCache, content_digest
+from src.processor import ImageProcessor
+
+
+class TestDetectionCache(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.cache_path = os.path.join(self.test_dir, "cache.sqlite")
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def test_content_digest(self):
+        """Test that digests depend on content and, for arrays, on shape"""
+        self.assertEqual(content_digest(b"abc"), content_digest(b"abc"))
+        self.assertNotEqual(content_digest(b"abc"), content_digest(b"abd"))
+        flat = np.zeros((4, 6, 3), dtype=np.uint8)
+        self.assertNotEqual(content_digest(flat), content_digest(flat.reshape(6, 4, 3)))
+        # Non-contiguous views hash like their contents
+        view = np.zeros((8, 6, 3), dtype=np.uint8)[::2]
+        self.assertEqual(content_digest(view), content_digest(flat))
+
+    def test_get_put_and_persistence(self):
+        """Test storing results, including no-face results, across reopen"""
+        key = DetectionCache.make_key("digest", {"strict": False})
+        with DetectionCache(self.cache_path) as cache:
+            self.assertEqual(cache.get(key), (False, None))
+            cache.put(key, (1, 2, 3, 4))
+            cache.put("no-face", None)
+
+        with DetectionCache(self.cache_path) as cache:
+            self.assertEqual(cache.get(key), (True, (1, 2, 3, 4)))
+            self.assertEqual(cache.get("no-face"), (True, None))
+            self.assertEqual((cache.hits, cache.misses), (2, 0))
+
+    def test_settings_change_key(self):
+        """Test that different detector settings give different keys"""
+        self.assertNotEqual(
+            DetectionCache.make_key("digest", {"strict": False}),
+            DetectionCache.make_key("digest", {"strict": True}),
+        )
+
+    def test_lru_eviction(self):
+        """Test that the least recently used entries are evicted first"""
+        with DetectionCache(self.cache_path, max_entries=20) as cache:
+            for i in range(20):
+                cache.put(f"key{i}", (i, i, i, i))
+            cache.get("key0")  # Mark as recently used
+            cache.put("key20", (20, 20, 20, 20))
+
+            self.assertLessEqual(len(cache), 20)
+            self.assertTrue(cache.get("key0")[0])
+            self.assertTrue(cache.get("key20")[0])
+            self.assertFalse(cache.get("key1")[0])
+
+    def test_processor_skips_detection_on_hit(self):
+        """Test that a cached result skips detection in ImageProcessor"""
+        mona_lisa = os.path.join("tests", "fixtures", "images", "Mona_Lisa.jpg")
+        output_path = os.path.join(self.test_dir, "out.png")
+
+        with ImageProcessor(cache_path=self.cache_path) as processor:
+            self.assertTrue(processor.process_image(mona_lisa, output_path))
+            self.assertEqual(processor.cache_stats()["cache_misses"], 1)
+
+        with ImageProcessor(cache_path=self.cache_path) as processor:
+            processor.detector.run_chain = None  # Would fail if called
+            self.assertTrue(
+                processor.process_image(mona_lisa, output_path, circular_mask=True)
+            )
+            self.assertEqual(processor.cache_stats()["cache_hits"], 1)
+
+    def test_detect_arrays_only_detects_misses(self):
+        """Test that batch detection through the cache only detects uncached images"""
+        mona_lisa = cv2.imread(
+            os.path.join("tests", "fixtures", "images", "Mona_Lisa.jpg")
+        )
+        empty = np.zeros((100, 100, 3), dtype=np.uint8)
+
+        with ImageProcessor(cache_path=self.cache_path) as processor:
+            first = processor.detect_arrays([mona_lisa], strict=True)
+            detected = []
+            run_chain = processor.detector.run_chain
+
+            def record(images, strict=False):
+                detected.extend(images)
+                return run_chain(images, strict=strict)
+
+            processor.detector.run_chain = record
+            results = processor.detect_arrays([empty, mona_lisa], strict=True)
+
+        self.assertEqual(results, [None, first[0]])
+        self.assertEqual(len(detected), 1)
+        self.assertIs(detected[0], empty)
+
+    def test_budget_misses_not_cached(self):
+        """Test that a miss with stages skipped for the time budget is not cached"""
+        empty = np.zeros((100, 100, 3), dtype=np.uint8)
+        for time_budget, cached in [(1e-9, False), (None, True)]:
+            with ImageProcessor(
+                cache_path=self.cache_path, time_budget=time_budget
+            ) as processor:
+                for _ in range(2):
+                    self.assertEqual(processor.detect_arrays([empty]), [None])
+                stats = processor.cache_stats()
+                self.assertEqual(stats["cache_hits"], 1 if cached else 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,163 @@
+import unittest
+import json
+import os
+import shutil
+import tempfile
+from src.chain import (
+    ADAPTIVE_MIN_RUNS,
+    ADAPTIVE_PROBE_INTERVAL,
+    ADAPTIVE_SKIP_RUNS,
+    DetectorChain,
+    DetectorStage,
+    load_chain_config,
+)
+
+
+class TestDetectorStage(unittest.TestCase):
+    def test_defaults_and_names(self):
+        """Test parameter defaults and derived stage names"""
+        stage = DetectorStage("haar", scale_factor=1.02)
+        self.assertEqual(stage.name, "haar_1.02")
+        self.assertEqual(stage.params["min_neighbors"], 3)
+        self.assertEqual(DetectorStage("profile", flipped=True).name, "profile_flipped")
+        self.assertEqual(DetectorStage("mediapipe", name="mp").name, "mp")
+        self.assertEqual(DetectorStage("mediapipe").settings()["type"], "mediapipe")
+
+    def test_invalid_stages(self):
+        """Test that unknown types, parameters and values are rejected"""
+        with self.assertRaises(ValueError):
+            DetectorStage("dlib")
+        with self.assertRaises(ValueError):
+            DetectorStage("haar", min_score=0.5)
+        with self.assertRaises(ValueError):
+            DetectorStage("haar", scale_factor=1.0)
+        with self.assertRaises(ValueError):
+            DetectorStage("mediapipe", min_score=2)
+
+
+class TestDetectorChain(unittest.TestCase):
+    def setUp(self):
+        self.stages = [
+            {"type": "mediapipe"},
+            {"type": "haar", "scale_factor": 1.02},
+            {"type": "profile"},
+        ]
+
+    def run_images(self, chain, count, costs, hit_stage=None):
+        """Simulate count images; each stage costs costs[name] seconds"""
+        for _ in range(count):
+            for stage in chain.plan():
+                hit = stage.name == hit_stage
+                chain.record(stage, costs[stage.name], hit)
+                if hit:
+                    break
+
+    def test_validation(self):
+        """Test that empty chains, duplicate names and bad budgets are rejected"""
+        with self.assertRaises(ValueError):
+            DetectorChain([])
+        with self.assertRaises(ValueError):
+            DetectorChain([{"type": "haar"}, {"type": "haar"}])
+        with self.assertRaises(ValueError):
+            DetectorChain(self.stages, time_budget=0)
+
+    def test_plan_keeps_order_and_filters_strict(self):
+        """Test the configured order and strict mode"""
+        chain = DetectorChain(self.stages)
+        names = [stage.name for stage in chain.plan()]
+        self.assertEqual(names, ["mediapipe", "haar_1.02", "profile"])
+        self.assertEqual(
+            [stage.name for stage in chain.plan(strict=True)], ["mediapipe"]
+        )
+        self.assertEqual(chain.stats()["chain.images"], 2)
+
+    def test_adaptive_reorders_by_cost_per_hit(self):
+        """Test that a cheap stage that finds faces moves first"""
+        chain = DetectorChain(self.stages, adaptive=True)
+        costs = {"mediapipe": 0.02, "haar_1.02": 0.5, "profile": 0.001}
+        self.run_images(chain, ADAPTIVE_MIN_RUNS, costs, hit_stage="profile")
+        names = [stage.name for stage in chain.plan()]
+        self.assertEqual(names[0], "profile")
+
+    def test_adaptive_skips_stages_without_hits(self):
+        """Test that stages that never hit are skipped but still probed"""
+        chain = DetectorChain(self.stages, adaptive=True)
+        costs = {"mediapipe": 0.02, "haar_1.02": 0.5, "profile": 0.1}
+        self.run_images(chain, ADAPTIVE_SKIP_RUNS, costs)
+        plans = [
+            [stage.name for stage in chain.plan()]
+            for _ in range(ADAPTIVE_PROBE_INTERVAL)
+        ]
+        self.assertIn(["mediapipe"], plans)
+        self.assertIn(["mediapipe", "haar_1.02", "profile"], plans)
+        stats = chain.stats()
+        self.assertGreater(stats["chain.profile.skipped"], 0)
+        self.assertEqual(stats["chain.mediapipe.skipped"], 0)
+
+    def test_time_budget(self):
+        """Test that stages are skipped once they would overrun the budget"""
+        chain = DetectorChain(self.stages, time_budget=0.05)
+        haar = chain.stages[1]
+        self.assertTrue(chain.fits_budget(haar, 0.0))
+        self.assertFalse(chain.fits_budget(haar, 0.1))
+        chain.record(haar, 0.5, False)
+        self.assertFalse(chain.fits_budget(haar, 0.0))
+        self.assertEqual(chain.stats()["chain.haar_1.02.budget_skips"], 2)
+        self.assertTrue(DetectorChain(self.stages).fits_budget(haar, 0))
+
+    def test_report(self):
+        """Test the per-stage report, also for summed statistics"""
+        chain = DetectorChain(self.stages)
+        costs = {"mediapipe": 0.02, "haar_1.02": 0.5, "profile": 0.1}
+        self.run_images(chain, 4, costs, hit_stage="haar_1.02")
+        report = chain.format_report(chain.stats() + chain.stats())
+        self.assertIn("8 images", report)
+        line = next(l for l in report.splitlines() if "haar_1.02" in l)
+        self.assertIn("100.0%", line)
+        self.assertIn("500.0", line)
+
+
+class TestLoadChainConfig(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def write(self, config):
+        path = os.path.join(self.test_dir, "chain.json")
+        with open(path, "w") as f:
+            f.write(config if isinstance(config, str) else json.dumps(config))
+        return path
+
+    def test_load(self):
+        """Test stage lists and full chain objects"""
+        config = load_chain_config(self.write([{"type": "mediapipe"}]))
+        self.assertEqual(config["time_budget"], None)
+        self.assertFalse(config["adaptive"])
+
+        config = load_chain_config(
+            self.write(
+                {"stages": [{"type": "haar"}], "time_budget_ms": 50, "adaptive": True}
+            )
+        )
+        self.assertEqual(config["time_budget"], 0.05)
+        self.assertTrue(config["adaptive"])
+
+    def test_invalid_config(self):
+        """Test that invalid files raise ValueError"""
+        for config in [
+            "not json",
+            {"stages": "haar"},
+            {"stages": [{"type": "haar"}], "budget": 1},
+            [{"scale_factor": 1.1}],
+            [{"type": "haar", "scale_factor": 0.5}],
+        ]:
+            with self.assertRaises(ValueError):
+                load_chain_config(self.write(config))
+        with self.assertRaises(ValueError):
+            load_chain_config(os.path.join(self.test_dir, "missing.json"))
+
+
+if __name__ == "__main__":
+    unittest.main()
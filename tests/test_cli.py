@@ -1,10 +1,15 @@
 import unittest
 import os
+import json
+import subprocess
 import sys
+import tarfile
 import tempfile
 import shutil
+import zipfile
 import numpy as np
 import cv2
+from PIL import Image
 from unittest.mock import patch
 from src.cli import main
 
@@ -141,6 +146,268 @@ class TestCLI(unittest.TestCase):
             cm.exception.code, 0
         )  # Should succeed because at least one image processed
 
+    @patch("sys.argv")
+    def test_directory_parallel_processing(self, mock_argv):
+        """Test processing a directory with a worker pool"""
+        input_dir = os.path.join(self.test_dir, "parallel")
+        os.makedirs(input_dir)
+        for i in range(3):
+            shutil.copy2(self.fixture_image, os.path.join(input_dir, f"img{i}.jpg"))
+        with open(os.path.join(input_dir, "invalid.jpg"), "w") as f:
+            f.write("not an image")
+
+        sys.argv = [
+            "face_crop.py",
+            input_dir,
+            "--output",
+            self.output_dir,
+            "--jobs",
+            "2",
+            "--chunk-size",
+            "1",
+        ]
+        with self.assertRaises(SystemExit) as cm:
+            main()
+        self.assertEqual(cm.exception.code, 0)
+        self.assertEqual(
+            sorted(os.listdir(self.output_dir)),
+            [f"img{i}_cropped.png" for i in range(3)],
+        )
+
+    @patch("sys.argv")
+    def test_recursive_directory_processing(self, mock_argv):
+        """Test that a recursive run mirrors the input tree"""
+        nested = os.path.join(self.test_dir, "2023", "01")
+        os.makedirs(nested)
+        shutil.copy2(self.fixture_image, os.path.join(nested, "nested.jpg"))
+        shutil.copy2(self.fixture_image, os.path.join(nested, "skipped.jpg"))
+
+        sys.argv = ["face_crop.py", self.test_dir, "--output", self.output_dir]
+        sys.argv += ["--recursive", "--exclude", "skipped.*"]
+        with patch("builtins.print") as mock_print:
+            with self.assertRaises(SystemExit) as cm:
+                main()
+        self.assertEqual(cm.exception.code, 0)
+        mock_print.assert_any_call("Successfully processed 2 out of 2 images")
+        self.assertTrue(
+            os.path.exists(os.path.join(self.output_dir, "Mona_Lisa_cropped.png"))
+        )
+        self.assertTrue(
+            os.path.exists(
+                os.path.join(self.output_dir, "2023", "01", "nested_cropped.png")
+            )
+        )
+
+    @patch("sys.argv")
+    def test_multi_face_directory_processing(self, mock_argv):
+        """Test that multi-face mode writes one crop per face"""
+        input_dir = os.path.join(self.test_dir, "group")
+        os.makedirs(input_dir)
+        img = cv2.imread(self.fixture_image)
+        cv2.imwrite(os.path.join(input_dir, "pair.jpg"), cv2.hconcat([img, img]))
+
+        for jobs in ["1", "2"]:
+            shutil.rmtree(self.output_dir, ignore_errors=True)
+            sys.argv = ["face_crop.py", input_dir, "--output", self.output_dir]
+            sys.argv += ["--multi-face", "--strict", "--jobs", jobs]
+            with self.assertRaises(SystemExit) as cm:
+                main()
+            self.assertEqual(cm.exception.code, 0)
+            self.assertEqual(
+                sorted(os.listdir(self.output_dir)),
+                ["pair_cropped_1.png", "pair_cropped_2.png"],
+            )
+
+    @patch("sys.argv")
+    def test_directory_variants(self, mock_argv):
+        """Test writing output variants from the pipeline and the worker pool"""
+        for jobs in ["1", "2"]:
+            shutil.rmtree(self.output_dir, ignore_errors=True)
+            sys.argv = ["face_crop.py", self.test_dir, "--output", self.output_dir]
+            sys.argv += ["--variant", "64/128", "--circular", "--jobs", jobs]
+            sys.argv += ["--name-template", "{stem}-{size}{ext}"]
+            with self.assertRaises(SystemExit) as cm:
+                main()
+            self.assertEqual(cm.exception.code, 0)
+            self.assertEqual(
+                sorted(os.listdir(self.output_dir)),
+                ["Mona_Lisa_cropped-128.png", "Mona_Lisa_cropped-64.png"],
+            )
+
+    @patch("sys.argv")
+    def test_large_image_mode(self, mock_argv):
+        """Test that region reads give the same crop as a full decode"""
+        input_dir = os.path.join(self.test_dir, "scans")
+        os.makedirs(input_dir)
+        # Uncompressed, so crops are read straight from the file
+        Image.open(self.fixture_image).save(os.path.join(input_dir, "scan.tif"))
+
+        outputs = []
+        for large_image in ["0", "0.1"]:
+            output_dir = os.path.join(self.test_dir, f"output_{large_image}")
+            sys.argv = ["face_crop.py", input_dir, "--output", output_dir]
+            sys.argv += ["--large-image", large_image]
+            with self.assertRaises(SystemExit) as cm:
+                main()
+            self.assertEqual(cm.exception.code, 0)
+            with open(os.path.join(output_dir, "scan_cropped.png"), "rb") as f:
+                outputs.append(f.read())
+        self.assertEqual(outputs[0], outputs[1])
+
+    @patch("sys.argv")
+    @patch("builtins.print")
+    def test_detector_chain_config(self, mock_print, mock_argv):
+        """Test a configured detector chain and its statistics report"""
+        chain_path = os.path.join(self.test_dir, "chain.json")
+        with open(chain_path, "w") as f:
+            json.dump({"stages": [{"type": "mediapipe", "model_selection": 0}]}, f)
+        sys.argv = ["face_crop.py", self.test_dir, "--output", self.output_dir]
+        sys.argv += ["--detector-chain", chain_path, "--time-budget", "500"]
+        sys.argv += ["--adaptive-chain", "--detector-stats"]
+        with self.assertRaises(SystemExit) as cm:
+            main()
+        self.assertEqual(cm.exception.code, 0)
+        printed = "\n".join(str(c.args[0]) for c in mock_print.call_args_list if c.args)
+        self.assertIn("Detector chain: 1 images", printed)
+        self.assertIn("mediapipe", printed)
+
+        with open(chain_path, "w") as f:
+            json.dump([{"type": "haar", "scale_factor": 0.9}], f)
+        with self.assertRaises(SystemExit) as cm:
+            main()
+        self.assertEqual(cm.exception.code, 2)
+
+    @patch("sys.argv")
+    def test_archive_input_and_output(self, mock_argv):
+        """Test reading a tar.gz bundle and writing the crops into a zip"""
+        bundle = os.path.join(self.test_dir, "bundle.tar.gz")
+        with tarfile.open(bundle, "w:gz") as archive:
+            archive.add(self.test_image, "photos/Mona_Lisa.jpg")
+        output = os.path.join(self.test_dir, "crops.zip")
+        sys.argv = ["face_crop.py", bundle, "--output", output, "--recursive"]
+        with self.assertRaises(SystemExit) as cm:
+            main()
+        self.assertEqual(cm.exception.code, 0)
+        with zipfile.ZipFile(output) as archive:
+            self.assertEqual(archive.namelist(), ["photos/Mona_Lisa_cropped.png"])
+
+        for extra in [["--jobs", "2"], ["--incremental"]]:
+            sys.argv = ["face_crop.py", bundle, "--output", output] + extra
+            with self.assertRaises(SystemExit) as cm:
+                main()
+            self.assertEqual(cm.exception.code, 2)
+
+    @patch("sys.argv")
+    def test_frame_sequence_processing(self, mock_argv):
+        """Test cropping a directory of frames with --sequence"""
+        input_dir = os.path.join(self.test_dir, "frames")
+        os.makedirs(input_dir)
+        for i in range(3):
+            shutil.copy2(self.fixture_image, os.path.join(input_dir, f"f{i}.jpg"))
+
+        sys.argv = ["face_crop.py", input_dir, "--output", self.output_dir]
+        sys.argv += ["--sequence", "--keyframe-interval", "2"]
+        with patch("builtins.print") as mock_print:
+            with self.assertRaises(SystemExit) as cm:
+                main()
+        self.assertEqual(cm.exception.code, 0)
+        self.assertEqual(len(os.listdir(self.output_dir)), 3)
+        mock_print.assert_any_call(f"Wrote 3 cropped frames to {self.output_dir}")
+
+    @patch("sys.argv")
+    def test_directory_parallel_all_invalid(self, mock_argv):
+        """Test that a worker pool keeps the failure exit code"""
+        input_dir = os.path.join(self.test_dir, "invalid_parallel")
+        os.makedirs(input_dir)
+        with open(os.path.join(input_dir, "invalid.jpg"), "w") as f:
+            f.write("not an image")
+
+        sys.argv = ["face_crop.py", input_dir, "--output", self.output_dir]
+        sys.argv += ["--jobs", "2"]
+        with self.assertRaises(SystemExit) as cm:
+            main()
+        self.assertEqual(cm.exception.code, 1)
+
+    @patch("sys.argv")
+    def test_directory_with_detection_cache(self, mock_argv):
+        """Test that a second run is served from the detection cache"""
+        cache_path = os.path.join(self.test_dir, "cache.sqlite")
+        sys.argv = ["face_crop.py", self.test_dir, "--output", self.output_dir]
+        sys.argv += ["--cache", cache_path]
+        for expected in ["0 hits, 1 misses", "1 hits, 0 misses"]:
+            with patch("builtins.print") as mock_print:
+                with self.assertRaises(SystemExit) as cm:
+                    main()
+            self.assertEqual(cm.exception.code, 0)
+            mock_print.assert_any_call(f"Detection cache: {expected}")
+
+    @patch("sys.argv")
+    def test_incremental_directory_processing(self, mock_argv):
+        """Test that incremental runs skip up-to-date images unless forced"""
+        sys.argv = ["face_crop.py", self.test_dir, "--output", self.output_dir]
+        sys.argv += ["--incremental"]
+        with self.assertRaises(SystemExit) as cm:
+            main()
+        self.assertEqual(cm.exception.code, 0)
+        self.assertTrue(
+            os.path.exists(os.path.join(self.output_dir, ".facecrop-manifest.jsonl"))
+        )
+
+        # Tasks are discovered lazily, so the stub drains them to see what
+        # would have been processed
+        submitted = []
+
+        def fake_run_tasks(tasks, args, stats):
+            submitted.extend(tasks)
+            return iter([])
+
+        with patch("src.cli.run_tasks", side_effect=fake_run_tasks):
+            with self.assertRaises(SystemExit) as cm:
+                main()
+        self.assertEqual(cm.exception.code, 0)
+        self.assertEqual(submitted, [])
+
+        sys.argv += ["--force"]
+        with patch("src.cli.run_tasks", side_effect=fake_run_tasks):
+            with self.assertRaises(SystemExit):
+                main()
+        self.assertEqual(len(submitted), 1)
+
+    @patch("sys.argv")
+    def test_profile_report(self, mock_argv):
+        """Test writing a per-stage profile"""
+        profile_path = os.path.join(self.test_dir, "profile.json")
+        sys.argv = ["face_crop.py", self.test_dir, "--output", self.output_dir]
+        sys.argv += ["--profile", profile_path]
+        with self.assertRaises(SystemExit) as cm:
+            main()
+        self.assertEqual(cm.exception.code, 0)
+
+        with open(profile_path) as f:
+            report = json.load(f)
+        self.assertEqual(report["stages"]["pipeline.latency"]["count"], 1)
+        self.assertIn("p99_ms", report["stages"]["detect.mediapipe"])
+        self.assertEqual(report["counters"]["detected_by.mediapipe"], 1)
+
+    def test_help_does_not_load_detection_modules(self):
+        """Test that --help returns without importing OpenCV or MediaPipe"""
+        code = (
+            "import sys\n"
+            "from src.cli import main\n"
+            "sys.argv = ['face_crop.py', '--help']\n"
+            "try:\n"
+            "    main()\n"
+            "except SystemExit:\n"
+            "    pass\n"
+            "import src\n"
+            "print('loaded', 'cv2' in sys.modules, 'mediapipe' in sys.modules)\n"
+        )
+        result = subprocess.run(
+            [sys.executable, "-c", code], capture_output=True, text=True, check=True
+        )
+        self.assertIn("usage:", result.stdout)
+        self.assertIn("loaded False False", result.stdout)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,81 @@
+import unittest
+import io
+import os
+import cv2
+from PIL import Image
+from src.decode import (
+    EXIF_ORIENTATION,
+    decode,
+    decode_for_detection,
+    read_image_info,
+    reduced_decode_flag,
+)
+
+
+def rotated_jpeg(path):
+    """JPEG bytes of path stored sideways with EXIF orientation 6 (upright when decoded)"""
+    with Image.open(path) as img:
+        rotated = img.transpose(Image.Transpose.ROTATE_90)
+    exif = Image.Exif()
+    exif[EXIF_ORIENTATION] = 6
+    buffer = io.BytesIO()
+    rotated.save(buffer, "JPEG", exif=exif, quality=95)
+    return buffer.getvalue()
+
+
+class TestDecode(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.jpeg_path = os.path.join(
+            "tests", "fixtures", "images", "pexels-sample-3.jpg"
+        )
+        cls.png_path = os.path.join(
+            "tests", "fixtures", "expected", "Mona_Lisa_cropped.png"
+        )
+        with open(cls.jpeg_path, "rb") as f:
+            cls.jpeg_bytes = f.read()
+
+    def test_decode_path_and_bytes(self):
+        """Test decoding from a path and from bytes gives the same image"""
+        from_path = decode(self.jpeg_path)
+        from_bytes = decode(self.jpeg_bytes)
+        self.assertEqual(from_path.shape, (1536, 1024, 3))
+        self.assertTrue((from_path == from_bytes).all())
+        self.assertIsNone(decode(b"not an image"))
+
+    def test_read_image_info(self):
+        """Test reading format and size from the header"""
+        self.assertEqual(read_image_info(self.jpeg_path), ("JPEG", (1024, 1536)))
+        self.assertEqual(read_image_info(self.jpeg_bytes), ("JPEG", (1024, 1536)))
+        self.assertEqual(read_image_info(self.png_path)[0], "PNG")
+        self.assertIsNone(read_image_info(b"not an image"))
+
+    def test_read_image_info_exif_orientation(self):
+        """Test that the size matches decode() for a rotated JPEG"""
+        data = rotated_jpeg(self.jpeg_path)
+        width, height = read_image_info(data)[1]
+        self.assertEqual(decode(data).shape[:2], (height, width))
+
+    def test_reduced_decode_flag(self):
+        """Test picking the largest reduction that stays above the target"""
+        self.assertEqual(
+            reduced_decode_flag((6000, 4000), 640), cv2.IMREAD_REDUCED_COLOR_8
+        )
+        self.assertEqual(
+            reduced_decode_flag((3000, 2000), 640), cv2.IMREAD_REDUCED_COLOR_4
+        )
+        self.assertEqual(
+            reduced_decode_flag((1536, 1024), 640), cv2.IMREAD_REDUCED_COLOR_2
+        )
+        self.assertIsNone(reduced_decode_flag((1024, 683), 640))
+
+    def test_decode_for_detection(self):
+        """Test reduced decode of a JPEG and fallback for other formats"""
+        small = decode_for_detection(self.jpeg_path, 300)
+        self.assertEqual(small.shape, (384, 256, 3))
+        self.assertIsNone(decode_for_detection(self.jpeg_path, 2048))
+        self.assertIsNone(decode_for_detection(self.png_path, 100))
+
+
+if __name__ == "__main__":
+    unittest.main()
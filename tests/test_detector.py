@@ -2,7 +2,10 @@ import unittest
 import cv2
 import numpy as np
 import os
-from src.detector import FaceDetector
+import threading
+from unittest.mock import patch
+from benchmarks.common import bbox_iou
+from src.detector import FaceDetector, scale_bbox, suppress_overlaps
 
 
 class TestFaceDetector(unittest.TestCase):
@@ -37,6 +40,14 @@ class TestFaceDetector(unittest.TestCase):
         self.assertIsNotNone(self.detector.haar_cascade)
         self.assertIsNotNone(self.detector.profile_cascade)
 
+    def test_cascades_loaded_on_first_use(self):
+        """Test that strict mode never loads the Haar cascades"""
+        with FaceDetector() as detector:
+            detector.detect_face(self.cat_img, strict=True)
+            self.assertEqual(detector._cascades, {})
+            self.assertIs(detector.haar_cascade, detector.haar_cascade)
+            self.assertEqual(len(detector._cascades), 1)
+
     def test_detect_face_empty_image(self):
         """Test detection on empty image"""
         empty_img = np.zeros((100, 100, 3), dtype=np.uint8)
@@ -94,6 +105,207 @@ class TestFaceDetector(unittest.TestCase):
         # Should not detect cat face as human face in strict mode
         self.assertIsNone(result)
 
+    def test_session_reused_across_calls(self):
+        """Test that repeated detections share one MediaPipe session"""
+        detector = FaceDetector()
+        try:
+            detector.detect_face(self.mona_lisa_img, strict=True)
+            session = detector.open()
+            detector.detect_face(self.mona_lisa_img, strict=True)
+            self.assertIs(detector.open(), session)
+            self.assertEqual(detector.session_count, 1)
+        finally:
+            detector.close()
+
+    def test_sessions_per_setting_and_thread(self):
+        """Test that sessions are kept per setting and per thread"""
+        detector = FaceDetector()
+        try:
+            main_session = detector.open()
+            self.assertIsNot(detector.open(model_selection=0), main_session)
+
+            other = []
+            thread = threading.Thread(target=lambda: other.append(detector.open()))
+            thread.start()
+            thread.join()
+            self.assertIsNot(other[0], main_session)
+            self.assertEqual(detector.session_count, 3)
+        finally:
+            detector.close()
+
+    def test_close_releases_sessions(self):
+        """Test that close releases sessions and detection still works afterwards"""
+        with FaceDetector() as detector:
+            session = detector.open()
+            self.assertEqual(detector.session_count, 1)
+        self.assertEqual(detector.session_count, 0)
+
+        try:
+            self.assertIsNotNone(detector.detect_face(self.mona_lisa_img, strict=True))
+            self.assertIsNot(detector.open(), session)
+        finally:
+            detector.close()
+
+    def test_close_thread_releases_own_sessions(self):
+        """Test that close_thread only releases the calling thread's sessions"""
+        with FaceDetector() as detector:
+            session = detector.open()
+            worker = threading.Thread(
+                target=lambda: (detector.open(), detector.close_thread())
+            )
+            worker.start()
+            worker.join()
+            self.assertEqual(detector.session_count, 1)
+            self.assertIs(detector.open(), session)
+            detector.close_thread()
+            self.assertEqual(detector.session_count, 0)
+
+    def test_scale_bbox(self):
+        """Test mapping a bbox from a proxy image back to the original"""
+        self.assertEqual(
+            scale_bbox((10, 20, 30, 40), (100, 200), (400, 800)), (40, 80, 120, 160)
+        )
+        # Clipped to the target image
+        self.assertEqual(
+            scale_bbox((90, 90, 20, 20), (100, 100), (100, 100))[2:], (10, 10)
+        )
+
+    def test_custom_chain(self):
+        """Test stage order, statistics, settings and the time budget"""
+        stages = [{"type": "haar", "scale_factor": 1.05}, {"type": "mediapipe"}]
+        with FaceDetector(stages=stages) as detector:
+            self.assertIsNotNone(detector.detect_face(self.mona_lisa_img))
+            stats = detector.chain.stats()
+            self.assertEqual(stats["chain.haar_1.05.hits"], 1)
+            self.assertEqual(stats["chain.mediapipe.runs"], 0)
+            self.assertIn("chain", detector.settings())
+        self.assertNotIn("chain", self.detector.settings())
+
+        # The first stage always runs; later ones are skipped once the
+        # budget is used up
+        with FaceDetector(
+            stages=[{"type": "mediapipe"}, {"type": "haar"}], time_budget=1e-9
+        ) as detector:
+            self.assertIsNone(detector.detect_face(self.cat_img))
+            stats = detector.chain.stats()
+            self.assertEqual(stats["chain.mediapipe.runs"], 1)
+            self.assertEqual(stats["chain.haar_1.05.runs"], 0)
+            self.assertEqual(stats["chain.haar_1.05.budget_skips"], 1)
+            self.assertEqual(
+                detector.run_chain([self.cat_img, self.mona_lisa_img])[0],
+                (None, False),
+            )
+        self.assertEqual(self.detector.run_chain([self.cat_img])[0][1], True)
+
+    def test_detection_size_downscales_only_large_images(self):
+        """Test that the proxy is bounded and small images are left alone"""
+        detector = FaceDetector(detection_size=200)
+        proxy = detector.downscale(self.mona_lisa_img)
+        self.assertEqual(max(proxy.shape[:2]), 200)
+        self.assertIs(
+            FaceDetector(detection_size=1024).downscale(self.mona_lisa_img),
+            self.mona_lisa_img,
+        )
+
+    def test_detection_size_matches_full_resolution(self):
+        """Test that proxy detection frames the face like full-resolution detection"""
+        fixtures = [
+            "Mona_Lisa.jpg",
+            "pexels-sample-1.jpg",
+            "pexels-sample-2.jpg",
+            "pexels-sample-3.jpg",
+        ]
+        proxy_detector = FaceDetector(detection_size=640)
+        try:
+            for name in fixtures:
+                img = cv2.imread(os.path.join("tests", "fixtures", "images", name))
+                # Upscale to emulate a large camera original
+                img = cv2.resize(img, None, fx=3, fy=3, interpolation=cv2.INTER_CUBIC)
+                full = self.detector.detect_face(img, strict=True)
+                proxy = proxy_detector.detect_face(img, strict=True)
+                self.assertIsNotNone(full, name)
+                self.assertIsNotNone(proxy, name)
+                self.assertGreater(bbox_iou(full, proxy), 0.9, name)
+        finally:
+            proxy_detector.close()
+
+    def test_detect_faces_batch_matches_single(self):
+        """Test that batch detection returns the single-image results in order"""
+        empty_img = np.zeros((100, 100, 3), dtype=np.uint8)
+        images = [self.mona_lisa_img, self.cat_img, empty_img, self.mona_lisa_img]
+        for strict in [False, True]:
+            expected = [self.detector.detect_face(img, strict=strict) for img in images]
+            self.assertEqual(
+                self.detector.detect_faces(images, strict=strict), expected
+            )
+            # Iterators are accepted too
+            self.assertEqual(
+                self.detector.detect_faces(iter(images), strict=strict), expected
+            )
+
+    def test_detect_faces_groups_fallbacks(self):
+        """Test that the fallback stages only run on MediaPipe misses, as a group"""
+        empty_img = np.zeros((100, 100, 3), dtype=np.uint8)
+        calls = []
+        run_stage = self.detector._run_stage
+
+        def record(stage, source):
+            calls.append(stage.name)
+            return run_stage(stage, source)
+
+        with patch.object(self.detector, "_run_stage", record):
+            self.detector.detect_faces([empty_img, self.mona_lisa_img, empty_img])
+        names = [stage.name for stage in self.detector.chain.stages]
+        self.assertEqual(
+            calls, [names[0]] * 3 + [name for name in names[1:] for _ in range(2)]
+        )
+
+    def test_detect_faces_empty_batch(self):
+        """Test batch detection on no images"""
+        self.assertEqual(self.detector.detect_faces([]), [])
+
+    def test_detect_all_faces_group(self):
+        """Test that every face in a group image is returned, left to right"""
+        names = ["pexels-sample-1.jpg", "pexels-sample-2.jpg", "pexels-sample-3.jpg"]
+        images = [
+            cv2.resize(
+                cv2.imread(os.path.join("tests", "fixtures", "images", name)),
+                (600, 800),
+            )
+            for name in names
+        ]
+        group = cv2.hconcat(images)
+        for strict in [True, False]:
+            faces = self.detector.detect_all_faces(group, strict=strict)
+            self.assertEqual(len(faces), 3)
+            for index, (x, y, w, h) in enumerate(faces):
+                # Each face lies within its own tile
+                self.assertGreaterEqual(x, index * 600)
+                self.assertLessEqual(x + w, (index + 1) * 600)
+
+    def test_detect_all_faces_single(self):
+        """Test that a portrait yields its one face and an empty image none"""
+        for strict in [True, False]:
+            self.assertEqual(
+                self.detector.detect_all_faces(self.mona_lisa_img, strict=strict),
+                [self.detector.detect_face(self.mona_lisa_img, strict=strict)],
+            )
+        empty_img = np.zeros((100, 100, 3), dtype=np.uint8)
+        self.assertEqual(self.detector.detect_all_faces(empty_img), [])
+
+    def test_suppress_overlaps(self):
+        """Test that overlapping lower-priority boxes are dropped"""
+        boxes = [
+            (0, 0, 100, 100),
+            (10, 10, 50, 50),  # inside the first box
+            (90, 90, 100, 100),  # small overlap
+            (300, 0, 50, 50),
+        ]
+        self.assertEqual(
+            suppress_overlaps(boxes, 0.3),
+            [(0, 0, 100, 100), (90, 90, 100, 100), (300, 0, 50, 50)],
+        )
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,88 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from src.discovery import InputScanner, output_path_for, parse_size
+
+
+class TestDiscovery(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.files = {
+            "a.jpg": 10,
+            "b.PNG": 2000,
+            "notes.txt": 10,
+            "2023/01/c.jpg": 500,
+            "2023/01/d.webp": 10,
+            "2023/raw/e.jpg": 10,
+            "output/a_cropped.png": 10,
+        }
+        for relpath, size in self.files.items():
+            path = os.path.join(self.test_dir, *relpath.split("/"))
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "wb") as f:
+                f.write(b"x" * size)
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def scan(self, **kwargs):
+        kwargs.setdefault("skip_dirs", [os.path.join(self.test_dir, "output")])
+        scanner = InputScanner(self.test_dir, **kwargs)
+        return scanner, sorted(relpath for relpath, _ in scanner.scan())
+
+    def test_top_level_only_by_default(self):
+        """Test that only images directly in the directory are listed"""
+        scanner, found = self.scan()
+        self.assertEqual(found, ["a.jpg", "b.PNG"])
+        self.assertTrue(scanner.done)
+        self.assertEqual(scanner.matched, 2)
+
+    def test_recursive_skips_output(self):
+        """Test recursive traversal, leaving out the output directory"""
+        _, found = self.scan(recursive=True)
+        self.assertEqual(
+            found,
+            ["2023/01/c.jpg", "2023/01/d.webp", "2023/raw/e.jpg", "a.jpg", "b.PNG"],
+        )
+
+    def test_scan_is_lazy(self):
+        """Test that entries are yielded before the scan completes"""
+        scanner = InputScanner(self.test_dir, recursive=True)
+        entries = scanner.scan()
+        next(entries)
+        self.assertFalse(scanner.done)
+        self.assertGreater(scanner.scanned, 0)
+
+    def test_include_exclude(self):
+        """Test glob filters on names and relative paths"""
+        _, found = self.scan(recursive=True, include=["*.jpg"], exclude=["raw"])
+        self.assertEqual(found, ["2023/01/c.jpg", "a.jpg"])
+        _, found = self.scan(recursive=True, include=["2023/*"])
+        self.assertEqual(found, ["2023/01/c.jpg", "2023/01/d.webp", "2023/raw/e.jpg"])
+
+    def test_size_filters(self):
+        """Test minimum and maximum file size filters"""
+        _, found = self.scan(recursive=True, min_size=100, max_size=1000)
+        self.assertEqual(found, ["2023/01/c.jpg"])
+
+    def test_parse_size(self):
+        """Test size strings with units"""
+        self.assertEqual(parse_size("500"), 500)
+        self.assertEqual(parse_size("2K"), 2048)
+        self.assertEqual(parse_size("1.5mb"), 1572864)
+        for value in ["", "abc", "-1K"]:
+            with self.assertRaises(ValueError):
+                parse_size(value)
+
+    def test_output_path_mirrors_tree(self):
+        """Test that outputs mirror the input subdirectories"""
+        output_dir = os.path.join(self.test_dir, "mirror")
+        path = output_path_for("2023/01/c.jpg", output_dir, ".png", set())
+        self.assertEqual(path, os.path.join(output_dir, "2023", "01", "c_cropped.png"))
+        self.assertTrue(os.path.isdir(os.path.dirname(path)))
+
+
+if __name__ == "__main__":
+    unittest.main()
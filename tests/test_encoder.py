@@ -0,0 +1,74 @@
+import unittest
+import io
+import numpy as np
+import cv2
+from PIL import Image
+from src.encoder import Encoder
+
+
+class TestEncoder(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        rng = np.random.default_rng(0)
+        cls.rgba = rng.integers(0, 256, (64, 48, 4), dtype=np.uint8)
+        cls.bgra = cv2.cvtColor(cls.rgba, cv2.COLOR_RGBA2BGRA)
+
+    def decode(self, data):
+        return np.array(Image.open(io.BytesIO(data)).convert("RGBA"))
+
+    def test_default_matches_pil_png(self):
+        """Test that the default encoder writes the original PIL PNG bytes"""
+        expected = io.BytesIO()
+        Image.fromarray(self.rgba, "RGBA").save(expected, "PNG")
+        self.assertEqual(Encoder().encode(self.rgba), expected.getvalue())
+        self.assertEqual(Encoder.from_preset("png").settings(), Encoder().settings())
+
+    def test_presets_are_lossless(self):
+        """Test that every preset and backend round-trips the visible pixels"""
+        for preset in Encoder.PRESETS:
+            for backend in Encoder.BACKENDS:
+                encoder = Encoder.from_preset(preset, backend=backend)
+                buffer = self.bgra if encoder.channel_order == "BGRA" else self.rgba
+                decoded = self.decode(encoder.encode(buffer))
+                # WebP drops the color of fully transparent pixels
+                visible = self.rgba[..., 3] > 0
+                self.assertTrue(
+                    (decoded[visible] == self.rgba[visible]).all(), (preset, backend)
+                )
+
+    def test_extension_and_channel_order(self):
+        """Test the output extension and buffer order per format and backend"""
+        self.assertEqual(Encoder().extension, ".png")
+        self.assertEqual(Encoder.from_preset("webp-lossless").extension, ".webp")
+        self.assertEqual(Encoder().channel_order, "RGBA")
+        self.assertEqual(Encoder(backend="opencv").channel_order, "BGRA")
+
+    def test_compression_level(self):
+        """Test that a higher compression level gives a smaller file"""
+        smooth = np.zeros((256, 256, 4), dtype=np.uint8)
+        smooth[..., 0] = np.arange(256, dtype=np.uint8)
+        smooth[..., 3] = 255
+        sizes = [len(Encoder(compression=level).encode(smooth)) for level in (0, 9)]
+        self.assertGreater(sizes[0], sizes[1])
+
+    def test_invalid_options(self):
+        """Test that unsupported options are rejected"""
+        with self.assertRaises(ValueError):
+            Encoder(format="gif")
+        with self.assertRaises(ValueError):
+            Encoder(backend="imageio")
+        with self.assertRaises(ValueError):
+            Encoder(format="webp", compression=9)
+        with self.assertRaises(ValueError):
+            Encoder.from_preset("jpeg")
+        with self.assertRaises(ValueError):
+            Encoder(format="webp", backend="opencv", compression=0)
+        with self.assertRaises(ValueError):
+            Encoder.from_preset("webp-lossless", backend="opencv", compression=6)
+        self.assertIsNone(
+            Encoder.from_preset("webp-lossless", backend="opencv").compression
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
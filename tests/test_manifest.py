@@ -0,0 +1,97 @@
+import unittest
+import os
+import tempfile
+import shutil
+from src.manifest import RunManifest, settings_fingerprint
+
+
+class TestRunManifest(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.manifest_path = os.path.join(self.test_dir, "manifest.jsonl")
+        self.input_path = os.path.join(self.test_dir, "input.jpg")
+        self.output_path = os.path.join(self.test_dir, "input_cropped.png")
+        with open(self.input_path, "wb") as f:
+            f.write(b"input")
+        with open(self.output_path, "wb") as f:
+            f.write(b"output")
+        self.fingerprint = settings_fingerprint({"circular": False})
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def record(self, success=True):
+        with RunManifest(self.manifest_path) as manifest:
+            manifest.record(
+                "input.jpg",
+                self.input_path,
+                self.output_path,
+                success,
+                self.fingerprint,
+            )
+
+    def is_up_to_date(self, fingerprint=None):
+        with RunManifest(self.manifest_path) as manifest:
+            return manifest.is_up_to_date(
+                "input.jpg",
+                self.input_path,
+                self.output_path,
+                fingerprint or self.fingerprint,
+            )
+
+    def test_settings_fingerprint(self):
+        """Test that fingerprints are stable and settings-dependent"""
+        self.assertEqual(
+            settings_fingerprint({"a": 1, "b": 2}),
+            settings_fingerprint({"b": 2, "a": 1}),
+        )
+        self.assertNotEqual(self.fingerprint, settings_fingerprint({"circular": True}))
+
+    def test_up_to_date_after_success(self):
+        """Test that a recorded success is up to date"""
+        self.assertFalse(self.is_up_to_date())
+        self.record()
+        self.assertTrue(self.is_up_to_date())
+
+    def test_not_up_to_date(self):
+        """Test failures, changed settings, changed inputs and missing outputs"""
+        self.record(success=False)
+        self.assertFalse(self.is_up_to_date())
+
+        self.record()
+        self.assertFalse(self.is_up_to_date(settings_fingerprint({"circular": True})))
+
+        with open(self.input_path, "wb") as f:
+            f.write(b"changed input")
+        self.assertFalse(self.is_up_to_date())
+
+        self.record()
+        os.remove(self.output_path)
+        self.assertFalse(self.is_up_to_date())
+
+    def test_latest_entry_wins_and_truncated_line_ignored(self):
+        """Test reading an appended manifest with a partial last line"""
+        self.record(success=False)
+        self.record()
+        with open(self.manifest_path, "a") as f:
+            f.write('{"input": "partial')
+        self.assertTrue(self.is_up_to_date())
+
+        with open(self.manifest_path) as f:
+            self.assertEqual(len(f.readlines()), 3)
+
+    def test_record_after_truncated_line(self):
+        """Test that a record appended after a crash is not lost"""
+        self.record()
+        with open(self.manifest_path, "a") as f:
+            f.write('{"input": "partial')
+        with RunManifest(self.manifest_path) as manifest:
+            manifest.record(
+                "other.jpg", self.input_path, self.output_path, True, self.fingerprint
+            )
+        with RunManifest(self.manifest_path) as manifest:
+            self.assertEqual(sorted(manifest.entries), ["input.jpg", "other.jpg"])
+
+
+if __name__ == "__main__":
+    unittest.main()
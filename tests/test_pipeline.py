@@ -0,0 +1,109 @@
+import unittest
+import os
+import tempfile
+import shutil
+from src.pipeline import Pipeline
+from src.processor import ImageProcessor
+
+
+class TestPipeline(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.processor = ImageProcessor()
+        cls.mona_lisa_image = os.path.join(
+            "tests", "fixtures", "images", "Mona_Lisa.jpg"
+        )
+        cls.cat_image = os.path.join("tests", "fixtures", "images", "cat.jpg")
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.processor.close()
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def output(self, name):
+        return os.path.join(self.test_dir, name)
+
+    def test_results_match_process_image(self):
+        """Test that pipeline output is identical to process_image"""
+        pipeline = Pipeline(self.processor, circular_mask=True)
+        results = list(
+            pipeline.run([("mona", self.mona_lisa_image, self.output("pipe.png"))])
+        )
+        self.assertEqual(results, [("mona", True)])
+
+        self.processor.process_image(
+            self.mona_lisa_image, self.output("direct.png"), circular_mask=True
+        )
+        with open(self.output("pipe.png"), "rb") as a, open(
+            self.output("direct.png"), "rb"
+        ) as b:
+            self.assertEqual(a.read(), b.read())
+
+    def test_failures(self):
+        """Test unreadable, undecodable and no-face inputs"""
+        invalid = self.output("invalid.jpg")
+        with open(invalid, "w") as f:
+            f.write("not an image")
+        tasks = [
+            ("missing", self.output("missing.jpg"), self.output("a.png")),
+            ("invalid", invalid, self.output("b.png")),
+            ("mona", self.mona_lisa_image, self.output("c.png")),
+        ]
+        results = dict(Pipeline(self.processor).run(tasks))
+        self.assertEqual(results, {"missing": False, "invalid": False, "mona": True})
+        self.assertEqual(os.listdir(self.test_dir), sorted(["invalid.jpg", "c.png"]))
+
+        strict = Pipeline(self.processor, strict=True)
+        cat = [("cat", self.cat_image, self.output("cat.png"))]
+        self.assertEqual(list(strict.run(cat)), [("cat", False)])
+
+    def test_backpressure(self):
+        """Test that a lazy task source is only consumed as far as the queues allow"""
+        pulled = []
+
+        def tasks():
+            for i in range(30):
+                pulled.append(i)
+                yield str(i), self.mona_lisa_image, self.output(f"{i}.png")
+
+        pipeline = Pipeline(self.processor, readers=1, encoders=1, queue_size=1)
+        results = pipeline.run(tasks())
+        next(results)
+        # Four queues of one, one job per worker and one held by the feeder
+        self.assertLessEqual(len(pulled), 8)
+        self.assertEqual(len(list(results)), 29)
+
+        report = pipeline.report()
+        self.assertEqual(report["stages"]["detect"]["items"], 30)
+        self.assertLessEqual(report["stages"]["read"]["max_queue_depth"], 1)
+
+    def test_repeated_runs_release_sessions(self):
+        """Test that each run's detect thread releases its MediaPipe sessions"""
+        # Multi-face detection bypasses the detection cache, so every run detects
+        pipeline = Pipeline(self.processor, multi_face=True)
+        for i in range(5):
+            task = (str(i), self.mona_lisa_image, self.output(f"{i}.png"))
+            self.assertEqual(len(list(pipeline.run([task]))), 1)
+            self.assertLessEqual(self.processor.detector.session_count, 1)
+
+    def test_task_source_error(self):
+        """Test that an error from the task source is raised after earlier tasks finish"""
+
+        def tasks():
+            yield "mona", self.mona_lisa_image, self.output("mona.png")
+            raise OSError("truncated archive")
+
+        results = []
+        with self.assertRaises(OSError):
+            for result in Pipeline(self.processor).run(tasks()):
+                results.append(result)
+        self.assertEqual(results, [("mona", True)])
+
+
+if __name__ == "__main__":
+    unittest.main()
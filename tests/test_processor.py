@@ -3,7 +3,10 @@ import os
 import cv2
 import numpy as np
 from PIL import Image
-from src.processor import ImageProcessor
+from src.encoder import Encoder
+from src.processor import ImageProcessor, face_output_path
+from src.variants import parse_variants
+from unittest.mock import patch
 import tempfile
 import shutil
 
@@ -105,6 +108,177 @@ class TestImageProcessor(unittest.TestCase):
         self.assertFalse(result)
         self.assertFalse(os.path.exists(self.output_path))
 
+    def test_process_array(self):
+        """Test processing a decoded image without touching the filesystem"""
+        img = cv2.imread(self.mona_lisa_path)
+        rgba = self.processor.process_array(img, circular_mask=True)
+        self.assertIsNotNone(rgba)
+        self.assertEqual(rgba.ndim, 3)
+        self.assertEqual(rgba.shape[2], 4)
+        self.assertEqual(rgba.shape[0], rgba.shape[1])  # Square crop
+        self.assertEqual(rgba[0, 0, 3], 0)  # Masked corner is transparent
+
+    def test_process_bytes_matches_process_image(self):
+        """Test that in-memory processing produces the same PNG as file processing"""
+        with open(self.mona_lisa_path, "rb") as f:
+            png_data = self.processor.process_bytes(f.read())
+        self.assertIsNotNone(png_data)
+
+        self.assertTrue(
+            self.processor.process_image(self.mona_lisa_path, self.output_path)
+        )
+        with open(self.output_path, "rb") as f:
+            self.assertEqual(png_data, f.read())
+
+    def test_process_bytes_invalid(self):
+        """Test processing bytes that are not an image"""
+        self.assertIsNone(self.processor.process_bytes(b"not an image"))
+
+    def test_process_array_no_face(self):
+        """Test processing an array without a face"""
+        img = cv2.imread(self.cat_path)
+        self.assertIsNone(self.processor.process_array(img, strict=True))
+
+    def test_reduced_decode_matches_full_decode(self):
+        """Test that reduced-resolution decode for detection keeps the framing"""
+        img = cv2.imread(self.mona_lisa_path)
+        large = cv2.resize(img, None, fx=6, fy=6, interpolation=cv2.INTER_CUBIC)
+        large_path = os.path.join(self.test_dir, "large.jpg")
+        cv2.imwrite(large_path, large)
+
+        processor = ImageProcessor(detection_size=640)
+        try:
+            reduced_img, reduced_bbox = processor.decode_and_detect(large_path)
+            full_bbox = processor.detector.detect_face(large)
+        finally:
+            processor.close()
+
+        self.assertEqual(reduced_img.shape, large.shape)
+        self.assertIsNotNone(reduced_bbox)
+        for a, b in zip(reduced_bbox, full_bbox):
+            self.assertLess(abs(a - b), 0.05 * full_bbox[2])
+
+    def test_output_matches_expected_fixtures(self):
+        """Test that default output is byte-for-byte identical to the expected fixtures"""
+        for name in ["Mona_Lisa", "pexels-sample-1", "pexels-sample-2"]:
+            input_path = os.path.join("tests", "fixtures", "images", f"{name}.jpg")
+            expected_path = os.path.join(
+                "tests", "fixtures", "expected", f"{name}_cropped.png"
+            )
+            self.assertTrue(
+                self.processor.process_image(
+                    input_path, self.output_path, circular_mask=True
+                )
+            )
+            with open(self.output_path, "rb") as a, open(expected_path, "rb") as b:
+                self.assertEqual(a.read(), b.read(), name)
+
+    def test_process_variants(self):
+        """Test writing several variants from one decode and detection"""
+        variants = parse_variants(
+            ["original,circular", "64/256,square/circular", "128,webp-lossless"]
+        )
+        output_path = os.path.join(self.test_dir, "Mona_Lisa_cropped.png")
+        input_path = os.path.join("tests", "fixtures", "images", "Mona_Lisa.jpg")
+        with patch.object(
+            self.processor.detector,
+            "run_chain",
+            wraps=self.processor.detector.run_chain,
+        ) as run_chain:
+            paths = self.processor.process_variants(input_path, output_path, variants)
+        run_chain.assert_called_once()
+        self.assertEqual(
+            [os.path.basename(path) for path in paths],
+            [
+                "Mona_Lisa_cropped_original_circular.png",
+                "Mona_Lisa_cropped_64_square.png",
+                "Mona_Lisa_cropped_64_circular.png",
+                "Mona_Lisa_cropped_256_square.png",
+                "Mona_Lisa_cropped_256_circular.png",
+                "Mona_Lisa_cropped_128_square.webp",
+            ],
+        )
+
+        # The original-size circular variant is the regular output
+        expected_path = os.path.join(
+            "tests", "fixtures", "expected", "Mona_Lisa_cropped.png"
+        )
+        with open(paths[0], "rb") as a, open(expected_path, "rb") as b:
+            self.assertEqual(a.read(), b.read())
+        for path, size in zip(paths[1:], [64, 64, 256, 256, 128]):
+            with Image.open(path) as img:
+                self.assertEqual(img.size, (size, size))
+        with Image.open(paths[1]) as square, Image.open(paths[2]) as circle:
+            self.assertEqual(square.getpixel((0, 0))[3], 255)
+            self.assertEqual(circle.getpixel((0, 0))[3], 0)
+
+    def test_process_with_opencv_webp_encoder(self):
+        """Test writing output through a non-default encoder"""
+        processor = ImageProcessor(encoder=Encoder(format="webp", backend="opencv"))
+        try:
+            output_path = os.path.join(self.test_dir, "output.webp")
+            self.assertTrue(processor.process_image(self.mona_lisa_path, output_path))
+            output_img = Image.open(output_path)
+            self.assertEqual(output_img.format, "WEBP")
+
+            # Lossless: same pixels as the default PNG output
+            self.processor.process_image(self.mona_lisa_path, self.output_path)
+            self.assertTrue(
+                (
+                    np.array(output_img.convert("RGBA"))
+                    == np.array(Image.open(self.output_path))
+                ).all()
+            )
+            os.remove(output_path)
+        finally:
+            processor.close()
+
+    def test_process_arrays(self):
+        """Test batch processing returns one result per image in order"""
+        mona_lisa = cv2.imread(self.mona_lisa_path)
+        cat = cv2.imread(self.cat_path)
+        results = self.processor.process_arrays(
+            [mona_lisa, cat, mona_lisa], circular_mask=True, strict=True
+        )
+        self.assertEqual(len(results), 3)
+        self.assertIsNone(results[1])
+        expected = self.processor.process_array(mona_lisa, circular_mask=True)
+        self.assertTrue((results[0] == expected).all())
+        self.assertTrue((results[2] == expected).all())
+
+    def test_process_all_faces(self):
+        """Test that one numbered crop is written per face"""
+        tiles = [
+            cv2.resize(
+                cv2.imread(os.path.join("tests", "fixtures", "images", name)),
+                (600, 800),
+            )
+            for name in ["pexels-sample-1.jpg", "pexels-sample-3.jpg"]
+        ]
+        group_path = os.path.join(self.test_dir, "group.jpg")
+        cv2.imwrite(group_path, cv2.hconcat(tiles))
+        output_path = os.path.join(self.test_dir, "group_cropped.png")
+
+        paths = self.processor.process_all_faces(group_path, output_path, strict=True)
+        self.assertEqual(
+            paths,
+            [face_output_path(output_path, 1), face_output_path(output_path, 2)],
+        )
+        self.assertTrue(paths[0].endswith("group_cropped_1.png"))
+        # Each crop is the group image cropped around one detected face
+        group = cv2.imread(group_path)
+        faces = self.processor.detector.detect_all_faces(group, strict=True)
+        for path, face_bbox in zip(paths, faces):
+            expected = self.processor.crop_face(group, face_bbox)
+            self.assertTrue((np.array(Image.open(path)) == expected).all())
+            os.remove(path)
+        os.remove(group_path)
+
+        self.assertEqual(
+            self.processor.process_all_faces(self.cat_path, output_path, strict=True),
+            [],
+        )
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,104 @@
+import unittest
+import os
+import json
+import tempfile
+import shutil
+import cv2
+from src.processor import ImageProcessor
+from src.profiling import NULL_PROFILER, Profiler, percentile
+
+
+class TestProfiler(unittest.TestCase):
+    def test_percentile(self):
+        """Test nearest-rank percentiles"""
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 95), 95)
+        self.assertEqual(percentile(values, 99), 99)
+        self.assertEqual(percentile([7], 99), 7)
+
+    def test_report(self):
+        """Test aggregation of stage samples and counters"""
+        profiler = Profiler()
+        for ms in range(1, 101):
+            profiler.record("decode", ms / 1000)
+        profiler.count("detected_by.haar")
+        profiler.count("detected_by.haar")
+
+        report = profiler.report()
+        self.assertEqual(report["counters"], {"detected_by.haar": 2})
+        decode = report["stages"]["decode"]
+        self.assertEqual(decode["count"], 100)
+        self.assertEqual((decode["p50_ms"], decode["p95_ms"]), (50.0, 95.0))
+        self.assertAlmostEqual(decode["mean_ms"], 50.5)
+
+    def test_stage_and_hooks(self):
+        """Test timing a block and notifying hooks"""
+        events = []
+        profiler = Profiler(hooks=[lambda *event: events.append(event)])
+        with profiler.stage("crop"):
+            pass
+        profiler.count("images", 3)
+        self.assertEqual(
+            [event[:2] for event in events], [("stage", "crop"), ("count", "images")]
+        )
+        self.assertEqual(events[1][2], 3)
+
+    def test_drain_and_merge(self):
+        """Test moving samples from a worker profiler into another"""
+        worker = Profiler()
+        worker.record("encode", 0.01)
+        worker.count("detected_by.mediapipe")
+        snapshot = worker.drain()
+        self.assertEqual(worker.report(), {"stages": {}, "counters": {}})
+
+        main = Profiler()
+        main.record("encode", 0.03)
+        main.merge(snapshot)
+        self.assertEqual(main.report()["stages"]["encode"]["count"], 2)
+        self.assertEqual(main.report()["counters"], {"detected_by.mediapipe": 1})
+
+    def test_null_profiler(self):
+        """Test that the disabled profiler accepts every call"""
+        self.assertFalse(NULL_PROFILER.enabled)
+        with NULL_PROFILER.stage("decode"):
+            NULL_PROFILER.count("images")
+            NULL_PROFILER.record("decode", 1.0)
+
+    def test_processor_stages(self):
+        """Test that processing an image records the expected stages"""
+        test_dir = tempfile.mkdtemp()
+        try:
+            profiler = Profiler()
+            input_path = os.path.join("tests", "fixtures", "images", "Mona_Lisa.jpg")
+            with ImageProcessor(profiler=profiler) as processor:
+                processor.process_image(
+                    input_path, os.path.join(test_dir, "out.png"), circular_mask=True
+                )
+                # No face in strict mode
+                processor.process_array(
+                    cv2.imread(os.path.join("tests", "fixtures", "images", "cat.jpg")),
+                    strict=True,
+                )
+
+            report = profiler.report()
+            for stage in [
+                "process_image",
+                "decode",
+                "detect",
+                "detect.mediapipe",
+                "crop",
+                "mask",
+                "encode",
+            ]:
+                self.assertIn(stage, report["stages"])
+            self.assertEqual(
+                report["counters"], {"detected_by.mediapipe": 1, "detected_by.none": 1}
+            )
+            json.dumps(report)
+        finally:
+            shutil.rmtree(test_dir)
+
+
+if __name__ == "__main__":
+    unittest.main()
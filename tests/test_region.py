@@ -0,0 +1,152 @@
+import unittest
+import os
+import shutil
+import tempfile
+import tracemalloc
+import cv2
+import numpy as np
+from PIL import Image
+from src.processor import ImageProcessor
+from src.region import RegionReader, RegionReadError, open_large_image
+
+
+class TestRegionReader(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.test_dir = tempfile.mkdtemp()
+        rng = np.random.default_rng(0)
+        cls.pixels = rng.integers(0, 256, (301, 203, 3), dtype=np.uint8)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.test_dir)
+
+    def save(self, name, pixels=None):
+        path = os.path.join(self.test_dir, name)
+        Image.fromarray(self.pixels if pixels is None else pixels).save(path)
+        return path
+
+    def test_region_matches_full_decode(self):
+        """Test that region reads match a full decode for every layout"""
+        for name in ["strips.tif", "bottom_up.bmp", "image.ppm", "image.png"]:
+            path = self.save(name)
+            reader = open_large_image(path, min_pixels=0)
+            self.assertEqual(reader.raw, not name.endswith(".png"))
+            self.assertEqual(reader.shape, (301, 203, 3))
+            np.testing.assert_array_equal(
+                reader[10:250, 7:180], cv2.imread(path)[10:250, 7:180]
+            )
+
+        path = self.save("gray.tif", self.pixels[:, :, 0])
+        reader = open_large_image(path, min_pixels=0)
+        self.assertTrue(reader.raw)
+        np.testing.assert_array_equal(reader[5:9, 3:10], cv2.imread(path)[5:9, 3:10])
+
+    def test_thumbnail(self):
+        """Test that thumbnails fit the requested size"""
+        for name in ["thumb.tif", "thumb.jpg"]:
+            thumbnail = open_large_image(self.save(name), min_pixels=0).thumbnail(64)
+            self.assertLessEqual(max(thumbnail.shape[:2]), 64)
+            self.assertGreaterEqual(max(thumbnail.shape[:2]), 60)
+
+    def test_small_images_are_not_large(self):
+        """Test the pixel threshold and unreadable files"""
+        path = self.save("small.tif")
+        self.assertIsNone(open_large_image(path, min_pixels=301 * 203 + 1))
+        self.assertIsInstance(
+            open_large_image(path, min_pixels=301 * 203), RegionReader
+        )
+
+        invalid = os.path.join(self.test_dir, "invalid.tif")
+        with open(invalid, "w") as f:
+            f.write("not an image")
+        self.assertIsNone(open_large_image(invalid, min_pixels=0))
+
+
+class TestLargeImageMode(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        """Write a synthetic 48 MP scan with a face in the lower right"""
+        cls.test_dir = tempfile.mkdtemp()
+        face = cv2.imread(os.path.join("tests", "fixtures", "images", "Mona_Lisa.jpg"))
+        face = cv2.resize(face, None, fx=2, fy=2, interpolation=cv2.INTER_CUBIC)
+        canvas = np.full((6000, 8000, 3), 90, dtype=np.uint8)
+        canvas[3000 : 3000 + face.shape[0], 5000 : 5000 + face.shape[1]] = face
+        cls.image_bytes = canvas.nbytes
+        cls.huge_path = os.path.join(cls.test_dir, "huge.tif")
+        Image.fromarray(cv2.cvtColor(canvas, cv2.COLOR_BGR2RGB)).save(cls.huge_path)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.test_dir)
+
+    def test_peak_memory_bounded_by_output(self):
+        """Test that a huge image is cropped without decoding all of it"""
+        output_path = os.path.join(self.test_dir, "huge_cropped.png")
+        with ImageProcessor(large_image_pixels=10_000_000) as processor:
+            tracemalloc.start()
+            try:
+                success = processor.process_image(self.huge_path, output_path)
+                _, peak = tracemalloc.get_traced_memory()
+            finally:
+                tracemalloc.stop()
+
+            self.assertTrue(success)
+            output = cv2.imread(output_path, cv2.IMREAD_UNCHANGED)
+            # The crop as RGBA, its BGR source region and a thumbnail
+            self.assertLess(peak, output.size * 2 + 16 * 1024 * 1024)
+            self.assertLess(peak, self.image_bytes / 2)
+
+            # Same pixels as cropping the fully decoded image
+            img, face_bbox = processor.decode_and_detect(self.huge_path)
+            self.assertIsInstance(img, RegionReader)
+            expected = processor.crop_face(cv2.imread(self.huge_path), face_bbox)
+            np.testing.assert_array_equal(
+                cv2.cvtColor(output, cv2.COLOR_BGRA2RGBA), expected
+            )
+
+    def test_detection_cache(self):
+        """Test that region-read images are cached across runs"""
+        cache_path = os.path.join(self.test_dir, "cache.sqlite")
+        results = []
+        for _ in range(2):
+            with ImageProcessor(
+                large_image_pixels=10_000_000, cache_path=cache_path
+            ) as processor:
+                img, face_bbox = processor.decode_and_detect(self.huge_path)
+                self.assertIsInstance(img, RegionReader)
+                results.append((face_bbox, processor.cache.hits))
+        self.assertEqual(results[0][0], results[1][0])
+        self.assertEqual([hits for _, hits in results], [0, 1])
+
+    def test_opt_in_and_uncompressed_only(self):
+        """Test that the mode is off by default and skips compressed formats"""
+        jpeg_path = os.path.join(self.test_dir, "scan.jpg")
+        cv2.imwrite(jpeg_path, np.full((400, 300, 3), 90, dtype=np.uint8))
+        with ImageProcessor() as processor:
+            self.assertIsNone(processor.large_image(self.huge_path))
+        with ImageProcessor(large_image_pixels=1) as processor:
+            self.assertIsNone(processor.large_image(jpeg_path))
+            self.assertIsInstance(processor.large_image(self.huge_path), RegionReader)
+
+    def test_read_and_write_errors(self):
+        """Test that only region reads are reported as input errors"""
+        with ImageProcessor(large_image_pixels=10_000_000) as processor:
+            missing_dir = os.path.join(self.test_dir, "missing", "out.png")
+            with self.assertRaises(OSError) as cm:
+                processor.process_image(self.huge_path, missing_dir)
+            self.assertNotIsInstance(cm.exception, RegionReadError)
+
+            img, face_bbox = processor.decode_and_detect(self.huge_path)
+            with open(self.huge_path, "rb") as f:
+                header = f.read(1024 * 1024)
+            truncated = os.path.join(self.test_dir, "truncated.tif")
+            with open(truncated, "wb") as f:
+                f.write(header)
+            img.path = truncated
+            with self.assertRaises(RegionReadError):
+                processor.crop_face(img, face_bbox)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,108 @@
+import asyncio
+import io
+import json
+import os
+import unittest
+
+from PIL import Image
+
+from src.decode import EXIF_ORIENTATION, decode
+from src.processor import ImageProcessor
+from src.server import FaceCropServer, _Request, run_batch
+
+
+class TestServer(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        fixtures = os.path.join(os.path.dirname(__file__), "fixtures", "images")
+        with open(os.path.join(fixtures, "Mona_Lisa.jpg"), "rb") as f:
+            self.image = f.read()
+        # A long wait so that concurrent requests land in one batch
+        self.server = FaceCropServer(
+            port=0, workers=1, max_batch_size=4, max_wait_ms=500
+        )
+        await self.server.start()
+
+    async def asyncTearDown(self):
+        await self.server.close()
+
+    async def request(self, method, path, body=b""):
+        reader, writer = await asyncio.open_connection("127.0.0.1", self.server.port)
+        writer.write(
+            f"{method} {path} HTTP/1.1\r\nHost: localhost\r\n"
+            f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body
+        )
+        await writer.drain()
+        response = await reader.read()
+        writer.close()
+        head, _, payload = response.partition(b"\r\n\r\n")
+        status = int(head.split()[1])
+        return status, payload
+
+    async def test_detect(self):
+        """Test the detect endpoint"""
+        status, payload = await self.request("POST", "/detect?strict=1", self.image)
+        self.assertEqual(status, 200)
+        face = json.loads(payload)["face"]
+        self.assertEqual(set(face), {"x", "y", "w", "h"})
+        self.assertGreater(face["w"], 0)
+
+    async def test_crop_matches_processor(self):
+        """Test that /crop returns the same bytes as process_bytes"""
+        status, payload = await self.request("POST", "/crop?circular=1", self.image)
+        self.assertEqual(status, 200)
+        with ImageProcessor() as processor:
+            expected = processor.process_bytes(self.image, circular_mask=True)
+        self.assertEqual(payload, expected)
+
+    async def test_errors(self):
+        """Test undecodable bodies, unknown paths and wrong methods"""
+        status, _ = await self.request("POST", "/crop", b"not an image")
+        self.assertEqual(status, 400)
+        status, _ = await self.request("GET", "/unknown")
+        self.assertEqual(status, 404)
+        status, _ = await self.request("GET", "/detect")
+        self.assertEqual(status, 405)
+
+    async def test_concurrent_requests_are_batched(self):
+        """Test that concurrent requests share a batch and show in the metrics"""
+        responses = await asyncio.gather(
+            *[self.request("POST", "/detect", self.image) for _ in range(4)]
+        )
+        self.assertEqual([status for status, _ in responses], [200] * 4)
+
+        status, payload = await self.request("GET", "/metrics")
+        self.assertEqual(status, 200)
+        metrics = json.loads(payload)
+        self.assertEqual(metrics["batch_sizes"], {"4": 1})
+        self.assertEqual(metrics["requests"], {"detect.200": 4})
+        self.assertEqual(metrics["queue_depth"], 0)
+        self.assertEqual(metrics["latency"]["detect"]["count"], 4)
+        self.assertIn("p99_ms", metrics["latency"]["queue_wait"])
+
+
+class TestRunBatch(unittest.TestCase):
+    def test_reduced_detect_follows_exif_orientation(self):
+        """Test that a reduced-resolution bbox is mapped to the rotated image size"""
+        path = os.path.join(
+            os.path.dirname(__file__), "fixtures", "images", "pexels-sample-3.jpg"
+        )
+        # Stored sideways, upright once the EXIF orientation is applied
+        with Image.open(path) as img:
+            rotated = img.transpose(Image.Transpose.ROTATE_90)
+        exif = Image.Exif()
+        exif[EXIF_ORIENTATION] = 6
+        buffer = io.BytesIO()
+        rotated.save(buffer, "JPEG", exif=exif, quality=95)
+        data = buffer.getvalue()
+        request = _Request("detect", data, True, False, None, 0)
+        with ImageProcessor() as processor:
+            expected = processor.detector.detect_faces([decode(data)], strict=True)[0]
+        with ImageProcessor(detection_size=300) as processor:
+            _, _, body = run_batch(processor, [request])[0]
+        face = json.loads(body)["face"]
+        for value, full in zip((face["x"], face["y"], face["w"], face["h"]), expected):
+            self.assertAlmostEqual(value, full, delta=full * 0.05 + 5)
+
+
+if __name__ == "__main__":
+    unittest.main()
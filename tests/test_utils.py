@@ -1,7 +1,13 @@
 import unittest
 import numpy as np
-from PIL import Image
-from src.utils import create_circular_mask
+from PIL import Image, ImageDraw
+import cv2
+from src.utils import (
+    apply_circular_mask,
+    circular_mask_array,
+    create_circular_mask,
+    resize_pyramid,
+)
 
 
 class TestUtils(unittest.TestCase):
@@ -40,6 +46,60 @@ class TestUtils(unittest.TestCase):
         # Check if mask is in L mode (grayscale)
         self.assertEqual(mask.mode, "L")
 
+    def test_mask_matches_ellipse_rasterization(self):
+        """Test that the cached mask is the original hard-edged ellipse"""
+        size = (120, 90)
+        expected = Image.new("L", size, 0)
+        ImageDraw.Draw(expected).ellipse((0, 0, size[0], size[1]), fill=255)
+        self.assertTrue((circular_mask_array(size) == np.array(expected)).all())
+        self.assertTrue(
+            (np.array(create_circular_mask(size)) == np.array(expected)).all()
+        )
+
+    def test_mask_is_cached_and_read_only(self):
+        """Test that masks are reused per size and cannot be modified"""
+        mask = circular_mask_array((64, 64))
+        self.assertIs(circular_mask_array((64, 64)), mask)
+        self.assertFalse(mask.flags.writeable)
+
+        # The PIL mask is a copy that callers may draw on
+        pil_mask = create_circular_mask((64, 64))
+        pil_mask.putpixel((32, 32), 0)
+        self.assertEqual(circular_mask_array((64, 64))[32, 32], 255)
+
+    def test_antialiased_mask(self):
+        """Test that supersampling produces intermediate edge values"""
+        hard = circular_mask_array((100, 100))
+        smooth = circular_mask_array((100, 100), supersample=4)
+        self.assertEqual(smooth.shape, hard.shape)
+        self.assertEqual(smooth[50, 50], 255)
+        self.assertEqual(smooth[0, 0], 0)
+        self.assertTrue(set(np.unique(hard)) <= {0, 255})
+        self.assertTrue(((smooth > 0) & (smooth < 255)).any())
+
+    def test_apply_circular_mask(self):
+        """Test writing the mask into the alpha channel in place"""
+        buffer = np.full((40, 60, 4), 255, dtype=np.uint8)
+        result = apply_circular_mask(buffer)
+        self.assertIs(result, buffer)
+        self.assertTrue((buffer[..., 3] == circular_mask_array((60, 40))).all())
+        self.assertTrue((buffer[..., :3] == 255).all())
+
+    def test_resize_pyramid(self):
+        """Test chained area downscales, upscales and the original level"""
+        rng = np.random.default_rng(0)
+        img = rng.integers(0, 256, (400, 400, 3), dtype=np.uint8)
+        levels = resize_pyramid(img, [None, 100, 200, 400, 800, 100])
+        self.assertEqual(sorted(levels, key=str), [100, 200, 400, 800, None])
+        self.assertIs(levels[None], img)
+        self.assertIs(levels[400], img)
+        self.assertEqual(levels[800].shape, (800, 800, 3))
+        # Halving steps of area interpolation are plain 2x2 box averages
+        direct = cv2.resize(img, (100, 100), interpolation=cv2.INTER_AREA)
+        self.assertLessEqual(
+            np.abs(levels[100].astype(int) - direct.astype(int)).max(), 1
+        )
+
 
 if __name__ == "__main__":
     unittest.main()
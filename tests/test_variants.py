@@ -0,0 +1,57 @@
+import unittest
+import os
+from src.encoder import Encoder
+from src.variants import OutputSpec, parse_variants
+
+
+class TestVariants(unittest.TestCase):
+    def test_output_path(self):
+        """Test naming variants after the regular output path"""
+        variant = OutputSpec(256, circular=True)
+        self.assertEqual(
+            variant.output_path(os.path.join("out", "photo_cropped.png")),
+            os.path.join("out", "photo_cropped_256_circular.png"),
+        )
+        variant = OutputSpec(
+            encoder=Encoder(format="webp"), template="{size}/{stem}.{format}"
+        )
+        self.assertEqual(
+            variant.output_path("photo_cropped.png"),
+            os.path.join("original", "photo_cropped.webp"),
+        )
+
+    def test_parse_variants(self):
+        """Test expanding alternatives into every combination"""
+        encoder = Encoder.from_preset("fast-png")
+        variants = parse_variants(
+            ["64/128,square/circular", "original", "512,webp-lossless"],
+            encoder=encoder,
+            circular=True,
+        )
+        self.assertEqual(
+            [(variant.size, variant.mask) for variant in variants],
+            [
+                (64, "square"),
+                (64, "circular"),
+                (128, "square"),
+                (128, "circular"),
+                (None, "circular"),
+                (512, "circular"),
+            ],
+        )
+        self.assertIs(variants[0].encoder, encoder)
+        self.assertEqual(variants[-1].encoder.format, "webp")
+
+    def test_invalid_variants(self):
+        """Test that invalid specs and clashing file names are rejected"""
+        for specs in [["huge"], ["0"], ["128", "128"]]:
+            with self.assertRaises(ValueError):
+                parse_variants(specs)
+        with self.assertRaises(ValueError):
+            parse_variants(["64", "128"], template="{stem}{ext}")
+        with self.assertRaises(ValueError):
+            parse_variants(["64"], template="{unknown}")
+
+
+if __name__ == "__main__":
+    unittest.main()
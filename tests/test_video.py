@@ -0,0 +1,138 @@
+import unittest
+import os
+import shutil
+import tempfile
+import cv2
+import numpy as np
+from src.processor import ImageProcessor
+from src.video import FaceTracker, process_video, read_frames
+
+
+class SquareDetector:
+    """Finds the bright square in a synthetic frame"""
+
+    def __init__(self):
+        self.calls = []
+        self.strict_calls = []
+
+    def detect_face(self, img, strict=False):
+        self.calls.append(img.shape[:2])
+        self.strict_calls.append(strict)
+        ys, xs = np.nonzero(img[:, :, 0] > 127)
+        if len(xs) == 0:
+            return None
+        return (int(xs.min()), int(ys.min()), int(np.ptp(xs)) + 1, int(np.ptp(ys)) + 1)
+
+
+def square_frame(x, y, side=40, size=400):
+    frame = np.zeros((size, size, 3), dtype=np.uint8)
+    frame[y : y + side, x : x + side] = 255
+    return frame
+
+
+class TestFaceTracker(unittest.TestCase):
+    def test_detection_skipping(self):
+        """Test that full detection only runs on keyframes"""
+        detector = SquareDetector()
+        tracker = FaceTracker(detector, keyframe_interval=5, smoothing=0)
+        for index in range(12):
+            bbox = tracker.update(square_frame(100 + index * 4, 150))
+            self.assertEqual(bbox, (100 + index * 4, 150, 40, 40))
+
+        self.assertEqual(tracker.stats()["full_detections"], 3)
+        self.assertEqual(tracker.stats()["roi_detections"], 9)
+        # Tracked frames only search around the previous face
+        full_calls = [shape for shape in detector.calls if shape == (400, 400)]
+        self.assertEqual(len(full_calls), 3)
+        self.assertTrue(
+            all(shape[0] <= 120 for shape in detector.calls if shape != (400, 400))
+        )
+
+    def test_roi_search_is_mediapipe_only(self):
+        """Test that tracked frames skip the fallback chain, keyframes do not"""
+        detector = SquareDetector()
+        tracker = FaceTracker(detector, keyframe_interval=3, smoothing=0)
+        for index in range(4):
+            tracker.update(square_frame(100 + index * 4, 150))
+        self.assertEqual(detector.strict_calls, [False, True, True, False])
+
+    def test_lost_tracking_falls_back_to_full_detection(self):
+        """Test that a face leaving the search region triggers full detection"""
+        tracker = FaceTracker(SquareDetector(), keyframe_interval=30, smoothing=0)
+        tracker.update(square_frame(20, 20))
+        self.assertEqual(tracker.update(square_frame(300, 300)), (300, 300, 40, 40))
+        self.assertEqual(tracker.stats()["lost"], 1)
+        self.assertEqual(tracker.stats()["full_detections"], 2)
+
+    def test_smoothing(self):
+        """Test that the smoothed box lags behind a sudden move"""
+        tracker = FaceTracker(SquareDetector(), keyframe_interval=30, smoothing=0.5)
+        tracker.update(square_frame(100, 100))
+        self.assertEqual(tracker.update(square_frame(120, 100)), (110, 100, 40, 40))
+
+    def test_invalid_options(self):
+        """Test that invalid tracker settings are rejected"""
+        with self.assertRaises(ValueError):
+            FaceTracker(SquareDetector(), keyframe_interval=0)
+        with self.assertRaises(ValueError):
+            FaceTracker(SquareDetector(), smoothing=1)
+
+
+class TestProcessVideo(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.test_dir = tempfile.mkdtemp()
+        cls.frames_dir = os.path.join(cls.test_dir, "frames")
+        os.makedirs(cls.frames_dir)
+        img = cv2.imread(os.path.join("tests", "fixtures", "images", "Mona_Lisa.jpg"))
+        img = cv2.resize(img, (320, 480), interpolation=cv2.INTER_AREA)
+        # Natural order: frame2 comes before frame10
+        for index in (1, 2, 10):
+            shifted = np.roll(img, index * 2, axis=1)
+            cv2.imwrite(os.path.join(cls.frames_dir, f"frame{index}.png"), shifted)
+        cls.processor = ImageProcessor()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.processor.close()
+        shutil.rmtree(cls.test_dir)
+
+    def test_read_frames_natural_order(self):
+        """Test that image sequences are read in natural filename order"""
+        names = [name for name, _ in read_frames(self.frames_dir)]
+        self.assertEqual(names, ["frame1", "frame2", "frame10"])
+
+    def test_per_frame_crops(self):
+        """Test writing one crop per frame of an image sequence"""
+        output_dir = os.path.join(self.test_dir, "crops")
+        stats = process_video(self.processor, self.frames_dir, output_dir)
+        self.assertEqual(stats["frames"], 3)
+        self.assertEqual(stats["written"], 3)
+        self.assertEqual(stats["full_detections"], 1)
+        self.assertEqual(
+            sorted(os.listdir(output_dir)),
+            ["frame10_cropped.png", "frame1_cropped.png", "frame2_cropped.png"],
+        )
+
+    def test_video_round_trip(self):
+        """Test cropping a video file into a cropped video"""
+        source = os.path.join(self.test_dir, "input.avi")
+        writer = cv2.VideoWriter(
+            source, cv2.VideoWriter_fourcc(*"MJPG"), 10, (320, 480)
+        )
+        for _, frame in read_frames(self.frames_dir):
+            writer.write(frame)
+        writer.release()
+
+        output = os.path.join(self.test_dir, "output.avi")
+        stats = process_video(self.processor, source, output, output_size=128)
+        self.assertEqual(stats["written"], 3)
+        self.assertGreater(stats["fps"], 0)
+
+        frames = [frame for _, frame in read_frames(output)]
+        self.assertEqual(len(frames), 3)
+        self.assertEqual(frames[0].shape, (128, 128, 3))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,65 @@
+import os
+import tempfile
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from src.cache import content_digest
+from src.web import crop_upload, format_progress, read_spooled, thread_processor
+
+
+class TestWebHelpers(unittest.TestCase):
+    def test_format_progress(self):
+        """Test the progress text and its time estimate"""
+        self.assertEqual(format_progress(0, 4, 0.0), "Processed 0 of 4 images")
+        self.assertEqual(
+            format_progress(1, 4, 2.0),
+            "Processed 1 of 4 images, about 6 s remaining",
+        )
+        self.assertEqual(format_progress(4, 4, 8.0), "Processed 4 of 4 images")
+
+    def test_read_spooled(self):
+        """Test reading a spooled file in memory and after it spilled to disk"""
+        with tempfile.SpooledTemporaryFile(max_size=4) as spooled_file:
+            spooled_file.write(b"abc")
+            self.assertEqual(read_spooled(spooled_file), b"abc")
+            spooled_file.write(b"defgh")
+            self.assertEqual(read_spooled(spooled_file), b"abcdefgh")
+
+    def test_thread_processor(self):
+        """Test that each thread keeps its own processor"""
+        self.assertIs(thread_processor(), thread_processor())
+
+        barrier = threading.Barrier(2)
+
+        def processor_of_thread(_):
+            # Keep both pool threads busy so each task runs on its own thread
+            barrier.wait()
+            return thread_processor()
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            first, second = executor.map(processor_of_thread, range(2))
+        self.assertIsNot(first, second)
+        self.assertIsNot(first, thread_processor())
+
+    def test_crop_upload(self):
+        """Test cropping an upload on pool threads, and unreadable uploads"""
+        fixtures = os.path.join(os.path.dirname(__file__), "fixtures", "images")
+        with open(os.path.join(fixtures, "Mona_Lisa.jpg"), "rb") as f:
+            data = f.read()
+        digest = content_digest(data)
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            results = list(
+                executor.map(
+                    lambda circular: crop_upload(digest, True, circular, False, data),
+                    (False, True),
+                )
+            )
+        for png_data in results:
+            self.assertTrue(png_data.startswith(b"\x89PNG"))
+        self.assertNotEqual(results[0], results[1])
+        self.assertIsNone(crop_upload(content_digest(b"x"), True, False, False, b"x"))
+
+
+if __name__ == "__main__":
+    unittest.main()